@@ -1,9 +1,73 @@
-from .zigzag import compute_zigzag_buffers
-from .semafor import compute_semafor_levels
-from .triangles import detect_123_triangles
-
-__all__ = [
-    "compute_zigzag_buffers",
-    "compute_semafor_levels",
-    "detect_123_triangles",
-]
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# Public names are resolved on first access (PEP 562), so `import python123.cli` does not pay
+# for NumPy and the whole pipeline before argument parsing.
+_EXPORTS = {
+    "RangeExtremaIndex": ".extrema",
+    "compute_zigzag_buffers": ".zigzag",
+    "compute_zigzag_buffers_batch": ".zigzag",
+    "compute_semafor_levels": ".semafor",
+    "compute_semafor_pivots": ".semafor",
+    "compute_semafor_levels_batch": ".semafor",
+    "compute_semafor_pivots_batch": ".semafor",
+    "stack_series": ".semafor",
+    "compute_semafor_chunked": ".chunked",
+    "ChunkedResult": ".chunked",
+    "open_result": ".chunked",
+    "PivotSet": ".pivots",
+    "SharedArrays": ".shared",
+    "TriangleStore": ".store",
+    "scan_confluence": ".confluence",
+    "infer_point": ".points",
+    "to_points": ".points",
+    "from_points": ".points",
+    "detect_123_triangles": ".triangles",
+    "detect_123_triangles_indexed": ".triangles",
+    "detect_123_triangle_set": ".triangle_set",
+    "TriangleSet": ".triangle_set",
+    "IncrementalTriangleDetector": ".triangles",
+    "TriangleEvents": ".triangles",
+    "ZigZagStream": ".stream",
+    "SemaforStream": ".stream",
+}
+
+if TYPE_CHECKING:
+    from .extrema import RangeExtremaIndex
+    from .zigzag import compute_zigzag_buffers, compute_zigzag_buffers_batch
+    from .semafor import (
+        compute_semafor_levels,
+        compute_semafor_levels_batch,
+        compute_semafor_pivots,
+        compute_semafor_pivots_batch,
+        stack_series,
+    )
+    from .chunked import ChunkedResult, compute_semafor_chunked, open_result
+    from .pivots import PivotSet
+    from .shared import SharedArrays
+    from .store import TriangleStore
+    from .confluence import scan_confluence
+    from .points import from_points, infer_point, to_points
+    from .triangles import (
+        detect_123_triangles,
+        detect_123_triangles_indexed,
+        IncrementalTriangleDetector,
+        TriangleEvents,
+    )
+    from .triangle_set import TriangleSet, detect_123_triangle_set
+    from .stream import ZigZagStream, SemaforStream
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+
+from .triangles import Triangle
+from .triangle_set import TriangleSet
+
+EXIT_STOP = -1
+EXIT_EXPIRY = 0
+EXIT_TARGET = 1
+EXIT_OPEN = 2  # data ended while the trade was still open (marked at the last close)
+EXIT_NAMES = {EXIT_STOP: "stop", EXIT_EXPIRY: "expiry", EXIT_TARGET: "target", EXIT_OPEN: "open"}
+
+# upper bound on bars gathered per first-touch block (active trades x block length)
+_BLOCK_CELLS = 1 << 22
+
+
+@dataclass(frozen=True)
+class BacktestParams:
+    """
+    Trade rules applied to every triangle (prices in the same units as the OHLC arrays).
+
+    - entry_delay: enter at the open of the bar `entry_delay` bars after point 3 (or after the
+      signal bar, see backtest); point 3 is only known once the next bar exists.
+    - stop_offset: stop distance beyond point 1 (below it for buys, above for sells).
+    - target_ratio: take-profit at point 3 + target_ratio * (point 2 - point 1).
+    - max_hold: bars after entry before the trade is closed at that bar's close (None = never).
+    - cost: round-trip cost (spread + commission) subtracted from every trade's pnl.
+    """
+
+    entry_delay: int = 1
+    stop_offset: float = 0.0
+    target_ratio: float = 1.0
+    max_hold: Optional[int] = 100
+    cost: float = 0.0
+
+    def __post_init__(self):
+        # entering before the signal bar would trade on a point 3 not known yet
+        if self.entry_delay < 0:
+            raise ValueError(f"entry_delay must be >= 0, got {self.entry_delay}")
+        # a trade needs at least its entry bar; 0 or less would exit before it was entered
+        if self.max_hold is not None and self.max_hold < 1:
+            raise ValueError(f"max_hold must be None or >= 1, got {self.max_hold}")
+
+
+@dataclass
+class BacktestResult:
+    params: BacktestParams
+    trades: pd.DataFrame
+    stats: Dict[str, float]
+
+
+def backtest(
+    triangles: Union[TriangleSet, Iterable[Triangle]],
+    opens: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    params: Optional[BacktestParams] = None,
+    signal_bars: Optional[np.ndarray] = None,
+) -> BacktestResult:
+    """
+    Simulate one trade per triangle on MT4-oriented OHLC arrays (index 0 = newest bar).
+
+    Entries are timed from point 3 by default. `signal_bars` (MT4 index per triangle of the
+    bar on whose close it was first visible, see ReplayLog.signals) times them from that bar
+    instead, which accounts for repainting.
+
+    Stops and targets are found with a vectorized first-touch search: all open trades advance
+    together over blocks of bars, so the cost is a handful of array passes, not a Python loop
+    per bar. If a bar touches both levels the stop is assumed first; exits that gap through a
+    level fill at the bar's open. Bar indices in `trades` are MT4 indices like the triangles'.
+    """
+    return backtest_many(triangles, opens, highs, lows, closes, [params or BacktestParams()], signal_bars)[0]
+
+
+def backtest_many(
+    triangles: Union[TriangleSet, Iterable[Triangle]],
+    opens: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    params: Sequence[BacktestParams],
+    signal_bars: Optional[np.ndarray] = None,
+) -> List[BacktestResult]:
+    """backtest() for several parameter sets, sharing the triangle columns and price arrays."""
+    tris = triangles if isinstance(triangles, TriangleSet) else TriangleSet.from_triangles(triangles)
+    # time order (oldest first) views; nothing is copied
+    o, h, l, c = (np.asarray(a, dtype=np.float64)[::-1] for a in (opens, highs, lows, closes))
+    signal = tris["bar3"] if signal_bars is None else np.asarray(signal_bars)
+    if signal.shape[0] != len(tris):
+        raise ValueError("signal_bars must have one entry per triangle")
+    return [_run(tris, signal, o, h, l, c, p) for p in params]
+
+
+def backtest_grid(
+    triangles: Union[TriangleSet, Iterable[Triangle]],
+    opens: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    params: Sequence[BacktestParams],
+    signal_bars: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """Aggregate stats, one row per parameter set."""
+    results = backtest_many(triangles, opens, highs, lows, closes, params, signal_bars)
+    return pd.DataFrame([{**asdict(r.params), **r.stats} for r in results])
+
+
+def _run(tris: TriangleSet, signal: np.ndarray, o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray, p: BacktestParams) -> BacktestResult:
+    n = o.shape[0]
+    d = tris["dir"].astype(np.float64)
+    price1 = tris["price1"]
+    # bar indices in time order
+    entry_t = n - 1 - signal.astype(np.int64) + p.entry_delay
+    entry = o[np.minimum(entry_t, n - 1)] if n else np.zeros(0)
+    stop = price1 - d * p.stop_offset
+    target = tris["price3"] + p.target_ratio * (tris["price2"] - price1)
+
+    # a trade needs its entry bar, and an entry strictly between stop and target
+    ok = (entry_t < n) & (d * (entry - stop) > 0) & (d * (target - entry) > 0)
+    idx = np.flatnonzero(ok)
+    e_t, e_px, s_px, g_px, dd = entry_t[idx], entry[idx], stop[idx], target[idx], d[idx]
+    end_t = np.full(idx.size, n, dtype=np.int64) if p.max_hold is None else np.minimum(e_t + p.max_hold, n)
+
+    hit_t, reason = _first_touch(h, l, e_t, end_t, dd > 0, s_px, g_px)
+
+    exit_t = np.where(hit_t >= 0, hit_t, end_t - 1)
+    exit_px = c[exit_t] if exit_t.size else np.zeros(0)
+    is_stop = reason == EXIT_STOP
+    is_target = reason == EXIT_TARGET
+    gap_open = o[exit_t] if exit_t.size else np.zeros(0)
+    # gaps through a level fill at the open (never better than the level for stops)
+    stop_fill = np.where(dd > 0, np.minimum(s_px, gap_open), np.maximum(s_px, gap_open))
+    target_fill = np.where(dd > 0, np.maximum(g_px, gap_open), np.minimum(g_px, gap_open))
+    exit_px = np.where(is_stop, stop_fill, np.where(is_target, target_fill, exit_px))
+    # no level touched and the data ended before max_hold: still open, marked at the last close
+    ran_out = np.ones(idx.size, dtype=bool) if p.max_hold is None else e_t + p.max_hold > n
+    reason = np.where((reason == EXIT_EXPIRY) & ran_out, EXIT_OPEN, reason)
+
+    pnl = dd * (exit_px - e_px) - p.cost
+    risk = np.abs(e_px - s_px)
+    trades = pd.DataFrame(
+        {
+            "dir": np.where(dd > 0, "buy", "sell"),
+            "bar1": tris["bar1"][idx],
+            "bar3": tris["bar3"][idx],
+            "entry_bar": n - 1 - e_t,
+            "entry_price": e_px,
+            "stop": s_px,
+            "target": g_px,
+            "exit_bar": n - 1 - exit_t,
+            "exit_price": exit_px,
+            "exit_reason": pd.Categorical.from_codes(reason - EXIT_STOP, categories=[EXIT_NAMES[k] for k in sorted(EXIT_NAMES)]),
+            "bars_held": exit_t - e_t + 1,
+            "pnl": pnl,
+            "r": np.divide(pnl, risk, out=np.zeros_like(pnl), where=risk > 0),
+        }
+    )
+    stats = _stats(trades, exit_t, skipped=len(tris) - idx.size)
+    return BacktestResult(p, trades, stats)
+
+
+def _first_touch(
+    h: np.ndarray,
+    l: np.ndarray,
+    start: np.ndarray,
+    end: np.ndarray,
+    is_buy: np.ndarray,
+    stop: np.ndarray,
+    target: np.ndarray,
+):
+    """
+    First bar in [start, end) where each trade touches its stop or target (time order).
+
+    Returns (bar or -1, reason). Active trades are scanned together in blocks of bars whose
+    length doubles each round, so short trades cost little and long ones few rounds.
+    """
+    T = start.shape[0]
+    hit = np.full(T, -1, dtype=np.int64)
+    reason = np.full(T, EXIT_EXPIRY, dtype=np.int64)
+    active = np.flatnonzero(start < end)
+    offset = 0
+    block = 16
+    n = h.shape[0]
+    while active.size:
+        block = max(1, min(block, _BLOCK_CELLS // active.size))
+        bars = start[active, None] + offset + np.arange(block)
+        valid = bars < end[active, None]
+        bars = np.minimum(bars, n - 1)
+        lo = l[bars]
+        hi = h[bars]
+        buy = is_buy[active, None]
+        s = stop[active, None]
+        g = target[active, None]
+        stop_hit = np.where(buy, lo <= s, hi >= s) & valid
+        target_hit = np.where(buy, hi >= g, lo <= g) & valid
+        touched = stop_hit | target_hit
+        has = touched.any(axis=1)
+        first = touched.argmax(axis=1)
+        rows = np.flatnonzero(has)
+        which = active[rows]
+        hit[which] = start[which] + offset + first[rows]
+        reason[which] = np.where(stop_hit[rows, first[rows]], EXIT_STOP, EXIT_TARGET)
+        active = active[~has & valid[:, -1]]
+        offset += block
+        block *= 2
+    return hit, reason
+
+
+def _stats(trades: pd.DataFrame, exit_t: np.ndarray, skipped: int) -> Dict[str, float]:
+    pnl = trades["pnl"].to_numpy()
+    wins = pnl > 0
+    gross_win = float(pnl[wins].sum())
+    gross_loss = float(-pnl[pnl < 0].sum())
+    # equity in exit order for the drawdown
+    equity = np.cumsum(pnl[np.argsort(exit_t, kind="stable")])
+    drawdown = float((np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:] - equity).max()) if equity.size else 0.0
+    reasons = trades["exit_reason"].value_counts()
+    return {
+        "trades": int(pnl.size),
+        "skipped": int(skipped),
+        "wins": int(wins.sum()),
+        "win_rate": float(wins.mean()) if pnl.size else np.nan,
+        "total_pnl": float(pnl.sum()),
+        "mean_pnl": float(pnl.mean()) if pnl.size else np.nan,
+        "mean_r": float(trades["r"].mean()) if pnl.size else np.nan,
+        "profit_factor": gross_win / gross_loss if gross_loss > 0 else np.inf if gross_win > 0 else np.nan,
+        "max_drawdown": drawdown,
+        "mean_bars_held": float(trades["bars_held"].mean()) if pnl.size else np.nan,
+        **{f"exits_{name}": int(reasons.get(name, 0)) for name in EXIT_NAMES.values()},
+    }
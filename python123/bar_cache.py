@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import Dict, Iterator, Optional
+import numpy as np
+import pandas as pd
+
+COLUMNS = {
+    "time": np.dtype("<i8"),  # epoch seconds (UTC), like MT5 rates
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+}
+
+
+class BarCache:
+    """
+    On-disk OHLC cache, one directory per (source, symbol, timeframe).
+
+    Each column is a raw little-endian binary file that is only ever appended to, and
+    `meta.json` (replaced atomically) holds the committed row count. Readers memory-map
+    exactly that many rows, so they never see a partial append; writers serialize on a lock
+    file. Loading a cached history is therefore a memory map, not a fetch or a CSV parse.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("BAR_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "python123")
+
+    def path(self, source: str, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, _safe(source), _safe(symbol), _safe(timeframe.upper()))
+
+    def meta(self, source: str, symbol: str, timeframe: str) -> dict:
+        try:
+            with open(os.path.join(self.path(source, symbol, timeframe), "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"rows": 0}
+
+    def arrays(self, source: str, symbol: str, timeframe: str) -> Dict[str, np.ndarray]:
+        """Read-only memory maps of the committed rows, oldest first."""
+        d = self.path(source, symbol, timeframe)
+        rows = int(self.meta(source, symbol, timeframe).get("rows", 0))
+        out: Dict[str, np.ndarray] = {}
+        for name, dtype in COLUMNS.items():
+            if rows == 0:
+                out[name] = np.zeros(0, dtype=dtype)
+            else:
+                out[name] = np.memmap(os.path.join(d, f"{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+        return out
+
+    def load(self, source: str, symbol: str, timeframe: str, tail: Optional[int] = None) -> pd.DataFrame:
+        """Cached bars as a time, open, high, low, close DataFrame (oldest first), optionally the last `tail`."""
+        cols = self.arrays(source, symbol, timeframe)
+        if tail is not None:
+            cols = {k: v[max(0, v.shape[0] - tail) :] for k, v in cols.items()}
+        return pd.DataFrame(cols, copy=False)
+
+    def last_time(self, source: str, symbol: str, timeframe: str) -> Optional[int]:
+        meta = self.meta(source, symbol, timeframe)
+        return meta.get("last_time") if meta.get("rows") else None
+
+    def append(self, source: str, symbol: str, timeframe: str, df: pd.DataFrame, meta: Optional[dict] = None) -> int:
+        """
+        Append the rows of `df` (oldest first) newer than the last cached bar; returns rows written.
+
+        `meta` entries are stored alongside the row count (e.g. source bookkeeping).
+        """
+        with self._locked(source, symbol, timeframe) as d:
+            current = self.meta(source, symbol, timeframe)
+            rows = int(current.get("rows", 0))
+            cols = _columns(df)
+            if rows and cols["time"].size:
+                cols = {k: v[cols["time"] > current["last_time"]] for k, v in cols.items()}
+            n = cols["time"].size
+            for name, dtype in COLUMNS.items():
+                with open(os.path.join(d, f"{name}.bin"), "ab+") as f:
+                    # drop anything a crashed writer left past the committed rows
+                    f.truncate(rows * dtype.itemsize)
+                    f.seek(rows * dtype.itemsize)
+                    f.write(cols[name].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            current.update(meta or {})
+            current["rows"] = rows + n
+            if n:
+                current["last_time"] = int(cols["time"][-1])
+            self._write_meta(d, current)
+            return n
+
+    def replace(self, source: str, symbol: str, timeframe: str, df: pd.DataFrame, meta: Optional[dict] = None) -> int:
+        """Drop the cached rows and store `df` instead."""
+        with self._locked(source, symbol, timeframe) as d:
+            self._write_meta(d, {"rows": 0})
+        return self.append(source, symbol, timeframe, df, meta)
+
+    def clear(self, source: str, symbol: str, timeframe: str) -> None:
+        shutil.rmtree(self.path(source, symbol, timeframe), ignore_errors=True)
+
+    @contextmanager
+    def _locked(self, source: str, symbol: str, timeframe: str) -> Iterator[str]:
+        d = self.path(source, symbol, timeframe)
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, ".lock"), "a+b") as lock:
+            _lock_file(lock)
+            try:
+                yield d
+            finally:
+                _unlock_file(lock)
+
+    @staticmethod
+    def _write_meta(d: str, meta: dict) -> None:
+        tmp = os.path.join(d, f"meta.json.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(d, "meta.json"))
+
+
+def cached_mt5_ohlc(cache: BarCache, session, symbol: str, timeframe: str = "M15", bars: int = 2000) -> pd.DataFrame:
+    """
+    Latest `bars` bars from MT5 through the cache: only bars newer than the last cached one are
+    fetched. The newest bar may still be forming, so it is returned but not cached.
+    """
+    source = "mt5"
+    last = cache.last_time(source, symbol, timeframe)
+    cached_rows = int(cache.meta(source, symbol, timeframe).get("rows", 0))
+    if last is None or cached_rows < bars - 1:
+        fresh = session.fetch(symbol, timeframe, bars)
+        cache.replace(source, symbol, timeframe, fresh.iloc[:-1])
+    else:
+        since = datetime.fromtimestamp(last + 1, tz=timezone.utc)
+        fresh = session.fetch(symbol, timeframe, bars, start_date=since, end_date=datetime.now(timezone.utc) + timedelta(days=1))
+        cache.append(source, symbol, timeframe, fresh.iloc[:-1])
+    if len(fresh) == 0:
+        return cache.load(source, symbol, timeframe, tail=bars)
+    cached = cache.load(source, symbol, timeframe, tail=bars - 1)
+    out = pd.concat([cached, fresh.iloc[-1:]], ignore_index=True)
+    return out.iloc[max(0, len(out) - bars) :].reset_index(drop=True)
+
+
+def cached_csv_ohlc(cache: BarCache, path: str) -> pd.DataFrame:
+    """
+    Whole CSV (time, open, high, low, close; oldest first) through the cache, time as datetime64.
+
+    Files are assumed to grow by appending whole rows: only the bytes after the last cached row
+    are parsed. If the file shrank or its cached prefix changed, it is re-read in full. Only
+    newline-terminated rows are read, since a writer may be in the middle of the last line; a
+    last row without a newline is picked up once it is terminated.
+    """
+    path = os.path.abspath(path)
+    source = "csv-" + hashlib.sha1(path.encode()).hexdigest()[:16]
+    symbol = os.path.splitext(os.path.basename(path))[0]
+    timeframe = "csv"
+    meta = cache.meta(source, symbol, timeframe)
+    offset = int(meta.get("csv_offset", 0))
+
+    with open(path, "rb") as f:
+        # size and mtime as of this read: bytes appended while reading are seen next time
+        st = os.fstat(f.fileno())
+        unchanged = meta.get("rows") and meta.get("csv_size") == st.st_size and meta.get("csv_mtime") == st.st_mtime
+        if unchanged or meta.get("rows") and st.st_size >= offset and _tail_matches(path, offset, meta.get("csv_tail", "")):
+            f.seek(offset)
+            data = f.read(st.st_size - offset)
+            rows = _complete_lines(data)
+            if rows.strip():
+                df = pd.read_csv(BytesIO(rows), header=None, names=meta["csv_header"])
+                cache.append(source, symbol, timeframe, _csv_frame(df), _csv_meta(path, meta["csv_header"], offset + len(rows), st))
+        else:
+            data = f.read(st.st_size)
+            rows = _complete_lines(data)
+            if not rows:
+                rows = data  # header only, without a newline
+            df = pd.read_csv(BytesIO(rows))
+            required = {"time", "open", "high", "low", "close"}
+            if not required.issubset(df.columns.str.lower()):
+                raise ValueError("CSV must contain columns: time, open, high, low, close")
+            header = list(df.columns)
+            cache.replace(source, symbol, timeframe, _csv_frame(df), _csv_meta(path, header, len(rows), st))
+
+    out = cache.load(source, symbol, timeframe)
+    out["time"] = pd.to_datetime(out["time"].to_numpy(), unit="s")
+    return out
+
+
+def _complete_lines(data: bytes) -> bytes:
+    """`data` up to and including its last newline."""
+    return data[: data.rfind(b"\n") + 1]
+
+
+def _csv_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.rename(columns=str.lower)
+    t = df["time"]
+    if pd.api.types.is_numeric_dtype(t):
+        secs = t.to_numpy(dtype=np.int64)
+    else:
+        secs = pd.to_datetime(t).to_numpy(dtype="datetime64[s]").astype(np.int64)
+    out = pd.DataFrame({"time": secs})
+    for name in ("open", "high", "low", "close"):
+        out[name] = df[name].to_numpy(dtype=float)
+    return out
+
+
+def _csv_meta(path: str, header, offset: int, st: os.stat_result) -> dict:
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - 64))
+        tail = f.read(min(64, offset))
+    return {
+        "csv_header": list(header),
+        "csv_offset": offset,
+        "csv_size": st.st_size,
+        "csv_mtime": st.st_mtime,
+        "csv_tail": tail.hex(),
+    }
+
+
+def _tail_matches(path: str, offset: int, tail_hex: str) -> bool:
+    tail = bytes.fromhex(tail_hex)
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - len(tail)))
+        return f.read(len(tail)) == tail
+
+
+def _columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    return {name: np.ascontiguousarray(df[name].to_numpy(dtype=dtype)) for name, dtype in COLUMNS.items()}
+
+
+def _safe(part: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(part))
+
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
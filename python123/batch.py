@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from multiprocessing import util as mp_util
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .points import price_arrays, triangles_from_points
+from .semafor import compute_semafor_pivots
+from .triangle_set import TIME_COLUMNS, TriangleSet, detect_123_triangle_set
+from .mt5_loader import TIMEFRAME_NAMES
+from .sources import SESSION_SOURCES, BarRequest, load_bars, open_session
+
+
+@dataclass(frozen=True)
+class ScanParams:
+    """Pipeline settings shared by every job of a batch (same meaning as the CLI flags)."""
+
+    periods: Tuple[int, ...] = (610, 377, 233, 144, 89, 55, 34, 8)
+    dev: int = 1
+    backstep: int = 1
+    big: int = 7
+    small: int = 8
+    maxdist: int = 10000
+    bars: int = 2000
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    cache_dir: Optional[str] = None
+    float32: bool = False
+    points: bool = False  # scan int32 point counts; dev and maxdist are then real points
+    point: Optional[float] = None  # point size for `points` (default: inferred from the prices)
+    data_dir: Optional[str] = None  # for the fake source
+    plot_dir: Optional[str] = None  # render SYMBOL_TF.png here (headless)
+    candles: bool = False
+
+
+@dataclass(frozen=True)
+class ScanJob:
+    """One series to scan: (symbol, timeframe) from a registered data source, or a CSV file at `path`."""
+
+    symbol: str
+    timeframe: str
+    path: Optional[str] = None
+    source: str = "mt5"
+
+
+@dataclass
+class ScanResult:
+    job: ScanJob
+    bars: int = 0
+    triangles: List[dict] = field(default_factory=list)
+    error: Optional[str] = None
+    chart: Optional[str] = None
+    triangle_set: Optional[TriangleSet] = None  # the columns behind `triangles`, with bar times
+    point: Optional[float] = None  # point size the prices were scanned at (params.points), inferred or given
+    stored: Optional[dict] = None  # {"run", "new", "changed"} once written to a TriangleStore
+
+    def to_json(self) -> str:
+        out = {"symbol": self.job.symbol, "timeframe": self.job.timeframe}
+        if self.job.path is not None:
+            out["path"] = self.job.path
+        if self.error is not None:
+            out["error"] = self.error
+        else:
+            out["bars"] = self.bars
+            out["triangles"] = self.triangles
+        if self.chart is not None:
+            out["chart"] = self.chart
+        if self.stored is not None:
+            out["stored"] = self.stored
+        return json.dumps(out)
+
+
+def mt5_jobs(symbols: Iterable[str], timeframes: Iterable[str], source: str = "mt5") -> List[ScanJob]:
+    timeframes = list(timeframes)
+    return [ScanJob(symbol, tf.upper(), source=source) for symbol in symbols for tf in timeframes]
+
+
+def csv_jobs(directory: str, symbols: Optional[Iterable[str]] = None, timeframes: Optional[Iterable[str]] = None) -> List[ScanJob]:
+    """
+    One job per `*.csv` in `directory`. Files named `SYMBOL_TF.csv` (as FakeMT5 reads them)
+    carry their timeframe; others get timeframe "CSV". `symbols`/`timeframes` filter the files.
+    """
+    wanted_symbols = {s for s in symbols} if symbols else None
+    wanted_tfs = {t.upper() for t in timeframes} if timeframes else None
+    jobs = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() != ".csv":
+            continue
+        symbol, tf = csv_series(name)
+        if wanted_symbols is not None and symbol not in wanted_symbols:
+            continue
+        if wanted_tfs is not None and tf not in wanted_tfs:
+            continue
+        jobs.append(ScanJob(symbol, tf, os.path.join(directory, name), source="csv"))
+    return jobs
+
+
+def csv_series(path: str) -> Tuple[str, str]:
+    """(symbol, timeframe) a CSV file stands for: `SYMBOL_TF.csv` -> (SYMBOL, TF), else (stem, "CSV")."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    symbol, _, tf = stem.rpartition("_")
+    if not symbol or tf.upper() not in TIMEFRAME_NAMES:
+        return stem, "CSV"
+    return symbol, tf.upper()
+
+
+def scan_set(highs: np.ndarray, lows: np.ndarray, params: ScanParams, times: Optional[np.ndarray] = None) -> TriangleSet:
+    """Semafor levels + 1-2-3 triangles for MT4-oriented arrays."""
+    sema = compute_semafor_pivots(highs=highs, lows=lows, periods=list(params.periods), deviation_points=params.dev, backstep=params.backstep)
+    return detect_123_triangle_set(sema, params.big, params.small, params.maxdist, params.bars, times=times)
+
+
+def scan_arrays(highs: np.ndarray, lows: np.ndarray, params: ScanParams, times: Optional[np.ndarray] = None) -> List[dict]:
+    """scan_set as JSON-ready dicts."""
+    return triangle_rows(scan_set(highs, lows, params, times))
+
+
+def triangle_rows(tris: TriangleSet) -> List[dict]:
+    rows = []
+    for rec in tris.to_records().tolist():
+        row = dict(zip(tris.columns, rec))
+        row["dir"] = "buy" if row["dir"] > 0 else "sell"
+        for name in TIME_COLUMNS:
+            if name in row:
+                row[name] = datetime.fromtimestamp(row[name] / 1e9, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append(row)
+    return rows
+
+
+def run_job(job: ScanJob, params: ScanParams, session=None) -> ScanResult:
+    """Load one series and scan it (and chart it with params.plot_dir); failures are reported in the result, not raised."""
+    try:
+        df = load_bars(job.source, job_request(job, params), session)
+        highs, lows, point = price_arrays(df, params.float32, params.points, params.point)
+        tris = scan_set(highs, lows, params, times=df["time"].to_numpy())
+        if point is not None:
+            tris = triangles_from_points(tris, point)
+        result = ScanResult(job, bars=int(highs.shape[0]), triangles=triangle_rows(tris), triangle_set=tris, point=point)
+        if params.plot_dir:
+            result.chart = render_chart(job, df, tris, params)
+        return result
+    except Exception as exc:
+        return ScanResult(job, error=f"{type(exc).__name__}: {exc}")
+
+
+def render_chart(job: ScanJob, df, tris: TriangleSet, params: ScanParams) -> str:
+    """Render the job's chart off-screen (Agg) to plot_dir/SYMBOL_TF.png and return its path."""
+    from .plot import plot_ohlc_with_triangles
+
+    os.makedirs(params.plot_dir, exist_ok=True)
+    path = os.path.join(params.plot_dir, f"{job.symbol}_{job.timeframe}.png")
+    # only the scanned window is charted; bar indices stay valid because the window starts at bar 0
+    plot_ohlc_with_triangles(
+        df.iloc[: params.bars],
+        tris,
+        title=f"{job.symbol} {job.timeframe} 1-2-3 Triangles",
+        out_path=path,
+        candles=params.candles,
+    )
+    return path
+
+
+def job_request(job: ScanJob, params: ScanParams) -> BarRequest:
+    return BarRequest(
+        symbol=job.symbol,
+        timeframe=job.timeframe,
+        bars=params.bars,
+        start_date=params.start_date,
+        end_date=params.end_date,
+        path=job.path or params.data_dir,
+        cache_dir=params.cache_dir,
+        float32=params.float32,
+    )
+
+
+def run_batch(jobs: Sequence[ScanJob], params: ScanParams, workers: Optional[int] = None) -> Iterator[ScanResult]:
+    """
+    Scan every job, yielding results as they finish (not in job order).
+
+    Jobs run on a process pool; each worker imports the pipeline once and keeps a single
+    MT5Session per session source (mt5, fake) for all of its jobs. workers=1 scans in this
+    process.
+    """
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1:
+        sessions: Dict[str, object] = {}
+        try:
+            for job in jobs:
+                yield _run_with_session(sessions, job, params)
+        finally:
+            for s in sessions.values():
+                s.close()
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_worker_job, job, params) for job in jobs]
+        for fut in as_completed(futures):
+            result = fut.result()
+            if result.triangle_set is not None:
+                result.triangles = triangle_rows(result.triangle_set)
+            yield result
+
+
+# per-process MT5 connections of pool workers, opened by the first job that needs one
+_worker_sessions: Dict[str, object] = {}
+
+
+def _run_with_session(sessions: Dict[str, object], job: ScanJob, params: ScanParams, finalize: bool = False) -> ScanResult:
+    """run_job with the (lazily opened) session of the job's source from `sessions`."""
+    session = None
+    if job.source in SESSION_SOURCES:
+        session = sessions.get(job.source)
+        if session is None:
+            try:
+                session = open_session(job.source, job_request(job, params))
+            except Exception as exc:
+                return ScanResult(job, error=f"{type(exc).__name__}: {exc}")
+            sessions[job.source] = session
+            if finalize:
+                # pool workers skip atexit; multiprocessing finalizers still run on worker exit
+                mp_util.Finalize(None, session.close, exitpriority=10)
+    return run_job(job, params, session)
+
+
+def _worker_job(job: ScanJob, params: ScanParams) -> ScanResult:
+    result = _run_with_session(_worker_sessions, job, params, finalize=True)
+    # only the columns are sent back; run_batch rebuilds the rows in the parent
+    result.triangles = []
+    return result
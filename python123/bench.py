@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .synthetic import generate_arrays
+
+STAGES = ("zigzag", "semafor", "pivots", "triangles", "triangles_indexed", "replay", "plot")
+
+DEPTH_SETS = {
+    "default": (610, 377, 233, 144, 89, 55, 34, 8),
+    "short": (144, 89, 55, 34, 21, 13, 8, 5),
+    "long": (2584, 1597, 987, 610, 377, 233, 144, 89),
+}
+
+
+def run_benchmarks(
+    sizes: Sequence[int],
+    depth_sets: Dict[str, Tuple[int, ...]],
+    backsteps: Sequence[int] = (1,),
+    stages: Sequence[str] = STAGES,
+    repeat: int = 3,
+    seed: int = 0,
+    dev: int = 1,
+    big: int = 7,
+    small: int = 8,
+    memory: bool = True,
+    plot_max_bars: int = 100_000,
+    replay_max_bars: int = 25_000,
+    log: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """
+    Time each pipeline stage on synthetic bars for every (size, depth set, backstep).
+
+    Each stage is timed `repeat` times and the best run is kept (the least disturbed by other
+    load); its inputs are computed outside the timer. Peak memory comes from one extra run under
+    tracemalloc, which NumPy reports its buffers to, so timings are not slowed by tracing.
+    Stage "zigzag" is one level at the largest depth of the set; "replay" closes the bars one
+    at a time (replay.replay, big/small levels, 2000 bars scanned) and is skipped above
+    `replay_max_bars`; "plot" renders to a PNG with the Agg backend and is skipped above
+    `plot_max_bars`.
+    """
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages: {sorted(unknown)}")
+    results: List[dict] = []
+    for n in sizes:
+        bars = generate_arrays(n, seed)
+        # MT4 orientation: newest first
+        highs = np.ascontiguousarray(bars["high"][::-1])
+        lows = np.ascontiguousarray(bars["low"][::-1])
+        for set_name, periods in depth_sets.items():
+            for backstep in backsteps:
+                ctx = _Context(highs, lows, bars, list(periods), dev, backstep, big, small, n)
+                for stage in stages:
+                    if stage == "plot" and n > plot_max_bars or stage == "replay" and n > replay_max_bars:
+                        continue
+                    fn = ctx.stage(stage)
+                    seconds = min(_timed(fn) for _ in range(max(1, repeat)))
+                    peak = _peak_bytes(fn) if memory else None
+                    row = {
+                        "stage": stage,
+                        "bars": n,
+                        "depth_set": set_name,
+                        "periods": list(periods),
+                        "backstep": backstep,
+                        "seconds": seconds,
+                        "bars_per_s": n / seconds if seconds > 0 else float("inf"),
+                        "peak_mb": peak / 2**20 if peak is not None else None,
+                    }
+                    results.append(row)
+                    if log is not None:
+                        log(_format_row(row))
+    return {"meta": _meta(repeat, seed, dev, big, small), "results": results, "slowest": _slowest(results)}
+
+
+class _Context:
+    """Stage callables for one configuration; inputs of later stages are built lazily, untimed."""
+
+    def __init__(self, highs, lows, bars, periods, dev, backstep, big, small, n):
+        self.highs, self.lows, self.bars = highs, lows, bars
+        self.periods, self.dev, self.backstep = periods, dev, backstep
+        self.big, self.small, self.n = big, small, n
+        self._levels = None
+        self._pivots = None
+
+    def levels(self):
+        from .semafor import compute_semafor_levels
+
+        if self._levels is None:
+            self._levels = compute_semafor_levels(self.highs, self.lows, self.periods, self.dev, self.backstep)
+        return self._levels
+
+    def pivots(self):
+        from .pivots import PivotSet
+
+        if self._pivots is None:
+            self._pivots = PivotSet.from_dense(self.levels())
+        return self._pivots
+
+    def stage(self, name: str) -> Callable[[], object]:
+        from .zigzag import compute_zigzag_buffers
+        from .semafor import compute_semafor_levels, compute_semafor_pivots
+        from .triangles import detect_123_triangles, detect_123_triangles_indexed
+
+        h, l, p, dev, bs = self.highs, self.lows, self.periods, self.dev, self.backstep
+        if name == "zigzag":
+            return lambda: compute_zigzag_buffers(h, l, max(p), dev, bs)
+        if name == "semafor":
+            return lambda: compute_semafor_levels(h, l, p, dev, bs)
+        if name == "pivots":
+            return lambda: compute_semafor_pivots(h, l, p, dev, bs)
+        if name == "triangles":
+            levels = self.levels()
+            return lambda: detect_123_triangles(levels, self.big, self.small, 10000, self.n)
+        if name == "triangles_indexed":
+            pivots = self.pivots()
+            return lambda: detect_123_triangles_indexed(pivots, self.big, self.small, 10000, self.n)
+        if name == "replay":
+            from .replay import replay
+
+            return lambda: replay(h, l, p, dev, bs, self.big, self.small, 10000, 2000)
+        if name == "plot":
+            return self._plot_stage()
+        raise ValueError(f"unknown stage: {name}")
+
+    def _plot_stage(self) -> Callable[[], object]:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import pandas as pd
+        from .plot import plot_ohlc_with_triangles
+        from .triangles import detect_123_triangles_indexed
+
+        df = pd.DataFrame({k: np.ascontiguousarray(v[::-1]) for k, v in self.bars.items()})
+        tris = detect_123_triangles_indexed(self.pivots(), self.big, self.small, 10000, self.n)
+        path = os.path.join(tempfile.gettempdir(), f"python123-bench-{os.getpid()}.png")
+        return lambda: plot_ohlc_with_triangles(df, tris, show=False, out_path=path)
+
+
+def cold_start(bars: int = 10_000, repeat: int = 5, seed: int = 0, log: Optional[Callable[[str], None]] = None) -> List[dict]:
+    """
+    Wall time of fresh interpreters: `import python123.cli` alone ("cold_import") and a full
+    `python -m python123.cli --csv` run over `bars` synthetic bars ("cold_csv_run"). This is
+    what a cron job or a shell loop pays per call; best of `repeat`.
+    """
+    from .synthetic import generate_ohlc
+
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix="python123-cold-")
+    os.close(fd)
+    try:
+        generate_ohlc(bars, seed).to_csv(path, index=False)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_package_root(), os.environ.get("PYTHONPATH")])))
+        commands = {
+            "cold_import": [sys.executable, "-c", "import python123.cli"],
+            "cold_csv_run": [sys.executable, "-m", "python123.cli", "--csv", path, "--bars", str(bars)],
+        }
+        rows = []
+        for stage, cmd in commands.items():
+            seconds = min(_timed_process(cmd, env) for _ in range(max(1, repeat)))
+            row = {
+                "stage": stage,
+                "bars": bars if stage == "cold_csv_run" else 0,
+                "depth_set": "default",
+                "periods": list(DEPTH_SETS["default"]),
+                "backstep": 1,
+                "seconds": seconds,
+                "bars_per_s": None,
+                "peak_mb": None,
+            }
+            rows.append(row)
+            if log is not None:
+                log(_format_row(row))
+        return rows
+    finally:
+        os.unlink(path)
+
+
+def _package_root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _timed_process(cmd: List[str], env: Dict[str, str]) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def _timed(fn: Callable[[], object]) -> float:
+    gc.collect()
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _peak_bytes(fn: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _meta(repeat: int, seed: int, dev: int, big: int, small: int) -> dict:
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "seed": seed,
+        "dev": dev,
+        "big": big,
+        "small": small,
+    }
+
+
+def _key(row: dict) -> tuple:
+    return (row["stage"], row["bars"], tuple(row["periods"]), row["backstep"])
+
+
+def _slowest(results: List[dict]) -> List[dict]:
+    """Slowest stage for each (bars, periods, backstep) configuration."""
+    worst: Dict[tuple, dict] = {}
+    for row in results:
+        cfg = _key(row)[1:]
+        if cfg not in worst or row["seconds"] > worst[cfg]["seconds"]:
+            worst[cfg] = row
+    return [
+        {"bars": r["bars"], "depth_set": r["depth_set"], "backstep": r["backstep"], "stage": r["stage"], "seconds": r["seconds"]}
+        for r in worst.values()
+    ]
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25, min_seconds: float = 0.005) -> List[dict]:
+    """
+    Rows of `current` slower than the matching baseline row by more than `tolerance`
+    (0.25 = 25%). Stages faster than `min_seconds` in the baseline are too noisy to judge.
+    """
+    base = {_key(r): r for r in baseline.get("results", [])}
+    out = []
+    for row in current.get("results", []):
+        ref = base.get(_key(row))
+        if ref is None or ref["seconds"] < min_seconds:
+            continue
+        ratio = row["seconds"] / ref["seconds"]
+        if ratio > 1 + tolerance:
+            out.append({**row, "baseline_seconds": ref["seconds"], "ratio": ratio})
+    return out
+
+
+def _format_row(row: dict) -> str:
+    mem = f"{row['peak_mb']:9.1f} MB" if row["peak_mb"] is not None else ""
+    rate = f"{row['bars_per_s']:14,.0f} bars/s" if row["bars_per_s"] is not None else " " * 21
+    return (
+        f"{row['stage']:<18} {row['bars']:>10,} {row['depth_set']:<8} bs={row['backstep']:<2} "
+        f"{row['seconds'] * 1e3:10.2f} ms {rate} {mem}"
+    )
+
+
+def _int_list(s: str) -> List[int]:
+    return [int(x) for x in str(s).split(",") if x.strip()]
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m python123.bench", description="Benchmark zigzag, semafor, triangle, replay and plot stages")
+    p.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated bar counts (e.g. 10000,...,10000000)")
+    p.add_argument("--depth-sets", dest="depth_sets", default="default", help=f"Comma-separated presets ({', '.join(DEPTH_SETS)})")
+    p.add_argument("--periods", action="append", help="Extra comma-separated depth set; repeatable")
+    p.add_argument("--backsteps", default="1", help="Comma-separated backstep values")
+    p.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    p.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best is kept)")
+    p.add_argument("--seed", type=int, default=0, help="Generator seed")
+    p.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the tracemalloc peak-memory run")
+    p.add_argument("--plot-max-bars", dest="plot_max_bars", type=int, default=100_000, help="Skip plotting above this many bars")
+    p.add_argument("--replay-max-bars", dest="replay_max_bars", type=int, default=25_000, help="Skip the bar-by-bar replay above this many bars")
+    p.add_argument("--cold-start", dest="cold_start", action="store_true", help="Also time fresh-interpreter CLI import and a --csv run")
+    p.add_argument("--out", help="Write results JSON here")
+    p.add_argument("--baseline", help="Compare against this results JSON and exit 1 on regressions")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = p.parse_args(argv)
+
+    sets: Dict[str, Tuple[int, ...]] = {}
+    for name in (x.strip() for x in args.depth_sets.split(",") if x.strip()):
+        if name not in DEPTH_SETS:
+            p.error(f"unknown depth set {name!r}; choose from {', '.join(DEPTH_SETS)}")
+        sets[name] = DEPTH_SETS[name]
+    for s in args.periods or []:
+        sets[s] = tuple(_int_list(s))
+
+    report = run_benchmarks(
+        sizes=_int_list(args.sizes),
+        depth_sets=sets,
+        backsteps=_int_list(args.backsteps),
+        stages=[x.strip() for x in args.stages.split(",") if x.strip()],
+        repeat=args.repeat,
+        seed=args.seed,
+        memory=args.memory,
+        plot_max_bars=args.plot_max_bars,
+        replay_max_bars=args.replay_max_bars,
+        log=lambda line: print(line, flush=True),
+    )
+    if args.cold_start:
+        report["results"].extend(cold_start(repeat=args.repeat, seed=args.seed, log=lambda line: print(line, flush=True)))
+    print()
+    for row in report["slowest"]:
+        print(f"slowest @ {row['bars']:,} bars {row['depth_set']} bs={row['backstep']}: {row['stage']} ({row['seconds'] * 1e3:.2f} ms)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for r in regressions:
+            print(
+                f"REGRESSION {r['stage']} @ {r['bars']:,} bars {r['depth_set']} bs={r['backstep']}: "
+                f"{r['seconds'] * 1e3:.2f} ms vs {r['baseline_seconds'] * 1e3:.2f} ms (x{r['ratio']:.2f})",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from .extrema import RangeExtremaIndex
+from .pivots import PivotSet
+from .triangle_set import TriangleSet
+from .triangles import _indexed_columns
+from .zigzag import _select_pivots
+
+# on-disk records; t is the bar time (oldest bar = 0), which does not depend on the series length
+PIVOT_DTYPE = np.dtype([("t", "<i8"), ("price", "<f8")])
+TRIANGLE_DTYPE = np.dtype(
+    [("dir", "i1"), ("t1", "<i8"), ("price1", "<f8"), ("t2", "<i8"), ("price2", "<f8"), ("t3", "<i8"), ("price3", "<f8")]
+)
+
+
+class ChunkedResult:
+    """
+    Pivots and triangles written by compute_semafor_chunked, read back from `out_dir`.
+
+    Files are memory-mapped, so only what is asked for is loaded. pivots() and triangles()
+    return the same PivotSet / TriangleSet (MT4 indices) as an in-memory run on the whole series.
+    """
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        with open(os.path.join(out_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.n: int = self.meta["n"]
+
+    @property
+    def levels(self) -> List[int]:
+        return list(self.meta["levels"])
+
+    def records(self, level: int, side: str) -> np.ndarray:
+        """Raw pivot records (t, price) of `level`, side "lows" or "highs", oldest first."""
+        return _read(os.path.join(self.out_dir, f"level{level}_{side}.bin"), PIVOT_DTYPE)
+
+    def pivots(self, levels: Optional[Iterable[int]] = None) -> PivotSet:
+        lows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        highs: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for lvl in self.levels if levels is None else levels:
+            for side, out in (("lows", lows), ("highs", highs)):
+                rec = self.records(lvl, side)[::-1]
+                out[lvl] = (self.n - 1 - rec["t"], np.ascontiguousarray(rec["price"]))
+        return PivotSet(self.n, lows, highs)
+
+    def triangles(self, times: Optional[np.ndarray] = None) -> TriangleSet:
+        """Triangles in detect_123_triangles order; `times` (MT4 orientation) adds time1..time3."""
+        rec = _read(os.path.join(self.out_dir, "triangles.bin"), TRIANGLE_DTYPE)
+        last = self.n - 1
+        return TriangleSet.from_columns(
+            rec["dir"], last - rec["t1"], rec["price1"], last - rec["t2"], rec["price2"], last - rec["t3"], rec["price3"], times=times
+        )
+
+
+def compute_semafor_chunked(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    out_dir: str,
+    big_level: Optional[int] = None,
+    small_level: Optional[int] = None,
+    max_distance_points: int = 10000,
+    max_bars_scan: Optional[int] = None,
+    chunk_bars: int = 1_000_000,
+) -> ChunkedResult:
+    """
+    compute_semafor_pivots (+ detect_123_triangle_set with big/small levels) for series too
+    long for memory, streaming the results to `out_dir`.
+
+    - highs, lows: MT4 orientation like compute_semafor_levels, typically np.memmap
+      (e.g. BarCache.arrays(...)["high"][::-1]); only one window is read at a time.
+    - chunk_bars: new bars per window. Each window also re-reads max(periods) older bars
+      (the warm-up for the window extrema) and finalizes all but its newest `backstep` bars,
+      the bars a later bar can still clear.
+    - max_bars_scan: triangle anchors scanned back from the newest bar (default: all).
+
+    The final pass of CountZZ (at most one pivot per run of same-side pivots) only ever
+    revisits the best pivot of the current run, so it runs as a small per-level state carried
+    across windows. Triangles of an anchor are emitted once the next big-level pivot is final.
+    Memory therefore stays proportional to chunk_bars however long the history is, and the
+    output is identical to an in-memory run. Prices must be positive.
+    """
+    n = int(highs.shape[0])
+    if lows.shape[0] != n:
+        raise ValueError("highs and lows must have the same length")
+    if chunk_bars < 1:
+        raise ValueError("chunk_bars must be >= 1")
+    if (big_level is None) != (small_level is None):
+        raise ValueError("pass both big_level and small_level, or neither")
+    os.makedirs(out_dir, exist_ok=True)
+    levels = list(range(1, len(periods) + 1))
+    meta = {
+        "n": n,
+        "periods": list(periods),
+        "levels": levels,
+        "deviation_points": deviation_points,
+        "backstep": backstep,
+        "big_level": big_level,
+        "small_level": small_level,
+        "max_distance_points": max_distance_points,
+        "max_bars_scan": max_bars_scan,
+    }
+
+    writers = {}
+    try:
+        for lvl in levels:
+            for side in ("lows", "highs"):
+                writers[(lvl, side)] = open(os.path.join(out_dir, f"level{lvl}_{side}.bin"), "wb")
+        tri_file = open(os.path.join(out_dir, "triangles.bin"), "wb")
+        writers["triangles"] = tri_file
+
+        if n < max(periods):
+            # shorter than the longest window: CountZZ clamps that window to the whole series
+            _write_in_memory(highs, lows, periods, deviation_points, backstep, writers, big_level, small_level, max_distance_points, max_bars_scan)
+        else:
+            streams = [_LevelStream(d, deviation_points, backstep) for d in periods]
+            tris = None
+            if big_level is not None:
+                tris = _TriangleStream(n, big_level, small_level, max_distance_points, n - 1 if max_bars_scan is None else max_bars_scan)
+            warm = max(periods)
+            fin = 0
+            while fin < n:
+                hi = min(n, fin + chunk_bars + backstep)
+                upto = n if hi == n else hi - backstep
+                lo = max(0, fin - warm)
+                # MT4 slice: local index 0 is bar time hi - 1
+                h = np.ascontiguousarray(highs[n - hi : n - lo], dtype=np.float64)
+                l = np.ascontiguousarray(lows[n - hi : n - lo], dtype=np.float64)
+                if not (np.all(h > 0) and np.all(l > 0)):
+                    raise ValueError("prices must be positive for chunked processing")
+                index = RangeExtremaIndex(h, l, periods)
+                for lvl, s in zip(levels, streams):
+                    s.advance(index, h, l, hi, fin, upto)
+                    if upto == n:
+                        s.finish()
+                    new = s.drain()
+                    for side, rec in new.items():
+                        rec.tofile(writers[(lvl, side)])
+                    if tris is not None and lvl in (big_level, small_level):
+                        tris.add(lvl, new)
+                if tris is not None:
+                    frontier = min(streams[big_level - 1].frontier(upto), streams[small_level - 1].frontier(upto))
+                    tris.resolve(frontier, final=upto == n).tofile(tri_file)
+                fin = upto
+    finally:
+        for f in writers.values():
+            f.close()
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return ChunkedResult(out_dir)
+
+
+class _LevelStream:
+    """One zigzag level advanced window by window; emits final pivots in time order."""
+
+    def __init__(self, depth: int, deviation_points: int, backstep: int):
+        self.depth = depth
+        self.dev = deviation_points
+        self.backstep = backstep
+        # state of the MQL4 cutting loop (prices and bar times), see zigzag._cut_pivots_loop
+        self.last_high = -1.0
+        self.last_low = -1.0
+        self.pending_high: Optional[Tuple[int, float]] = None
+        self.pending_low: Optional[Tuple[int, float]] = None
+        self._out: Dict[str, List[Tuple[int, float]]] = {"lows": [], "highs": []}
+
+    def advance(self, index: RangeExtremaIndex, h: np.ndarray, l: np.ndarray, hi: int, fin: int, upto: int) -> None:
+        """Finalize bar times [fin, upto); h, l and `index` cover bars up to time hi - 1 (local index 0)."""
+        d = self.depth
+        start = max(fin, d - 1)
+        if start >= upto:
+            return
+        # window of bars [start - d, hi): its oldest extremum (bar start - 1) only serves as
+        # the "previous" one, except at the series start where MQL4 also begins at bar d - 1
+        m = hi - max(0, start - d)
+        win_low = index.window_min(d)[: m - d + 1]
+        win_high = index.window_max(d)[: m - d + 1]
+        low_sel = _select_pivots(l[:m], win_low, self.dev, self.backstep, is_low=True)
+        high_sel = _select_pivots(h[:m], win_high, self.dev, self.backstep, is_low=False)
+        # local j <-> time hi - 1 - j; walk [start, upto) oldest first
+        js = np.arange(hi - 1 - start, hi - 1 - upto, -1)
+        ev = js[(low_sel[js] != 0.0) | (high_sel[js] != 0.0)]
+        for j, curlow, curhigh in zip(ev.tolist(), low_sel[ev].tolist(), high_sel[ev].tolist()):
+            self._cut(hi - 1 - j, curhigh, curlow)
+
+    def _cut(self, t: int, curhigh: float, curlow: float) -> None:
+        # MQL4 loop with positive prices: only the best pivot of the running side can still be cleared
+        if curhigh != 0.0:
+            if self.last_high > 0 and self.last_high >= curhigh:
+                pass  # the current high loses to the run's best
+            else:
+                # the run's previous best is cleared (last_high > 0) or the run starts here
+                self.pending_high = (t, curhigh)
+                self.last_high = curhigh
+            self._emit("lows", self.pending_low)
+            self.pending_low = None
+            self.last_low = -1.0
+        if curlow != 0.0:
+            if not (self.last_low > 0 and self.last_low <= curlow):
+                self.pending_low = (t, curlow)
+                self.last_low = curlow
+            self._emit("highs", self.pending_high)
+            self.pending_high = None
+            self.last_high = -1.0
+
+    def _emit(self, side: str, pivot: Optional[Tuple[int, float]]) -> None:
+        if pivot is None:
+            return
+        # MQL4 clears the low of the oldest scanned bar after the cutting pass
+        if side == "lows" and pivot[0] == self.depth - 1:
+            return
+        self._out[side].append(pivot)
+
+    def frontier(self, upto: int) -> int:
+        """Bar time before which every pivot of this level is final."""
+        f = upto
+        for p in (self.pending_high, self.pending_low):
+            if p is not None:
+                f = min(f, p[0])
+        return f
+
+    def drain(self) -> Dict[str, np.ndarray]:
+        """Pivots finalized since the last drain, per side, oldest first."""
+        out = {}
+        for side, items in self._out.items():
+            out[side] = np.array(items, dtype=PIVOT_DTYPE) if items else np.zeros(0, dtype=PIVOT_DTYPE)
+            self._out[side] = []
+        return out
+
+    def finish(self) -> None:
+        # end of data: the running best of each side is final
+        self._emit("highs", self.pending_high)
+        self._emit("lows", self.pending_low)
+        self.pending_high = self.pending_low = None
+
+
+class _TriangleStream:
+    """
+    Triangles of final anchors. An anchor's scan only sees the pivots between it and the next
+    newer big-level pivot (or the newest bar), so it is resolved once that pivot is final.
+    """
+
+    def __init__(self, n: int, big_level: int, small_level: int, max_distance_points: int, max_bars_scan: int):
+        self.n = n
+        self.big = big_level
+        self.small = small_level
+        self.maxdist = max_distance_points
+        # oldest anchor time still scanned from the newest bar
+        self.oldest = n - 1 - max_bars_scan
+        self._buf: Dict[Tuple[int, str], np.ndarray] = {
+            (lvl, side): np.zeros(0, dtype=PIVOT_DTYPE) for lvl in (big_level, small_level) for side in ("lows", "highs")
+        }
+
+    def add(self, level: int, new: Dict[str, np.ndarray]) -> None:
+        for side, rec in new.items():
+            if len(rec):
+                self._buf[(level, side)] = np.concatenate([self._buf[(level, side)], rec])
+
+    def resolve(self, frontier: int, final: bool) -> np.ndarray:
+        """Triangles of every anchor that pivots before `frontier` (all, if final) settle; oldest first."""
+        big_t = np.union1d(self._buf[(self.big, "lows")]["t"], self._buf[(self.big, "highs")]["t"])
+        if final:
+            top = self.n - 1
+        else:
+            big_t = big_t[big_t < frontier]
+            if big_t.size < 2:
+                return np.zeros(0, dtype=TRIANGLE_DTYPE)
+            top = int(big_t[-1])
+        if big_t.size == 0:
+            return np.zeros(0, dtype=TRIANGLE_DTYPE)
+
+        # local PivotSet whose bar 0 is `top`: same segments as the full series for these anchors
+        first = int(big_t[0])
+        lows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        highs: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for (lvl, side), rec in self._buf.items():
+            rec = rec[(rec["t"] >= first) & (rec["t"] <= top)][::-1]
+            (lows if side == "lows" else highs)[lvl] = (top - rec["t"], rec["price"])
+        local_n = top - first + 1
+        cols = _indexed_columns(PivotSet(local_n, lows, highs), self.big, self.small, self.maxdist, local_n)
+
+        if final:
+            for key in self._buf:
+                self._buf[key] = self._buf[key][:0]
+        else:
+            # `top` is the next anchor to resolve; nothing older is needed any more
+            for key, rec in self._buf.items():
+                self._buf[key] = rec[rec["t"] >= top]
+
+        out = _triangle_records(cols, top)
+        return out[out["t1"] >= self.oldest]
+
+
+def _write_in_memory(highs, lows, periods, deviation_points, backstep, writers, big_level, small_level, max_distance_points, max_bars_scan) -> None:
+    from .semafor import compute_semafor_pivots
+
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    n = highs.shape[0]
+    pivots = compute_semafor_pivots(highs, lows, periods, deviation_points, backstep)
+    for lvl in pivots.levels:
+        for side, (pos, price) in (("lows", pivots.lows(lvl)), ("highs", pivots.highs(lvl))):
+            rec = np.zeros(pos.size, dtype=PIVOT_DTYPE)
+            rec["t"] = n - 1 - pos[::-1].astype(np.int64)
+            rec["price"] = price[::-1]
+            rec.tofile(writers[(lvl, side)])
+    if big_level is not None:
+        cols = _indexed_columns(pivots, big_level, small_level, max_distance_points, n - 1 if max_bars_scan is None else max_bars_scan)
+        _triangle_records(cols, n - 1).tofile(writers["triangles"])
+
+
+def _triangle_records(cols: Tuple[np.ndarray, ...], top: int) -> np.ndarray:
+    """_indexed_columns output (bars counted back from time `top`) as TRIANGLE_DTYPE records."""
+    out = np.zeros(cols[0].size, dtype=TRIANGLE_DTYPE)
+    out["dir"] = cols[0]
+    for i, name in enumerate(("1", "2", "3")):
+        out["t" + name] = top - cols[1 + 2 * i]
+        out["price" + name] = cols[2 + 2 * i]
+    return out
+
+
+def _read(path: str, dtype: np.dtype) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def open_result(out_dir: str) -> ChunkedResult:
+    """Results of an earlier compute_semafor_chunked run."""
+    return ChunkedResult(out_dir)
+
+
+def main(argv=None) -> int:
+    """`python -m python123.cli chunked ...`: scan a cached history window by window into --out-dir."""
+    from .bar_cache import BarCache
+
+    p = argparse.ArgumentParser(prog="python -m python123.cli chunked", description="Out-of-core semafor/triangle scan of a cached history")
+    p.add_argument("--cache-dir", dest="cache_dir", help="Bar cache directory (default: BAR_CACHE_DIR or ~/.cache/python123)")
+    p.add_argument("--cache-source", dest="cache_source", default="mt5", help="Source the bars were cached from")
+    p.add_argument("--symbol", required=True)
+    p.add_argument("--timeframe", default="M15")
+    p.add_argument("--out-dir", dest="out_dir", required=True, help="Directory for the level/triangle files and meta.json")
+    p.add_argument("--chunk-bars", dest="chunk_bars", type=int, default=1_000_000, help="New bars per window")
+    p.add_argument("--periods", default="610,377,233,144,89,55,34,8", help="Comma-separated depths")
+    p.add_argument("--dev", type=int, default=1, help="Deviation in points")
+    p.add_argument("--backstep", type=int, default=1)
+    p.add_argument("--big", type=int, default=7, help="Big level index (1-based)")
+    p.add_argument("--small", type=int, default=8, help="Small level index (1-based)")
+    p.add_argument("--maxdist", type=int, default=10000, help="Max distance between point1 and point2 (points)")
+    p.add_argument("--bars", type=int, help="Max bars scanned back for triangle anchors (default: all)")
+    args = p.parse_args(argv)
+
+    cols = BarCache(args.cache_dir).arrays(args.cache_source, args.symbol, args.timeframe)
+    if len(cols["high"]) == 0:
+        print(f"Error: no cached bars for {args.symbol} {args.timeframe.upper()}", file=sys.stderr)
+        return 2
+    try:
+        result = compute_semafor_chunked(
+            cols["high"][::-1],
+            cols["low"][::-1],
+            [int(x) for x in args.periods.split(",") if x.strip()],
+            args.dev,
+            args.backstep,
+            args.out_dir,
+            big_level=args.big,
+            small_level=args.small,
+            max_distance_points=args.maxdist,
+            max_bars_scan=args.bars,
+            chunk_bars=args.chunk_bars,
+        )
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    pivots = {lvl: len(result.records(lvl, "lows")) + len(result.records(lvl, "highs")) for lvl in result.levels}
+    print(json.dumps({"out_dir": args.out_dir, "bars": result.n, "pivots": pivots, "triangles": len(result.triangles())}))
+    return 0
@@ -3,27 +3,20 @@ from __future__ import annotations
 import argparse
 import os
 import sys
-import pandas as pd
-import numpy as np
+from dataclasses import replace
 from typing import Optional
 from datetime import datetime
 
-try:
-    # Allow configuration via .env file
-    from dotenv import load_dotenv  # type: ignore
-
-    load_dotenv()
-except Exception:
-    # Optional dependency; proceed if not installed
-    pass
+# Only the standard library and the cheap core are imported here: pandas, the data sources and
+# matplotlib are imported when a run actually needs them.
+from .env import load_env
+from .metrics import METRICS
+from .sources import BarRequest, available_sources, load_bars
 
-from .semafor import compute_semafor_levels
-from .triangles import detect_123_triangles
-from .mt5_loader import fetch_ohlc
-from .plot import plot_ohlc_with_triangles
 
+def load_csv(path: str) -> "pd.DataFrame":  # noqa: F821
+    import pandas as pd
 
-def load_csv(path: str) -> pd.DataFrame:
     df = pd.read_csv(path)
     # Expect columns: time, open, high, low, close
     required = {"time", "open", "high", "low", "close"}
@@ -37,13 +30,43 @@ def load_csv(path: str) -> pd.DataFrame:
 
 
 def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] == "sweep":
+        from .sweep import main as sweep_main
+
+        return sweep_main(argv[1:])
+    if argv and argv[0] == "serve":
+        from .service import main as serve_main
+
+        load_env()
+        return serve_main(argv[1:])
+    if argv and argv[0] == "chunked":
+        from .chunked import main as chunked_main
+
+        return chunked_main(argv[1:])
+    if argv and argv[0] == "confluence":
+        from .confluence import main as confluence_main
+
+        load_env()
+        return confluence_main(argv[1:])
+
+    # Allow configuration via .env file
+    load_env()
     p = argparse.ArgumentParser(description="Detect 1-2-3 triangles from OHLC data (CSV or MT5)")
     src = p.add_mutually_exclusive_group(required=False)
     src.add_argument("--csv", help="Path to CSV with columns time,open,high,low,close")
     src.add_argument("--mt5", action="store_true", help="Use MetaTrader5 terminal as data source")
+    src.add_argument("--csv-dir", dest="csv_dir", help="Batch mode: scan every *.csv (SYMBOL_TF.csv or SYMBOL.csv) in this directory")
+    src.add_argument("--ticks", help="Tick file (.csv with time/time_msc and bid/ask/last, or .npy of MT5 ticks): build --timeframes bars in one pass and scan each")
+    src.add_argument("--source", help=f"Data source by name ({', '.join(available_sources())}); cache reads bars cached from MT5, fake serves CSVs through the MT5 API")
     p.add_argument("--use-env", action="store_true", help="Fill missing args (or override defaults) from environment variables")
     p.add_argument("--symbol", help="Symbol for MT5 source, e.g., EURUSD")
     p.add_argument("--timeframe", default="M15", help="MT5 timeframe, e.g., M15,H1,D1")
+    p.add_argument("--symbols", help="Batch mode: comma-separated MT5 symbols (filters files with --csv-dir)")
+    p.add_argument("--timeframes", help="Batch mode: comma-separated timeframes, e.g., M15,H1,H4 (default: --timeframe)")
+    p.add_argument("--workers", type=int, help="Batch mode: worker processes (default: CPU count)")
+    p.add_argument("--tick-price", dest="tick_price", default="bid", choices=["bid", "ask", "last"], help="Tick price that bars are built from")
+    p.add_argument("--data-dir", dest="data_dir", help="Directory of SYMBOL_TF.csv files for --source fake (default: FAKE_MT5_DATA)")
     p.add_argument("--bars", type=int, default=2000, help="Max bars to scan")
     p.add_argument("--start-date", dest="start_date", help="Start datetime (YYYY-MM-DD[ HH:MM[:SS]])")
     p.add_argument("--end-date", dest="end_date", help="End datetime (YYYY-MM-DD[ HH:MM[:SS]])")
@@ -55,7 +78,23 @@ def main(argv=None):
     p.add_argument("--maxdist", type=int, default=10000, help="Max distance between point2 and point1 (points)")
     p.add_argument("--plot", action="store_true", help="Render a plot of detected triangles")
     p.add_argument("--out", help="Path to save plot (PNG)")
+    p.add_argument("--candles", action="store_true", help="Plot OHLC candlesticks instead of the close line")
+    p.add_argument("--plot-levels", dest="plot_levels", help="Comma-separated semafor levels to overlay as pivots joined by zigzag lines, e.g. 7,8")
+    p.add_argument("--plot-dir", dest="plot_dir", help="Batch mode: render one SYMBOL_TF.png per series here (in the workers, headless)")
+    p.add_argument("--store", help="Upsert detected triangles into this SQLite database (keyed by symbol, timeframe, parameters, point-1 time and direction)")
+    p.add_argument("--new-only", dest="new_only", action="store_true", help="With --store: only report triangles that are new or changed since the previous runs")
+    p.add_argument("--cache-dir", dest="cache_dir", help="Keep bars in an on-disk cache here and only load new ones (MT5 without dates, or CSV)")
+    p.add_argument("--float32", action="store_true", help="Keep prices as float32 (half the memory on very large files)")
+    p.add_argument("--points", action="store_true", help="Scan integer point counts (int32): --dev and --maxdist become real points, as in MT4")
+    p.add_argument("--point", type=float, help="Point size for --points, e.g. 0.00001 (default: inferred from the price digits)")
+    p.add_argument("--profile", action="store_true", help="Print per-stage timings (load, semafor levels, triangles, plot) to stderr")
+    p.add_argument("--metrics-json", dest="metrics_json", help="Write stage timings and counters as JSON to this path")
+    p.add_argument("--profile-stage", dest="profile_stage", help="Run one stage (e.g. semafor, semafor.level1, triangles) under cProfile")
+    p.add_argument("--profile-out", dest="profile_out", help="Save the --profile-stage cProfile stats here (.prof) instead of printing them")
+    p.add_argument("--trace-memory", dest="trace_memory", action="store_true", help="Also record the tracemalloc peak of --profile-stage")
     args = p.parse_args(argv)
+    if args.new_only and not args.store:
+        p.error("--new-only requires --store")
 
     def _env_bool(name: str) -> Optional[bool]:
         v = os.getenv(name)
@@ -76,6 +115,8 @@ def main(argv=None):
         if not s or str(s).strip() == "":
             return None
         # Accept common formats; rely on pandas for robustness
+        import pandas as pd
+
         ts = pd.to_datetime(s, errors="raise")
         # Convert pandas Timestamp to naive datetime (no tz) for MT5
         if hasattr(ts, "to_pydatetime"):
@@ -87,22 +128,23 @@ def main(argv=None):
             dt = dt.replace(tzinfo=None)
         return dt
 
-    # If neither --csv nor --mt5 provided, try DATA_SOURCE from env
-    if not args.mt5 and not args.csv:
+    def _source_from_env() -> None:
         source = os.getenv("DATA_SOURCE", "").strip().lower()
         if source == "mt5":
             args.mt5 = True
         elif source == "csv":
             args.csv = os.getenv("CSV_PATH")
+        elif source in available_sources():
+            args.source = source
+
+    # If no source was given, try DATA_SOURCE from env
+    if not args.mt5 and not args.csv and not args.source:
+        _source_from_env()
 
     # Optionally override/fill from env when --use-env is provided
     if args.use_env:
-        if not args.csv and not args.mt5:
-            source = os.getenv("DATA_SOURCE", "").strip().lower()
-            if source == "mt5":
-                args.mt5 = True
-            elif source == "csv":
-                args.csv = os.getenv("CSV_PATH")
+        if not args.csv and not args.mt5 and not args.source:
+            _source_from_env()
         # Fill fields if present in env
         args.symbol = args.symbol or os.getenv("SYMBOL")
         args.timeframe = os.getenv("TIMEFRAME", args.timeframe)
@@ -119,55 +161,218 @@ def main(argv=None):
         if env_plot is not None:
             args.plot = env_plot
         args.out = args.out or os.getenv("OUT_PATH")
+        args.cache_dir = args.cache_dir or os.getenv("BAR_CACHE_DIR")
         args.start_date = args.start_date or os.getenv("START_DATE")
         args.end_date = args.end_date or os.getenv("END_DATE")
 
-    if args.mt5:
-        if not args.symbol:
-            p.error("--symbol (or SYMBOL in env) is required when using --mt5 or DATA_SOURCE=mt5")
-        start_dt = _parse_date(args.start_date)
-        end_dt = _parse_date(args.end_date)
-        df = fetch_ohlc(args.symbol, timeframe=args.timeframe, bars=args.bars, start_date=start_dt, end_date=end_dt)
-    else:
-        if not args.csv:
-            p.error("--csv is required for CSV source (or set DATA_SOURCE=csv and CSV_PATH in env)")
-        df = load_csv(args.csv)
-        # Optional date filtering for CSV data
-        if args.start_date or args.end_date:
-            start_dt = _parse_date(args.start_date)
-            end_dt = _parse_date(args.end_date)
-            t = pd.to_datetime(df["time"], errors="coerce")
-            mask = pd.Series(True, index=df.index)
-            if start_dt is not None:
-                mask &= t >= start_dt
-            if end_dt is not None:
-                mask &= t <= end_dt
-            df = df.loc[mask].reset_index(drop=True)
-    highs = df["high"].to_numpy(dtype=float)
-    lows = df["low"].to_numpy(dtype=float)
+    if args.ticks:
+        return _run_ticks(args, _parse_date(args.start_date), _parse_date(args.end_date))
+    if args.csv and args.symbols:
+        p.error("--symbols cannot be combined with --csv (use --csv-dir DIR --symbols ... to filter CSV files)")
+    if args.csv_dir or args.symbols:
+        return _run_batch(args, _parse_date(args.start_date), _parse_date(args.end_date))
+
+    if args.profile or args.metrics_json or args.profile_stage:
+        METRICS.enable(capture_stage=args.profile_stage, capture_memory=args.trace_memory)
+
+    start_dt = _parse_date(args.start_date)
+    end_dt = _parse_date(args.end_date)
+    source = "mt5" if args.mt5 else "csv" if args.csv else args.source
+    if source is None or (source == "csv" and not args.csv):
+        p.error("--csv is required for CSV source (or set DATA_SOURCE=csv and CSV_PATH in env)")
+    if source == "mt5" and not args.symbol:
+        p.error("--symbol (or SYMBOL in env) is required when using --mt5 or DATA_SOURCE=mt5")
+    request = BarRequest(
+        symbol=args.symbol,
+        timeframe=args.timeframe,
+        bars=args.bars,
+        start_date=start_dt,
+        end_date=end_dt,
+        path=args.csv if source == "csv" else args.data_dir,
+        cache_dir=args.cache_dir,
+        float32=args.float32,
+    )
+    with METRICS.timer("load"):
+        try:
+            df = load_bars(source, request)
+        except ValueError as exc:
+            p.error(str(exc))
+    from .points import price_arrays
+
+    try:
+        highs, lows, point = price_arrays(df, float32=args.float32, points=args.points, point=args.point)
+    except ValueError as exc:
+        p.error(str(exc))
 
     periods = [int(x) for x in str(args.periods).split(",")]
     if len(periods) < max(args.big, args.small):
         print("Error: not enough periods for selected levels", file=sys.stderr)
         return 2
 
-    sema = compute_semafor_levels(highs=highs, lows=lows, periods=periods, deviation_points=args.dev, backstep=args.backstep)
-    tris = detect_123_triangles(semafor_levels=sema, big_level=args.big, small_level=args.small, max_distance_points=args.maxdist, max_bars_scan=args.bars)
+    METRICS.count("bars", len(highs))
+    from .semafor import compute_semafor_pivots
+    from .triangles import detect_123_triangles_indexed
+
+    with METRICS.timer("semafor"):
+        sema = compute_semafor_pivots(highs=highs, lows=lows, periods=periods, deviation_points=args.dev, backstep=args.backstep)
+    with METRICS.timer("triangles"):
+        tris = detect_123_triangles_indexed(semafor_levels=sema, big_level=args.big, small_level=args.small, max_distance_points=args.maxdist, max_bars_scan=args.bars)
+    METRICS.count("triangles", len(tris))
+    if point is not None:
+        from .points import pivots_from_points, triangles_from_points
+        from .triangle_set import TriangleSet
+
+        tris = list(triangles_from_points(TriangleSet.from_triangles(tris), point))
+        sema = pivots_from_points(sema, point)
+    if args.store:
+        tris = _store_triangles(args, df, tris, periods, point, source)
 
     for t in tris:
         print(f"{t.dir.upper()} 1({t.bar1},{t.price1}) 2({t.bar2},{t.price2}) 3({t.bar3},{t.price3})")
 
     # Optionally render/save visualization
     if args.plot or args.out:
+        from .plot import plot_ohlc_with_triangles
+
         title = f"{(args.symbol or 'CSV')} {args.timeframe} 1-2-3 Triangles"
-        plot_ohlc_with_triangles(
-            df=df,
-            triangles=tris,
-            title=title,
-            show=bool(args.plot),
-            out_path=args.out,
-        )
+        with METRICS.timer("plot"):
+            plot_ohlc_with_triangles(
+                df=df,
+                triangles=tris,
+                title=title,
+                show=bool(args.plot),
+                out_path=args.out,
+                pivots=sema if args.plot_levels else None,
+                pivot_levels=[int(x) for x in args.plot_levels.split(",")] if args.plot_levels else None,
+                candles=args.candles,
+                zigzag=bool(args.plot_levels),
+            )
+
+    _report_metrics(args)
+    return 0
+
 
+def _report_metrics(args) -> None:
+    """Print/write what METRICS collected, as requested on the command line."""
+    if not METRICS.enabled:
+        return
+    if args.profile:
+        print(METRICS.report(), file=sys.stderr)
+    if args.profile_stage:
+        if METRICS.profile is None:
+            print(f"profile: stage {args.profile_stage!r} did not run", file=sys.stderr)
+        elif args.profile_out:
+            METRICS.profile.dump_stats(args.profile_out)
+        else:
+            print(METRICS.profile_report(), file=sys.stderr)
+    if args.metrics_json:
+        METRICS.write_json(args.metrics_json)
+
+
+def _store_triangles(args, df, tris, periods, point, source) -> list:
+    """Upsert one series' triangles into args.store; returns what to report (all, or new/changed with --new-only)."""
+    from .batch import ScanParams, csv_series
+    from .store import TriangleStore
+    from .triangle_set import TriangleSet
+
+    if source == "csv" and not args.symbol:
+        # named like --csv-dir names the same file, so both modes upsert one series
+        symbol, timeframe = csv_series(args.csv)
+    else:
+        symbol, timeframe = args.symbol or source, args.timeframe.upper()
+    params = ScanParams(
+        periods=tuple(periods),
+        dev=args.dev,
+        backstep=args.backstep,
+        big=args.big,
+        small=args.small,
+        maxdist=args.maxdist,
+        points=args.points,
+        point=point,
+    )
+    with METRICS.timer("store"), TriangleStore(args.store) as store:
+        res = store.upsert(symbol, timeframe, params, TriangleSet.from_triangles(tris, times=df["time"].to_numpy()))
+    print(f"store: {int(res.new.sum())} new, {int(res.changed.sum())} changed of {len(tris)} triangles (run {res.run})", file=sys.stderr)
+    if args.new_only:
+        return [t for t, written in zip(tris, res.written.tolist()) if written]
+    return tris
+
+
+def _run_batch(args, start_dt: Optional[datetime], end_dt: Optional[datetime]) -> int:
+    """Scan many series over a process pool, printing one JSON line per series as it finishes."""
+    from .batch import ScanParams, csv_jobs, mt5_jobs, run_batch
+
+    params = ScanParams(
+        periods=tuple(int(x) for x in str(args.periods).split(",")),
+        dev=args.dev,
+        backstep=args.backstep,
+        big=args.big,
+        small=args.small,
+        maxdist=args.maxdist,
+        bars=args.bars,
+        start_date=start_dt,
+        end_date=end_dt,
+        cache_dir=args.cache_dir,
+        float32=args.float32,
+        points=args.points,
+        point=args.point,
+        data_dir=args.data_dir,
+        plot_dir=args.plot_dir,
+        candles=args.candles,
+    )
+    if len(params.periods) < max(params.big, params.small):
+        print("Error: not enough periods for selected levels", file=sys.stderr)
+        return 2
+    symbols = [x.strip() for x in args.symbols.split(",") if x.strip()] if args.symbols else None
+    timeframes = [x.strip() for x in args.timeframes.split(",") if x.strip()] if args.timeframes else None
+    if args.csv_dir:
+        jobs = csv_jobs(args.csv_dir, symbols, timeframes)
+    else:
+        jobs = mt5_jobs(symbols, timeframes or [args.timeframe], source=args.source or "mt5")
+
+    failed = 0
+    store = None
+    if args.store:
+        from .store import TriangleStore
+
+        store = TriangleStore(args.store)
+    try:
+        for result in run_batch(jobs, params, workers=args.workers):
+            failed += result.error is not None
+            if store is not None and result.error is None:
+                # results are written here, by the one process that owns the database
+                # keyed on the point actually used, as for a single series, not on params.point (None when inferred)
+                res = store.upsert(result.job.symbol, result.job.timeframe, replace(params, point=result.point), result.triangle_set)
+                result.stored = {"run": res.run, "new": int(res.new.sum()), "changed": int(res.changed.sum())}
+                if args.new_only:
+                    result.triangles = [row for row, written in zip(result.triangles, res.written.tolist()) if written]
+            print(result.to_json(), flush=True)
+    finally:
+        if store is not None:
+            store.close()
+    return 1 if failed else 0
+
+
+def _run_ticks(args, start_dt: Optional[datetime], end_dt: Optional[datetime]) -> int:
+    """Aggregate a tick file into every requested timeframe at once; one JSON line per timeframe."""
+    from .batch import ScanJob, ScanResult, triangle_rows
+    from .ticks import iter_tick_file, scan_ticks
+
+    periods = [int(x) for x in str(args.periods).split(",")]
+    if len(periods) < max(args.big, args.small):
+        print("Error: not enough periods for selected levels", file=sys.stderr)
+        return 2
+    timeframes = [x.strip().upper() for x in (args.timeframes or args.timeframe).split(",") if x.strip()]
+    symbol = args.symbol or os.path.splitext(os.path.basename(args.ticks))[0]
+    try:
+        chunks = iter_tick_file(args.ticks, price=args.tick_price, start_date=start_dt, end_date=end_dt)
+        scanners = scan_ticks(chunks, timeframes, periods, args.dev, args.backstep, args.big, args.small, args.maxdist, args.bars)
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    for tf, scanner in scanners.items():
+        result = ScanResult(ScanJob(symbol, tf, args.ticks, source="ticks"), bars=len(scanner), triangles=triangle_rows(scanner.triangles()))
+        print(result.to_json(), flush=True)
     return 0
 
 
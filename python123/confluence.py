@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .batch import ScanJob, ScanParams, csv_jobs, job_request, mt5_jobs
+from .metrics import METRICS
+from .pivots import PivotSet
+from .semafor import compute_semafor_pivots_batch, stack_series
+from .sources import SESSION_SOURCES, load_bars, open_session
+from .ticks import TIMEFRAME_SECONDS, Bars, bars_from_frame, resample_bars
+from .triangle_set import COLUMNS, TriangleSet, detect_123_triangle_set
+
+# intervals of different (symbol, direction) groups are shifted this far apart (seconds), so one
+# sorted array serves every group and an interval never overlaps one of another group
+_GROUP_SPAN = np.int64(1) << 40
+
+
+def timeframe_triangles(bars: Dict[str, Bars], params: ScanParams) -> Dict[str, TriangleSet]:
+    """
+    Triangles (with bar times) of one timeframe for several symbols: {symbol: bars} in,
+    {symbol: TriangleSet} out. All symbols go through the batch kernels together, and only
+    the big and small levels are computed; the other periods do not affect the detector.
+    """
+    symbols = list(bars)
+    if not symbols:
+        return {}
+    levels = sorted({params.big, params.small})
+    depths = [params.periods[lvl - 1] for lvl in levels]
+    highs, lengths = stack_series([bars[s]["high"][::-1] for s in symbols])
+    lows, _ = stack_series([bars[s]["low"][::-1] for s in symbols])
+    with METRICS.timer("confluence.semafor"):
+        batch = compute_semafor_pivots_batch(highs, lows, depths, params.dev, params.backstep, lengths)
+    out = {}
+    with METRICS.timer("confluence.triangles"):
+        for symbol, p in zip(symbols, batch):
+            # batch levels are numbered 1.. in `depths` order; give them back their real numbers
+            pivots = PivotSet(
+                p.n,
+                {lvl: p.lows(i) for i, lvl in enumerate(levels, start=1)},
+                {lvl: p.highs(i) for i, lvl in enumerate(levels, start=1)},
+            )
+            out[symbol] = detect_123_triangle_set(
+                pivots, params.big, params.small, params.maxdist, params.bars, times=bars[symbol]["time"][::-1]
+            )
+    return out
+
+
+def overlap_join(
+    q_start: np.ndarray, q_end: np.ndarray, start: np.ndarray, end: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For each query interval [q_start, q_end), the index of the interval [start, end) that
+    overlaps it most (-1 if none) and the overlap length.
+
+    The intervals are sorted by start once, with a running maximum of their ends. A query's
+    candidates are then one contiguous range found by two binary searches: everything
+    starting before the query ends, minus the prefix whose ends all fall before it starts.
+    Cost is O((queries + intervals) log intervals + candidates), not queries x intervals.
+    """
+    q_start = np.asarray(q_start, dtype=np.int64)
+    q_end = np.asarray(q_end, dtype=np.int64)
+    match = np.full(q_start.shape[0], -1, dtype=np.int64)
+    overlap = np.zeros(q_start.shape[0], dtype=np.int64)
+    if not q_start.size or not len(start):
+        return match, overlap
+    order = np.argsort(start, kind="stable")
+    s = np.asarray(start, dtype=np.int64)[order]
+    e = np.asarray(end, dtype=np.int64)[order]
+    reach = np.maximum.accumulate(e)
+    hi = np.searchsorted(s, q_end, side="left")
+    lo = np.searchsorted(reach, q_start, side="right")
+    counts = np.maximum(hi - lo, 0)
+    qi = np.repeat(np.arange(q_start.shape[0]), counts)
+    ci = lo[qi] + np.arange(qi.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+    ov = np.minimum(q_end[qi], e[ci]) - np.maximum(q_start[qi], s[ci])
+    keep = ov > 0
+    qi, ci, ov = qi[keep], ci[keep], ov[keep]
+    best = np.lexsort((-ov, qi))
+    first = best[np.r_[True, qi[best][1:] != qi[best][:-1]]] if best.size else best
+    match[qi[first]] = order[ci[first]]
+    overlap[qi[first]] = ov[first]
+    return match, overlap
+
+
+def find_confluence(
+    triangles: Dict[str, Dict[str, TriangleSet]],
+    timeframes: Sequence[str],
+    min_timeframes: Optional[int] = None,
+    top: Optional[int] = None,
+) -> List[dict]:
+    """
+    Rank triangles of the lowest timeframe by how many higher timeframes show a triangle of
+    the same symbol and direction over the same period.
+
+    `triangles` is {symbol: {timeframe: TriangleSet with times}}. A triangle covers
+    [time1, open of the bar after point 3). For every anchor and higher timeframe the
+    triangle overlapping it most is matched; its overlap ratio is the overlap over the
+    shorter of the two spans. Anchors matched on at least `min_timeframes` timeframes
+    (counting their own; default: all) are returned best first: most timeframes, then the
+    highest mean overlap ratio of the matches, then the latest point 3.
+    """
+    tfs = sorted({tf.upper() for tf in timeframes}, key=TIMEFRAME_SECONDS.get)
+    need = len(tfs) if min_timeframes is None else min_timeframes
+    symbols = list(triangles)
+    base = tfs[0]
+    q_sym, q_idx, q_start, q_end, q_dir = _intervals(triangles, symbols, base)
+    n = q_idx.shape[0]
+    matches: Dict[str, np.ndarray] = {}
+    matched = np.ones(n, dtype=np.int64)
+    ratio_sum = np.zeros(n, dtype=float)
+    with METRICS.timer("confluence.join"):
+        qs, qe = _grouped(q_start, q_end, q_sym, q_dir)
+        for tf in tfs[1:]:
+            sym, idx, start, end, d = _intervals(triangles, symbols, tf)
+            s, e = _grouped(start, end, sym, d)
+            m, ov = overlap_join(qs, qe, s, e)
+            hit = m >= 0
+            span = qe - qs
+            span[hit] = np.minimum(span[hit], e[m[hit]] - s[m[hit]])
+            ratio_sum += np.where(hit, ov / np.maximum(span, 1), 0.0)
+            matched += hit
+            matches[tf] = np.where(hit, idx[m], -1)
+    mean_ratio = np.where(matched > 1, ratio_sum / np.maximum(matched - 1, 1), 0.0)
+    rank = np.lexsort((-q_end, -mean_ratio, -matched))
+    rank = rank[matched[rank] >= need]
+    if top is not None:
+        rank = rank[:top]
+    rows = []
+    for i in rank.tolist():
+        symbol = symbols[q_sym[i]]
+        found = {base: _triangle_row(triangles[symbol][base], int(q_idx[i]))}
+        for tf in tfs[1:]:
+            j = int(matches[tf][i])
+            if j >= 0:
+                found[tf] = _triangle_row(triangles[symbol][tf], j)
+        rows.append({
+            "symbol": symbol,
+            "dir": "buy" if q_dir[i] > 0 else "sell",
+            "score": int(matched[i]),
+            "overlap": round(float(mean_ratio[i]), 4),
+            "timeframes": list(found),
+            "triangles": found,
+        })
+    return rows
+
+
+def _intervals(triangles: Dict[str, Dict[str, TriangleSet]], symbols: List[str], tf: str):
+    """(symbol index, row, start, end, dir) of every triangle of `tf`, times in epoch seconds."""
+    parts = []
+    for k, symbol in enumerate(symbols):
+        tris = triangles[symbol].get(tf)
+        if tris is None or not len(tris):
+            continue
+        if not tris.has_times:
+            raise ValueError(f"{symbol} {tf} triangles need bar times (pass times= when detecting them)")
+        rows = np.arange(len(tris))
+        parts.append((np.full(len(tris), k), rows, tris["time1"] // 1_000_000_000, tris["time3"] // 1_000_000_000 + TIMEFRAME_SECONDS[tf], tris["dir"]))
+    if not parts:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(5))
+    return tuple(np.concatenate(cols).astype(np.int64) for cols in zip(*parts))
+
+
+def _grouped(start: np.ndarray, end: np.ndarray, sym: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    shift = (sym * 2 + (d > 0)) * _GROUP_SPAN
+    return start + shift, end + shift
+
+
+def _triangle_row(tris: TriangleSet, i: int) -> dict:
+    row = {name: tris[name][i].item() for name in COLUMNS if name != "dir"}
+    for k in (1, 2, 3):
+        row[f"time{k}"] = datetime.fromtimestamp(int(tris[f"time{k}"][i]) / 1e9, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return row
+
+
+def scan_confluence(
+    jobs: Sequence[ScanJob],
+    timeframes: Sequence[str],
+    params: ScanParams,
+    history: Optional[int] = None,
+    min_timeframes: Optional[int] = None,
+    top: Optional[int] = None,
+    errors: Optional[Dict[str, str]] = None,
+) -> List[dict]:
+    """
+    Cross-timeframe confluence for many symbols (see find_confluence).
+
+    Each job names a symbol and its data at the lowest of `timeframes`. Those bars are loaded
+    once, and every higher timeframe is resampled from them in memory (resample_bars), so one
+    request per symbol feeds all timeframes. `history` base bars are kept (default: enough
+    for params.bars bars plus the longest period on the highest timeframe). Symbols that
+    fail to load are skipped and reported in `errors` ({symbol: message}) when given.
+    """
+    tfs = sorted({tf.upper() for tf in timeframes}, key=TIMEFRAME_SECONDS.get)
+    if not tfs:
+        raise ValueError("no timeframes")
+    base = tfs[0]
+    if history is None:
+        ratio = TIMEFRAME_SECONDS[tfs[-1]] // TIMEFRAME_SECONDS[base]
+        history = (params.bars + max(params.periods)) * ratio
+    frames: Dict[str, Dict[str, Bars]] = {}
+    sessions: Dict[str, object] = {}
+    try:
+        for job in jobs:
+            try:
+                with METRICS.timer("confluence.load"):
+                    session = None
+                    if job.source in SESSION_SOURCES:
+                        session = sessions.get(job.source)
+                        if session is None:
+                            session = sessions[job.source] = open_session(job.source, job_request(job, params))
+                    df = load_bars(job.source, replace(job_request(job, params), bars=history), session).iloc[:history]
+                with METRICS.timer("confluence.resample"):
+                    frames[job.symbol] = resample_bars(bars_from_frame(df), base, tfs)
+            except Exception as exc:
+                if errors is not None:
+                    errors[job.symbol] = f"{type(exc).__name__}: {exc}"
+    finally:
+        for s in sessions.values():
+            s.close()
+    triangles: Dict[str, Dict[str, TriangleSet]] = {symbol: {} for symbol in frames}
+    for tf in tfs:
+        for symbol, tris in timeframe_triangles({s: f[tf] for s, f in frames.items()}, params).items():
+            triangles[symbol][tf] = tris
+    return find_confluence(triangles, tfs, min_timeframes, top)
+
+
+def main(argv=None) -> int:
+    """`python -m python123.cli confluence ...`: rank triangles confirmed on higher timeframes."""
+    import pandas as pd
+
+    from .sources import available_sources
+
+    p = argparse.ArgumentParser(prog="python -m python123.cli confluence", description="Cross-timeframe 1-2-3 triangle confluence")
+    src = p.add_mutually_exclusive_group()
+    src.add_argument("--csv-dir", dest="csv_dir", help="Directory of SYMBOL_TF.csv files at the lowest timeframe")
+    src.add_argument("--source", default="mt5", help=f"Data source by name ({', '.join(available_sources())})")
+    p.add_argument("--data-dir", dest="data_dir", help="Directory of SYMBOL_TF.csv files for --source fake")
+    p.add_argument("--symbols", help="Comma-separated symbols (filters files with --csv-dir)")
+    p.add_argument("--timeframes", default="M15,H1,H4", help="Comma-separated timeframes; the lowest one is loaded, the others are resampled from it")
+    p.add_argument("--bars", type=int, default=2000, help="Max bars scanned back for triangle anchors on each timeframe")
+    p.add_argument("--history", type=int, help="Bars of the lowest timeframe to load (default: enough for --bars on the highest one)")
+    p.add_argument("--start-date", dest="start_date", help="Start datetime (YYYY-MM-DD[ HH:MM[:SS]])")
+    p.add_argument("--end-date", dest="end_date", help="End datetime (YYYY-MM-DD[ HH:MM[:SS]])")
+    p.add_argument("--cache-dir", dest="cache_dir", help="Bar cache directory (see the main CLI)")
+    p.add_argument("--periods", default="610,377,233,144,89,55,34,8", help="Comma-separated depths")
+    p.add_argument("--dev", type=int, default=1, help="Deviation in points")
+    p.add_argument("--backstep", type=int, default=1)
+    p.add_argument("--big", type=int, default=7, help="Big level index (1-based)")
+    p.add_argument("--small", type=int, default=8, help="Small level index (1-based)")
+    p.add_argument("--maxdist", type=int, default=10000, help="Max distance between point1 and point2 (points)")
+    p.add_argument("--min-timeframes", dest="min_timeframes", type=int, help="Timeframes a triangle must appear on, its own included (default: all)")
+    p.add_argument("--top", type=int, help="Print only the best N")
+    args = p.parse_args(argv)
+
+    tfs = [t.strip().upper() for t in args.timeframes.split(",") if t.strip()]
+    unknown = [t for t in tfs if t not in TIMEFRAME_SECONDS]
+    if not tfs or unknown:
+        p.error(f"unsupported timeframes: {unknown or 'none'} (use {', '.join(TIMEFRAME_SECONDS)})")
+    base = min(tfs, key=TIMEFRAME_SECONDS.get)
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    if args.csv_dir:
+        jobs = csv_jobs(args.csv_dir, symbols, [base])
+    elif symbols:
+        jobs = mt5_jobs(symbols, [base], source=args.source)
+    else:
+        p.error("--symbols is required unless --csv-dir is given")
+    params = ScanParams(
+        periods=tuple(int(x) for x in args.periods.split(",") if x.strip()),
+        dev=args.dev,
+        backstep=args.backstep,
+        big=args.big,
+        small=args.small,
+        maxdist=args.maxdist,
+        bars=args.bars,
+        start_date=pd.to_datetime(args.start_date).to_pydatetime() if args.start_date else None,
+        end_date=pd.to_datetime(args.end_date).to_pydatetime() if args.end_date else None,
+        cache_dir=args.cache_dir,
+        data_dir=args.data_dir,
+    )
+    errors: Dict[str, str] = {}
+    try:
+        rows = scan_confluence(jobs, tfs, params, args.history, args.min_timeframes, args.top, errors)
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    for symbol, message in errors.items():
+        print(json.dumps({"symbol": symbol, "error": message}), file=sys.stderr)
+    for row in rows:
+        print(json.dumps(row))
+    return 1 if errors else 0
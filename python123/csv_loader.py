@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from io import BytesIO
+from typing import BinaryIO, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+OHLC = ("open", "high", "low", "close")
+
+# below this many bytes the start offset search hands over to the chunk filter
+_SEEK_GRANULARITY = 1 << 16
+
+
+def read_ohlc_csv(
+    path: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    price_dtype=np.float64,
+    chunksize: int = 500_000,
+    assume_sorted: bool = True,
+) -> Dict[str, np.ndarray]:
+    """
+    Read a time,open,high,low,close CSV straight into NumPy arrays in MT4 orientation
+    (index 0 = newest bar): {"time": int64 epoch seconds, "open"/"high"/"low"/"close": price_dtype}.
+
+    The file is parsed in chunks with explicit dtypes and the inclusive [start_date, end_date]
+    filter is applied while reading. With rows oldest first (assume_sorted), reading starts
+    at a byte offset found by binary search on start_date and stops after the first chunk
+    past end_date, so only the requested range is parsed. Naive datetimes are compared
+    against the file's wall-clock times, like the CLI's previous pandas filter.
+    """
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = pd.read_csv(BytesIO(header_line), nrows=0).columns.tolist()
+        lower = [c.lower() for c in header]
+        if not {"time", *OHLC}.issubset(lower):
+            raise ValueError("CSV must contain columns: time, open, high, low, close")
+        time_col = header[lower.index("time")]
+        names = {c: c.lower() for c in header if c.lower() in ("time", *OHLC)}
+
+        start_ns = _ns(start_date)
+        end_ns = _ns(end_date)
+        offset = f.tell()
+        if assume_sorted and start_ns is not None:
+            offset = _seek_start(f, offset, lower.index("time"), start_ns)
+        f.seek(offset)
+
+        chunks: List[Dict[str, np.ndarray]] = []
+        reader = pd.read_csv(
+            f,
+            header=None,
+            names=header,
+            usecols=list(names),
+            dtype={c: price_dtype for c in names if names[c] in OHLC},
+            chunksize=chunksize,
+        )
+        for chunk in reader:
+            t = _time_ns(chunk[time_col])
+            mask = None
+            if start_ns is not None:
+                mask = t >= start_ns
+            if end_ns is not None:
+                m = t <= end_ns
+                mask = m if mask is None else mask & m
+            if mask is not None:
+                # unparseable times never pass a date filter
+                mask &= t != np.iinfo(np.int64).min
+            cols = {"time": t // 1_000_000_000}
+            for c, name in names.items():
+                if name in OHLC:
+                    cols[name] = chunk[c].to_numpy(dtype=price_dtype)
+            if mask is not None:
+                cols = {k: v[mask] for k, v in cols.items()}
+            chunks.append(cols)
+            if assume_sorted and end_ns is not None and t.size and t[-1] > end_ns:
+                break
+
+    # reverse each chunk and their order in one copy: newest bar first, contiguous
+    out: Dict[str, np.ndarray] = {}
+    for name, dtype in (("time", np.int64),) + tuple((n, price_dtype) for n in OHLC):
+        parts = [c[name][::-1] for c in reversed(chunks)]
+        out[name] = np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+    return out
+
+
+def _ns(dt: Optional[datetime]) -> Optional[int]:
+    if dt is None:
+        return None
+    ts = pd.Timestamp(dt)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return int(ts.value)
+
+
+def _time_ns(col: pd.Series) -> np.ndarray:
+    """Times as int64 ns since epoch (NaT = int64 min); numbers are read as epoch seconds."""
+    if pd.api.types.is_numeric_dtype(col):
+        return col.to_numpy(dtype=np.int64) * 1_000_000_000
+    t = pd.to_datetime(col, errors="coerce")
+    if getattr(t.dt, "tz", None) is not None:
+        t = t.dt.tz_convert("UTC").dt.tz_localize(None)
+    return t.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _line_time(line: bytes, index: int) -> Optional[int]:
+    try:
+        field = line.split(b",")[index].strip().decode()
+        if field.lstrip("-").isdigit():
+            return int(field) * 1_000_000_000
+        return _ns(pd.Timestamp(field))
+    except (IndexError, ValueError):
+        return None
+
+
+def _seek_start(f: BinaryIO, data_start: int, time_index: int, start_ns: int) -> int:
+    """
+    Byte offset from which reading loses no row at or after start_ns (rows sorted by time).
+
+    Bisects on byte offsets: the first complete line after a probe tells which side of
+    start_ns that region lies. Stops once the window is small; the chunk filter does the rest.
+    """
+    lo = data_start
+    hi = os.fstat(f.fileno()).st_size
+    while hi - lo > _SEEK_GRANULARITY:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()  # skip the partial line
+        line = f.readline()
+        t = _line_time(line, time_index) if line else None
+        if t is None:
+            if line:
+                # unparseable row: give up on skipping and scan from here
+                break
+            hi = mid
+        elif t >= start_ns:
+            hi = mid
+        else:
+            lo = mid
+    if lo == data_start:
+        return lo
+    # the line containing `lo` is older than start_ns; begin at the next line
+    f.seek(lo)
+    f.readline()
+    return f.tell()
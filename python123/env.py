@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+_loaded = False
+
+
+def load_env() -> None:
+    """Load a .env file into os.environ once per process (python-dotenv is optional)."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        from dotenv import load_dotenv  # type: ignore
+
+        load_dotenv()
+    except Exception:
+        # dotenv is optional; proceed if not installed
+        pass
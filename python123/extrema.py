@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def _pad_value(dtype: np.dtype, ufunc: np.ufunc):
+    # neutral element of the reduction for this dtype
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return info.max if ufunc is np.minimum else info.min
+    return np.inf if ufunc is np.minimum else -np.inf
+
+
+def _sliding_extremum(values: np.ndarray, window: int, ufunc: np.ufunc) -> np.ndarray:
+    """
+    van Herk / Gil-Werman sliding extremum.
+
+    out[i] = ufunc.reduce(values[i : i + window]) for i in 0..n-window, computed with
+    two block-wise accumulate passes, i.e. O(n) regardless of the window length.
+    """
+    values = np.asarray(values)
+    if values.ndim != 1:
+        raise ValueError("values must be a 1-D array")
+    if window < 1:
+        raise ValueError("window must be >= 1")
+    n = values.shape[0]
+    if window > n:
+        raise ValueError("window must not exceed the number of values")
+    if window == 1:
+        return values.copy()
+
+    blocks = -(-n // window)
+    padded = np.full(blocks * window, _pad_value(values.dtype, ufunc), dtype=values.dtype)
+    padded[:n] = values
+    padded = padded.reshape(blocks, window)
+
+    # prefix: extremum from block start up to i; suffix: extremum from i to block end
+    prefix = ufunc.accumulate(padded, axis=1).ravel()
+    suffix = ufunc.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    m = n - window + 1
+    return ufunc(suffix[:m], prefix[window - 1 : window - 1 + m])
+
+
+def sliding_min(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Minimum of every full window: out[i] = values[i : i + window].min(), length n - window + 1.
+    """
+    return _sliding_extremum(values, window, np.minimum)
+
+
+def sliding_max(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Maximum of every full window: out[i] = values[i : i + window].max(), length n - window + 1.
+    """
+    return _sliding_extremum(values, window, np.maximum)
+
+
+class RangeExtremaIndex:
+    """
+    Sparse table of window minima over lows and window maxima over highs, built once per series.
+
+    Only the power-of-two levels needed by `windows` are kept. Any window w with
+    floor(log2(w)) among them is then answered with one vectorized op, by overlapping two
+    power-of-two windows (exact, since min/max are idempotent). This lets every semafor
+    level share one pass over the data.
+
+    2-D arrays (series x bars) are indexed along the bars axis, so a whole matrix of aligned
+    series shares the same passes; queries then return one row per series.
+    """
+
+    __slots__ = ("n", "_mins", "_maxs")
+
+    def __init__(self, highs: np.ndarray, lows: np.ndarray, windows):
+        highs = np.asarray(highs)
+        lows = np.asarray(lows)
+        if highs.shape != lows.shape or highs.ndim not in (1, 2):
+            raise ValueError("highs and lows must be 1-D or 2-D arrays of the same shape")
+        self.n = highs.shape[-1]
+        self._mins = {}
+        self._maxs = {}
+
+        # windows longer than the series are clamped to it, like CountZZ does for short histories
+        wanted = {min(int(w), self.n).bit_length() - 1 for w in windows if int(w) >= 1 and self.n > 0}
+        if not wanted:
+            return
+        cur_min, cur_max = lows, highs
+        for k in range(max(wanted) + 1):
+            if k > 0:
+                half = 1 << (k - 1)
+                cur_min = np.minimum(cur_min[..., :-half], cur_min[..., half:])
+                cur_max = np.maximum(cur_max[..., :-half], cur_max[..., half:])
+            if k in wanted:
+                self._mins[k] = cur_min
+                self._maxs[k] = cur_max
+
+    def _query(self, tables: dict, window: int, ufunc: np.ufunc) -> np.ndarray:
+        if window < 1 or window > self.n:
+            raise ValueError("window must be within 1..n")
+        k = window.bit_length() - 1
+        table = tables.get(k)
+        if table is None:
+            raise KeyError(f"window {window} was not indexed")
+        m = self.n - window + 1
+        offset = window - (1 << k)
+        return ufunc(table[..., :m], table[..., offset : offset + m])
+
+    def window_min(self, window: int) -> np.ndarray:
+        """Same as sliding_min(lows, window)."""
+        return self._query(self._mins, window, np.minimum)
+
+    def window_max(self, window: int) -> np.ndarray:
+        """Same as sliding_max(highs, window)."""
+        return self._query(self._maxs, window, np.maximum)
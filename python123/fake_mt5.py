@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import os
+import calendar
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Same values as the MetaTrader5 package
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+TIMEFRAME_W1 = 32769
+TIMEFRAME_MN1 = 49153
+
+_TIMEFRAME_NAMES = {
+    TIMEFRAME_M1: "M1",
+    TIMEFRAME_M5: "M5",
+    TIMEFRAME_M15: "M15",
+    TIMEFRAME_M30: "M30",
+    TIMEFRAME_H1: "H1",
+    TIMEFRAME_H4: "H4",
+    TIMEFRAME_D1: "D1",
+    TIMEFRAME_W1: "W1",
+    TIMEFRAME_MN1: "MN1",
+}
+
+RATES_DTYPE = np.dtype(
+    [
+        ("time", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("tick_volume", "<u8"),
+        ("spread", "<i4"),
+        ("real_volume", "<u8"),
+    ]
+)
+
+
+# copy_ticks_* flags
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+
+TICK_DTYPE = np.dtype(
+    [
+        ("time", "<i8"),
+        ("bid", "<f8"),
+        ("ask", "<f8"),
+        ("last", "<f8"),
+        ("volume", "<u8"),
+        ("time_msc", "<i8"),
+        ("flags", "<u4"),
+        ("volume_real", "<f8"),
+    ]
+)
+
+
+class FakeMT5:
+    """
+    Stand-in for the MetaTrader5 module that serves rates from CSV files, for Linux and tests.
+
+    Rates for (symbol, timeframe) are read from `<data_dir>/<SYMBOL>_<TF>.csv`, falling back to
+    `<data_dir>/<SYMBOL>.csv`, with columns time,open,high,low,close (oldest first, times in
+    UTC). Files are re-read when they change on disk, so appending rows simulates new bars.
+    The copy_rates_* functions return structured arrays like the real package.
+    copy_ticks_range serves `<data_dir>/<SYMBOL>_TICKS.csv` (time or time_msc, bid, ask, ...).
+    """
+
+    TIMEFRAME_M1 = TIMEFRAME_M1
+    TIMEFRAME_M5 = TIMEFRAME_M5
+    TIMEFRAME_M15 = TIMEFRAME_M15
+    TIMEFRAME_M30 = TIMEFRAME_M30
+    TIMEFRAME_H1 = TIMEFRAME_H1
+    TIMEFRAME_H4 = TIMEFRAME_H4
+    TIMEFRAME_D1 = TIMEFRAME_D1
+    TIMEFRAME_W1 = TIMEFRAME_W1
+    TIMEFRAME_MN1 = TIMEFRAME_MN1
+    COPY_TICKS_ALL = COPY_TICKS_ALL
+    COPY_TICKS_INFO = COPY_TICKS_INFO
+    COPY_TICKS_TRADE = COPY_TICKS_TRADE
+
+    def __init__(self, data_dir: Optional[str] = None, point: float = 0.00001):
+        self.data_dir = data_dir or os.getenv("FAKE_MT5_DATA", ".")
+        self.point = point
+        self.initialized = False
+        self.init_kwargs: dict = {}
+        self.calls: Dict[str, int] = {}
+        self._error: Tuple[int, str] = (1, "Success")
+        self._cache: Dict[str, Tuple[float, np.ndarray]] = {}
+
+    # --- terminal ---
+
+    def initialize(self, **kwargs) -> bool:
+        self._count("initialize")
+        self.init_kwargs = kwargs
+        self.initialized = True
+        return True
+
+    def shutdown(self) -> None:
+        self._count("shutdown")
+        self.initialized = False
+
+    def last_error(self) -> Tuple[int, str]:
+        return self._error
+
+    # --- symbols ---
+
+    def symbol_info(self, symbol: str):
+        self._count("symbol_info")
+        if not self._has_symbol(symbol):
+            self._error = (-1, f"unknown symbol {symbol}")
+            return None
+        return SimpleNamespace(name=symbol, point=self.point, digits=int(round(-np.log10(self.point))), visible=True)
+
+    def symbol_select(self, symbol: str, enable: bool = True) -> bool:
+        self._count("symbol_select")
+        return self.symbol_info(symbol) is not None
+
+    # --- rates ---
+
+    def copy_rates_from_pos(self, symbol: str, timeframe: int, start_pos: int, count: int):
+        self._count("copy_rates_from_pos")
+        rates = self._rates(symbol, timeframe)
+        if rates is None:
+            return None
+        end = rates.shape[0] - start_pos
+        return rates[max(0, end - count) : max(0, end)].copy()
+
+    def copy_rates_from(self, symbol: str, timeframe: int, date_from: datetime, count: int):
+        self._count("copy_rates_from")
+        rates = self._rates(symbol, timeframe)
+        if rates is None:
+            return None
+        end = np.searchsorted(rates["time"], _epoch(date_from), side="right")
+        return rates[max(0, end - count) : end].copy()
+
+    def copy_rates_range(self, symbol: str, timeframe: int, date_from: datetime, date_to: datetime):
+        self._count("copy_rates_range")
+        rates = self._rates(symbol, timeframe)
+        if rates is None:
+            return None
+        lo = np.searchsorted(rates["time"], _epoch(date_from), side="left")
+        hi = np.searchsorted(rates["time"], _epoch(date_to), side="right")
+        return rates[lo:hi].copy()
+
+    # --- ticks ---
+
+    def copy_ticks_range(self, symbol: str, date_from: datetime, date_to: datetime, flags: int = COPY_TICKS_ALL):
+        """Ticks with date_from <= time <= date_to (whole seconds), oldest first."""
+        self._count("copy_ticks_range")
+        if not self.initialized:
+            self._error = (-10004, "No IPC connection")
+            return None
+        path = os.path.join(self.data_dir, f"{symbol}_TICKS.csv")
+        if not os.path.exists(path):
+            self._error = (-1, f"no ticks for {symbol}")
+            return None
+        mtime = os.path.getmtime(path)
+        cached = self._cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_ticks_csv(path))
+            self._cache[path] = cached
+        ticks = cached[1]
+        lo = np.searchsorted(ticks["time_msc"], _epoch(date_from) * 1000, side="left")
+        hi = np.searchsorted(ticks["time_msc"], _epoch(date_to) * 1000 + 999, side="right")
+        return ticks[lo:hi].copy()
+
+    # --- internals ---
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _has_symbol(self, symbol: str) -> bool:
+        try:
+            files = os.listdir(self.data_dir)
+        except OSError:
+            return False
+        return f"{symbol}.csv" in files or any(f.startswith(f"{symbol}_") and f.endswith(".csv") for f in files)
+
+    def _path(self, symbol: str, timeframe: int) -> Optional[str]:
+        for name in (f"{symbol}_{_TIMEFRAME_NAMES.get(timeframe, timeframe)}.csv", f"{symbol}.csv"):
+            path = os.path.join(self.data_dir, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _rates(self, symbol: str, timeframe: int) -> Optional[np.ndarray]:
+        if not self.initialized:
+            self._error = (-10004, "No IPC connection")
+            return None
+        path = self._path(symbol, timeframe)
+        if path is None:
+            self._error = (-1, f"no data for {symbol} timeframe {timeframe}")
+            return None
+        mtime = os.path.getmtime(path)
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        rates = load_rates_csv(path)
+        self._cache[path] = (mtime, rates)
+        return rates
+
+
+def load_rates_csv(path: str) -> np.ndarray:
+    """Read a time,open,high,low,close CSV (oldest first) into an MT5 rates array."""
+    df = pd.read_csv(path)
+    df.columns = [c.lower() for c in df.columns]
+    out = np.zeros(len(df), dtype=RATES_DTYPE)
+    t = df["time"]
+    if pd.api.types.is_numeric_dtype(t):
+        out["time"] = t.to_numpy(dtype=np.int64)
+    else:
+        out["time"] = pd.to_datetime(t).to_numpy(dtype="datetime64[s]").astype(np.int64)
+    for name in ("open", "high", "low", "close"):
+        out[name] = df[name].to_numpy(dtype=float)
+    for name in ("tick_volume", "spread", "real_volume"):
+        if name in df.columns:
+            out[name] = df[name].to_numpy()
+    return out
+
+
+def load_ticks_csv(path: str) -> np.ndarray:
+    """Read a tick CSV (time and/or time_msc, bid, ask, optional last/volume/flags) into an MT5 ticks array."""
+    df = pd.read_csv(path)
+    df.columns = [c.lower() for c in df.columns]
+    out = np.zeros(len(df), dtype=TICK_DTYPE)
+    if "time_msc" in df.columns:
+        out["time_msc"] = df["time_msc"].to_numpy(dtype=np.int64)
+    else:
+        t = df["time"]
+        if pd.api.types.is_numeric_dtype(t):
+            out["time_msc"] = t.to_numpy(dtype=np.int64) * 1000
+        else:
+            out["time_msc"] = pd.to_datetime(t).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    out["time"] = out["time_msc"] // 1000
+    for name in ("bid", "ask", "last", "volume", "flags", "volume_real"):
+        if name in df.columns:
+            out[name] = df[name].to_numpy()
+    return out
+
+
+def _epoch(dt) -> int:
+    if isinstance(dt, (int, np.integer)):
+        return int(dt)
+    if isinstance(dt, datetime):
+        if dt.tzinfo is not None:
+            return int(dt.timestamp())
+        # MT5 treats naive datetimes as UTC
+        return calendar.timegm(dt.timetuple())
+    return int(pd.Timestamp(dt).timestamp())
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import cProfile
+
+
+class _NullTimer:
+    """Shared no-op context manager handed out while a registry is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NULL = _NullTimer()
+
+
+class _Stat:
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+class _Timer:
+    __slots__ = ("_metrics", "_name", "_t0", "_profile")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self._metrics = metrics
+        self._name = name
+        self._profile = metrics.capture_stage == name
+
+    def __enter__(self) -> "_Timer":
+        if self._profile:
+            self._metrics._start_capture()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        seconds = time.perf_counter() - self._t0
+        m = self._metrics
+        if self._profile:
+            m._stop_capture()
+        stat = m._timers.get(self._name)
+        if stat is None:
+            stat = m._timers[self._name] = _Stat()
+        stat.add(seconds)
+
+
+class Metrics:
+    """
+    Registry of stage timers and counters.
+
+    Disabled (the default), timer() returns one shared no-op context manager and count()
+    returns at once, so instrumented code costs an attribute check. Enabled, a timer costs
+    two perf_counter() calls and a dict update, cheap enough for long-running polling jobs.
+
+        with METRICS.timer("semafor"):
+            ...
+        METRICS.count("triangles", len(tris))
+
+    `capture_stage` names one timer to run under cProfile (and tracemalloc when
+    `capture_memory`), for finding out why that stage is slow.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.capture_stage: Optional[str] = None
+        self.capture_memory = False
+        self.profile: Optional["cProfile.Profile"] = None
+        self.memory_peak: Optional[int] = None
+        self._timers: Dict[str, _Stat] = {}
+        self._counters: Dict[str, float] = {}
+        self._tracing = False
+
+    def enable(self, capture_stage: Optional[str] = None, capture_memory: bool = False) -> None:
+        self.enabled = True
+        self.capture_stage = capture_stage
+        self.capture_memory = capture_memory
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self._timers.clear()
+        self._counters.clear()
+        self.profile = None
+        self.memory_peak = None
+
+    def timer(self, name: str):
+        """Context manager adding the elapsed wall time of its block to timer `name`."""
+        if not self.enabled:
+            return _NULL
+        return _Timer(self, name)
+
+    def count(self, name: str, value: float = 1) -> None:
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        """Plain-data copy of the registry (JSON serializable)."""
+        out = {
+            "timers": {
+                name: {"count": s.count, "total_s": s.total, "mean_s": s.total / s.count, "min_s": s.min, "max_s": s.max}
+                for name, s in self._timers.items()
+            },
+            "counters": dict(self._counters),
+        }
+        if self.capture_stage is not None:
+            out["capture"] = {"stage": self.capture_stage, "memory_peak_bytes": self.memory_peak}
+        return out
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def report(self) -> str:
+        """Human-readable table of timers (slowest total first) and counters."""
+        lines: List[str] = []
+        if self._timers:
+            width = max(len(n) for n in self._timers)
+            lines.append(f"{'stage':<{width}}  {'calls':>6}  {'total ms':>10}  {'mean ms':>10}  {'max ms':>10}")
+            for name, s in sorted(self._timers.items(), key=lambda kv: -kv[1].total):
+                lines.append(
+                    f"{name:<{width}}  {s.count:>6}  {s.total * 1e3:>10.2f}  {s.total / s.count * 1e3:>10.2f}  {s.max * 1e3:>10.2f}"
+                )
+        for name, value in self._counters.items():
+            lines.append(f"{name}: {value:g}")
+        if self.memory_peak is not None:
+            lines.append(f"{self.capture_stage} peak memory: {self.memory_peak / 2**20:.1f} MB")
+        return "\n".join(lines)
+
+    def profile_report(self, limit: int = 25) -> str:
+        """Top `limit` functions by cumulative time from the captured stage, if any."""
+        if self.profile is None:
+            return ""
+        import io
+        import pstats
+
+        buf = io.StringIO()
+        pstats.Stats(self.profile, stream=buf).sort_stats("cumulative").print_stats(limit)
+        return buf.getvalue()
+
+    def _start_capture(self) -> None:
+        # profiler modules are imported only when a stage is captured
+        import cProfile
+        import tracemalloc
+
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+        if self.capture_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self.profile.enable()
+
+    def _stop_capture(self) -> None:
+        import tracemalloc
+
+        self.profile.disable()
+        if self._tracing:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.memory_peak = max(self.memory_peak or 0, peak)
+            tracemalloc.stop()
+            self._tracing = False
+
+
+# process-wide registry used by the library and the CLI; disabled unless enabled explicitly
+METRICS = Metrics()
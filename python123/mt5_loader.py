@@ -1,31 +1,230 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Dict, Iterable, Optional, Set, Tuple
 from datetime import datetime
 import os
 import pandas as pd
-import MetaTrader5 as mt5
 
 try:
-    # Load environment variables from a .env file if present
-    from dotenv import load_dotenv  # type: ignore
-
-    load_dotenv()
-except Exception:
-    # dotenv is optional; proceed if not installed
-    pass
-
-TIMEFRAME_MAP = {
-    "M1": mt5.TIMEFRAME_M1,
-    "M5": mt5.TIMEFRAME_M5,
-    "M15": mt5.TIMEFRAME_M15,
-    "M30": mt5.TIMEFRAME_M30,
-    "H1": mt5.TIMEFRAME_H1,
-    "H4": mt5.TIMEFRAME_H4,
-    "D1": mt5.TIMEFRAME_D1,
-    "W1": mt5.TIMEFRAME_W1,
-    "MN1": mt5.TIMEFRAME_MN1,
-}
+    import MetaTrader5 as mt5
+except ImportError:
+    # Not installable outside Windows; MT5Session then needs an explicit backend (e.g. FakeMT5)
+    mt5 = None
+
+from .env import load_env
+
+# MT5_LOGIN / MT5_PASSWORD / MT5_SERVER / MT5_PATH may come from a .env file
+load_env()
+
+TIMEFRAME_NAMES = ("M1", "M5", "M15", "M30", "H1", "H4", "D1", "W1", "MN1")
+
+TIMEFRAME_MAP = {name: getattr(mt5, f"TIMEFRAME_{name}") for name in TIMEFRAME_NAMES} if mt5 is not None else {}
+
+OHLC_COLUMNS = ["time", "open", "high", "low", "close"]
+
+
+class MT5Session:
+    """
+    One MetaTrader5 connection reused across fetches.
+
+    initialize() runs once on enter and shutdown() once on exit; symbol selection and
+    timeframe lookups are cached for the session. `backend` is anything with the MetaTrader5
+    module API (initialize, symbol_info, copy_rates_*, TIMEFRAME_* ...); it defaults to the
+    MetaTrader5 package, and python123.fake_mt5.FakeMT5 serves CSV files instead.
+
+        with MT5Session() as s:
+            frames = s.fetch_many(["EURUSD", "GBPUSD"], ["M15", "H1"], bars=2000)
+            new = s.fetch_new("EURUSD", "M15")  # bars since the previous fetch_new
+    """
+
+    def __init__(
+        self,
+        login: Optional[int] = None,
+        password: Optional[str] = None,
+        server: Optional[str] = None,
+        path: Optional[str] = None,
+        backend=None,
+    ):
+        if backend is None:
+            if mt5 is None:
+                raise RuntimeError("MetaTrader5 package is not installed; pass a backend (e.g. FakeMT5)")
+            backend = mt5
+        self.backend = backend
+        self.login = login
+        self.password = password
+        self.server = server
+        self.path = path
+        self.connected = False
+        self._timeframes: Dict[str, int] = {}
+        self._selected: Set[str] = set()
+        self._last_time: Dict[Tuple[str, str], int] = {}
+
+    def __enter__(self) -> "MT5Session":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """Initialize the terminal connection (no-op if already open)."""
+        if self.connected:
+            return
+        # Prefer explicit args; fall back to environment variables if missing
+        login = self.login
+        password = self.password
+        server = self.server
+        env_login = os.getenv("MT5_LOGIN")
+        if login is None and env_login:
+            try:
+                login = int(env_login)
+            except ValueError:
+                raise ValueError("MT5_LOGIN must be an integer")
+        if password is None:
+            password = os.getenv("MT5_PASSWORD")
+        if server is None:
+            server = os.getenv("MT5_SERVER")
+        path = self.path or os.getenv("MT5_PATH")
+
+        # Build initialize kwargs. Pass credentials only if all three are present.
+        has_login = login is not None
+        has_password = password is not None and str(password) != ""
+        has_server = server is not None and str(server) != ""
+        has_full_credentials = has_login and has_password and has_server
+        has_any_credentials = has_login or has_password or has_server
+
+        init_kwargs: dict = {}
+        if path:
+            init_kwargs["path"] = path
+        if has_full_credentials:
+            init_kwargs["login"] = login  # type: ignore[arg-type]
+            init_kwargs["password"] = password
+            init_kwargs["server"] = server
+
+        # Initialize terminal (without credentials if not fully provided)
+        if not self.backend.initialize(**init_kwargs):
+            err = self.backend.last_error()
+            hint = ""
+            if has_any_credentials and not has_full_credentials:
+                hint = " (hint: provide MT5_LOGIN, MT5_PASSWORD and MT5_SERVER together, or none if a terminal is already authorized)"
+            # Only include keys to avoid leaking secrets
+            init_keys = list(init_kwargs.keys())
+            raise RuntimeError(f"MT5 initialize failed: {err}{hint}. init keys: {init_keys}")
+        self.connected = True
+
+    def close(self) -> None:
+        """Shut the connection down and drop per-connection caches."""
+        if self.connected:
+            self.backend.shutdown()
+            self.connected = False
+        self._selected.clear()
+
+    def timeframe(self, name: str) -> int:
+        """MT5 timeframe constant for a name like "M15" (cached)."""
+        key = name.upper()
+        tf = self._timeframes.get(key)
+        if tf is None:
+            tf = getattr(self.backend, f"TIMEFRAME_{key}", None) if key in TIMEFRAME_NAMES else None
+            if tf is None:
+                raise ValueError(f"Unsupported timeframe: {name}")
+            self._timeframes[key] = tf
+        return tf
+
+    def select_symbol(self, symbol: str) -> None:
+        """Ensure the symbol is available in Market Watch (once per session)."""
+        if symbol in self._selected:
+            return
+        info = self.backend.symbol_info(symbol)
+        if info is None:
+            # Try to select the symbol from Market Watch
+            if not self.backend.symbol_select(symbol, True):
+                err = self.backend.last_error()
+                raise RuntimeError(f"MT5 symbol_select failed for {symbol}: {err}")
+        self._selected.add(symbol)
+
+    def fetch(
+        self,
+        symbol: str,
+        timeframe: str = "M15",
+        bars: int = 2000,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        """
+        OHLC DataFrame with columns time, open, high, low, close (oldest first), same date
+        semantics as fetch_ohlc.
+        """
+        self.open()
+        tf = self.timeframe(timeframe)
+        self.select_symbol(symbol)
+
+        # Decide fetch method based on provided dates
+        if start_date is not None and end_date is not None:
+            rates = self.backend.copy_rates_range(symbol, tf, start_date, end_date)
+        elif start_date is not None and end_date is None:
+            # Fetch 'bars' count starting from start_date
+            rates = self.backend.copy_rates_from(symbol, tf, start_date, bars)
+        elif start_date is None and end_date is not None:
+            raise ValueError("end_date provided without start_date. Provide both, or only start_date, or neither.")
+        else:
+            rates = self.backend.copy_rates_from_pos(symbol, tf, 0, bars)
+        if rates is None:
+            err = self.backend.last_error()
+            raise RuntimeError(f"MT5 copy_rates_from_pos failed: {err}")
+        return _rates_frame(rates)
+
+    def fetch_many(
+        self,
+        symbols: Iterable[str],
+        timeframes: Iterable[str],
+        bars: int = 2000,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Dict[Tuple[str, str], pd.DataFrame]:
+        """fetch() for every (symbol, timeframe) pair over this one connection."""
+        timeframes = list(timeframes)
+        out: Dict[Tuple[str, str], pd.DataFrame] = {}
+        for symbol in symbols:
+            for timeframe in timeframes:
+                out[(symbol, timeframe)] = self.fetch(symbol, timeframe, bars, start_date, end_date)
+        return out
+
+    def fetch_new(self, symbol: str, timeframe: str = "M15", bars: int = 2000) -> pd.DataFrame:
+        """
+        Bars opened since the previous fetch_new for (symbol, timeframe), oldest first.
+
+        The first call returns the latest `bars` bars. Later calls start at the last bar
+        returned before, since that bar may still have been forming, and only request as
+        many bars as needed (growing the request until it reaches that bar, at most `bars`).
+        """
+        self.open()
+        tf = self.timeframe(timeframe)
+        self.select_symbol(symbol)
+        key = (symbol, timeframe.upper())
+        last = self._last_time.get(key)
+
+        count = bars if last is None else min(64, bars)
+        while True:
+            rates = self.backend.copy_rates_from_pos(symbol, tf, 0, count)
+            if rates is None:
+                err = self.backend.last_error()
+                raise RuntimeError(f"MT5 copy_rates_from_pos failed: {err}")
+            if last is None or count >= bars or len(rates) < count or (len(rates) and rates["time"][0] <= last):
+                break
+            count = min(count * 2, bars)
+
+        df = _rates_frame(rates)
+        if last is not None:
+            df = df[df["time"] >= last].reset_index(drop=True)
+        if len(df):
+            self._last_time[key] = int(df["time"].iloc[-1])
+        return df
+
+
+def _rates_frame(rates) -> pd.DataFrame:
+    df = pd.DataFrame(rates)
+    # MT5 returns oldest at index 0 already, keep it.
+    return df[OHLC_COLUMNS]
 
 
 def fetch_ohlc(
@@ -37,90 +236,18 @@ def fetch_ohlc(
     server: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    session: Optional[MT5Session] = None,
 ) -> pd.DataFrame:
     """
     Fetch OHLC from MetaTrader5 terminal.
     Requires a running terminal (or provide login/password/server for initialize).
     Returns DataFrame with columns: time, open, high, low, close (oldest first).
-    """
-    # Prefer explicit args; fall back to environment variables if missing
-    env_login = os.getenv("MT5_LOGIN")
-    env_password = os.getenv("MT5_PASSWORD")
-    env_server = os.getenv("MT5_SERVER")
-    env_path = os.getenv("MT5_PATH")
-
-    if login is None and env_login:
-        try:
-            login = int(env_login)
-        except ValueError:
-            raise ValueError("MT5_LOGIN must be an integer")
-    if password is None:
-        password = env_password
-    if server is None:
-        server = env_server
-
-    # Build initialize kwargs. Pass credentials only if all three are present.
-    has_login = login is not None
-    has_password = password is not None and str(password) != ""
-    has_server = server is not None and str(server) != ""
-    has_full_credentials = has_login and has_password and has_server
-    has_any_credentials = has_login or has_password or has_server
-
-    init_kwargs: dict = {}
-    if env_path:
-        init_kwargs["path"] = env_path
-    if has_full_credentials:
-        init_kwargs["login"] = login  # type: ignore[arg-type]
-        init_kwargs["password"] = password
-        init_kwargs["server"] = server
-
-    # Initialize terminal (without credentials if not fully provided)
-    initialized = mt5.initialize(**init_kwargs)
-
-    if not initialized:
-        err = mt5.last_error()
-        hint = ""
-        if has_any_credentials and not has_full_credentials:
-            hint = " (hint: provide MT5_LOGIN, MT5_PASSWORD and MT5_SERVER together, or none if a terminal is already authorized)"
-        # Only include keys to avoid leaking secrets
-        init_keys = list(init_kwargs.keys())
-        raise RuntimeError(f"MT5 initialize failed: {err}{hint}. init keys: {init_keys}")
-
-    tf = TIMEFRAME_MAP.get(timeframe.upper())
-    if tf is None:
-        raise ValueError(f"Unsupported timeframe: {timeframe}")
-
-    # Ensure symbol is available/selected
-    info = mt5.symbol_info(symbol)
-    if info is None:
-        # Try to select the symbol from Market Watch
-        if not mt5.symbol_select(symbol, True):
-            err = mt5.last_error()
-            mt5.shutdown()
-            raise RuntimeError(f"MT5 symbol_select failed for {symbol}: {err}")
-
-    # Decide fetch method based on provided dates
-    if start_date is not None and end_date is not None:
-        rates = mt5.copy_rates_range(symbol, tf, start_date, end_date)
-    elif start_date is not None and end_date is None:
-        # Fetch 'bars' count starting from start_date
-        rates = mt5.copy_rates_from(symbol, tf, start_date, bars)
-    elif start_date is None and end_date is not None:
-        mt5.shutdown()
-        raise ValueError("end_date provided without start_date. Provide both, or only start_date, or neither.")
-    else:
-        rates = mt5.copy_rates_from_pos(symbol, tf, 0, bars)
-    if rates is None:
-        err = mt5.last_error()
-        mt5.shutdown()
-        raise RuntimeError(f"MT5 copy_rates_from_pos failed: {err}")
 
-    df = pd.DataFrame(rates)
-    df.rename(columns={"time": "time", "open": "open", "high": "high", "low": "low", "close": "close"}, inplace=True)
-    # MT5 returns oldest at index 0 already, keep it.
-    out = df[["time", "open", "high", "low", "close"]]
+    Pass an open `session` to reuse its connection; otherwise a connection is opened for this
+    call and closed afterwards.
+    """
+    if session is not None:
+        return session.fetch(symbol, timeframe, bars, start_date, end_date)
     # Close the MT5 connection to avoid leaking a handle when running CLI
-    mt5.shutdown()
-    return out
-
-
+    with MT5Session(login=login, password=password, server=server) as s:
+        return s.fetch(symbol, timeframe, bars, start_date, end_date)
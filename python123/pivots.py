@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+
+SideArrays = Tuple[np.ndarray, np.ndarray]
+
+
+class PivotSet:
+    """
+    Sparse semafor levels: for every level and side, the bars carrying a pivot.
+
+    Positions are int32 MT4 indices (0 = newest bar), sorted ascending, with the matching
+    float64 prices. Holds the same information as the dense {level: (low_buf, high_buf)} dict
+    of compute_semafor_levels at a fraction of the memory, since nearly every bar is 0.0.
+    """
+
+    __slots__ = ("n", "_lows", "_highs")
+
+    def __init__(self, n: int, lows: Dict[int, SideArrays], highs: Dict[int, SideArrays]):
+        if set(lows) != set(highs):
+            raise ValueError("lows and highs must cover the same levels")
+        self.n = n
+        self._lows = {lvl: _side(pos, price) for lvl, (pos, price) in lows.items()}
+        self._highs = {lvl: _side(pos, price) for lvl, (pos, price) in highs.items()}
+
+    @classmethod
+    def from_dense(cls, semafor_levels: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> "PivotSet":
+        """Build from {level: (low_buf, high_buf)}; every non-zero entry is kept."""
+        n = 0
+        lows: Dict[int, SideArrays] = {}
+        highs: Dict[int, SideArrays] = {}
+        for lvl, (low_buf, high_buf) in semafor_levels.items():
+            n = low_buf.shape[0]
+            lows[lvl] = dense_to_side(low_buf)
+            highs[lvl] = dense_to_side(high_buf)
+        return cls(n, lows, highs)
+
+    def to_dense(self, levels: Optional[Iterable[int]] = None) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Back to {level: (low_buf, high_buf)} (all levels, or only `levels`)."""
+        out: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for lvl in self.levels if levels is None else levels:
+            out[lvl] = (self._dense(self._lows[lvl]), self._dense(self._highs[lvl]))
+        return out
+
+    @property
+    def levels(self) -> List[int]:
+        return sorted(self._lows)
+
+    def lows(self, level: int) -> SideArrays:
+        """(positions, prices) of the level's low pivots."""
+        return self._lows[level]
+
+    def highs(self, level: int) -> SideArrays:
+        """(positions, prices) of the level's high pivots."""
+        return self._highs[level]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(p.nbytes + v.nbytes for side in (self._lows, self._highs) for p, v in side.values())
+
+    def __contains__(self, level: int) -> bool:
+        return level in self._lows
+
+    def __repr__(self) -> str:
+        counts = ", ".join(f"{lvl}: {self._lows[lvl][0].size}/{self._highs[lvl][0].size}" for lvl in self.levels)
+        return f"PivotSet(n={self.n}, lows/highs={{{counts}}})"
+
+    def _dense(self, side: SideArrays) -> np.ndarray:
+        buf = np.zeros(self.n, dtype=float)
+        buf[side[0]] = side[1]
+        return buf
+
+
+def _side(pos: np.ndarray, price: np.ndarray) -> SideArrays:
+    pos = np.asarray(pos, dtype=np.int32)
+    price = np.asarray(price, dtype=float)
+    if pos.shape != price.shape:
+        raise ValueError("positions and prices must have the same length")
+    return pos, price
+
+
+def dense_to_side(buf: np.ndarray) -> SideArrays:
+    """(positions, prices) of the non-zero entries of a dense semafor buffer."""
+    pos = np.flatnonzero(buf).astype(np.int32)
+    return pos, buf[pos].astype(float)
+
+
+def as_pivots(
+    semafor_levels: Union["PivotSet", Dict[int, Tuple[np.ndarray, np.ndarray]]],
+    levels: Iterable[int],
+) -> PivotSet:
+    """Accept either representation; dense input is converted for `levels` only."""
+    if isinstance(semafor_levels, PivotSet):
+        return semafor_levels
+    return PivotSet.from_dense({lvl: semafor_levels[lvl] for lvl in set(levels)})
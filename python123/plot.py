@@ -1,51 +1,214 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
+from .pivots import PivotSet, as_pivots
 from .triangles import Triangle
+from .triangle_set import DIR_BUY, TriangleSet
+
+BUY_COLOR = "tab:blue"
+SELL_COLOR = "tab:red"
 
 
 def plot_ohlc_with_triangles(
     df: pd.DataFrame,
-    triangles: List[Triangle],
+    triangles: Union[TriangleSet, Iterable[Triangle]],
     title: str = "1-2-3 Triangles",
     show: bool = False,
     out_path: str | None = None,
+    pivots: Optional[Union[PivotSet, Dict[int, Tuple[np.ndarray, np.ndarray]]]] = None,
+    pivot_levels: Optional[List[int]] = None,
+    candles: bool = False,
+    zigzag: bool = False,
+    max_points: Optional[int] = None,
+    figsize: Tuple[float, float] = (12, 6),
+    dpi: int = 150,
 ):
     """
-    Plot close price with 1-2-3 triangles overlaid. Assumes df newest is at index 0.
+    Plot close price (or candlesticks) with 1-2-3 triangles overlaid. Assumes df newest is at index 0.
+
+    - triangles: list of Triangle or a TriangleSet; all outlines are one LineCollection and the
+      vertices one marker line per direction, so thousands of triangles draw in one pass.
+    - pivots: optionally mark semafor pivots (PivotSet or dense levels dict) for `pivot_levels`
+      (default: all levels in `pivots`); `zigzag` also joins each level's pivots in time order.
+    - candles: draw OHLC candlesticks instead of the close line.
+    - max_points: horizontal resolution (default: the output width in pixels). The close line
+      keeps the first/last/min/max close of each bucket plus every triangle vertex and pivot
+      bar; candles merge each bucket into one OHLC bar. 0 draws every bar. Triangle vertices
+      and pivots are always drawn at their exact bar and price.
+
+    Without `show`, the figure is rendered off-screen (no pyplot state), which is safe in
+    worker processes and threads.
     """
     # Convert to plotting order: oldest -> newest
     dfp = df.iloc[::-1].reset_index(drop=True)
-    closes = dfp["close"].to_numpy()
+    n = len(dfp)
+    if max_points is None:
+        max_points = int(figsize[0] * dpi)
 
-    fig, ax = plt.subplots(figsize=(12, 6))
-    ax.plot(closes, color="#333", lw=1.2, label="Close")
+    fig = _figure(figsize, dpi, show)
+    ax = fig.add_subplot()
     ax.set_title(title)
     ax.grid(True, ls=":", alpha=0.4)
 
-    # triangles indices were computed on buffers with newest at 0 -> convert
-    n = len(dfp)
-    def buf_to_plot_idx(buf_idx: int) -> int:
-        # buffer 0 (newest) -> plot index n-1
-        return n - 1 - buf_idx
-
-    for t in triangles:
-        x1, x2, x3 = map(buf_to_plot_idx, [t.bar1, t.bar2, t.bar3])
-        y1, y2, y3 = t.price1, t.price2, t.price3
-        color = "tab:blue" if t.dir == "buy" else "tab:red"
-        ax.plot([x1, x2, x3, x1], [y1, y2, y3, y1], color=color, lw=1.5, alpha=0.9)
-        ax.scatter([x1, x2, x3], [y1, y2, y3], color=color, s=20)
-
-    ax.legend(loc="best")
+    # triangles indices were computed on buffers with newest at 0 -> plot index n-1-bar
+    dirs, xs, ys = _triangle_arrays(triangles, n)
+    sparse = None
+    levels: List[int] = []
+    if pivots is not None:
+        levels = list(pivot_levels) if pivot_levels is not None else None
+        if levels is None:
+            levels = pivots.levels if isinstance(pivots, PivotSet) else sorted(pivots)
+        sparse = as_pivots(pivots, levels)
+
+    if candles:
+        _draw_candles(ax, dfp, max_points)
+    else:
+        closes = dfp["close"].to_numpy()
+        keep = [xs.ravel()]
+        if sparse is not None:
+            for lvl in levels:
+                keep += [n - 1 - sparse.lows(lvl)[0], n - 1 - sparse.highs(lvl)[0]]
+        idx = minmax_indices(closes, max_points // 4, keep=np.concatenate(keep))
+        ax.plot(idx, closes[idx], color="#333", lw=1.2, label="Close")
+
+    if len(dirs):
+        _draw_triangles(ax, dirs, xs, ys)
+
+    if sparse is not None:
+        for rank, lvl in enumerate(sorted(levels)):
+            # lower level index = longer period = bigger marker
+            size = max(6, 40 - 5 * rank)
+            (lpos, lprice), (hpos, hprice) = sparse.lows(lvl), sparse.highs(lvl)
+            for pos, price, color in ((lpos, lprice, "tab:green"), (hpos, hprice, "tab:orange")):
+                _markers(ax, n - 1 - pos, price, size, color, alpha=0.5, zorder=1)
+            if zigzag and len(lpos) + len(hpos) > 1:
+                x = n - 1 - np.concatenate([lpos, hpos])
+                y = np.concatenate([lprice, hprice])
+                order = np.argsort(x, kind="stable")
+                ax.plot(x[order], y[order], lw=max(0.5, 1.5 - 0.15 * rank), alpha=0.6, color="tab:purple", zorder=1)
+
+    if ax.get_legend_handles_labels()[0]:
+        ax.legend(loc="best")
     fig.tight_layout()
     if out_path:
-        fig.savefig(out_path, dpi=150)
+        fig.savefig(out_path, dpi=dpi)
     if show:
+        import matplotlib.pyplot as plt
+
         plt.show()
-    plt.close(fig)
+        plt.close(fig)
+
+
+def minmax_indices(values: np.ndarray, buckets: int, keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Sorted indices of `values` to draw for a line at `buckets` horizontal resolution: the first,
+    last, min and max of each equal-width bucket (M4 downsampling), so the rendered line has
+    the same envelope as the full series. `keep` indices are always included. With
+    buckets <= 0 or a short series, every index.
+    """
+    n = len(values)
+    if buckets <= 0 or 4 * buckets >= n:
+        idx = np.arange(n)
+    else:
+        w = -(-n // buckets)
+        m = n // w * w
+        body = values[:m].reshape(-1, w)
+        starts = np.arange(0, m, w)
+        parts = [starts, starts + (w - 1), starts + np.argmin(body, axis=1), starts + np.argmax(body, axis=1)]
+        if m < n:
+            tail = values[m:]
+            parts.append(np.array([m, n - 1, m + np.argmin(tail), m + np.argmax(tail)]))
+        idx = np.unique(np.concatenate(parts))
+    if keep is not None and len(keep):
+        keep = np.asarray(keep, dtype=np.int64)
+        idx = np.union1d(idx, keep[(keep >= 0) & (keep < n)])
+    return idx
+
+
+def bucket_ohlc(
+    opens: np.ndarray, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, buckets: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge oldest-first bars into at most `buckets` bars: (start, stop, open, high, low, close)
+    with [start, stop) the source bars of each. High/low are exact bucket extremes.
+    """
+    n = len(closes)
+    if buckets <= 0 or buckets >= n:
+        starts = np.arange(n)
+    else:
+        starts = np.unique(np.linspace(0, n, buckets + 1).astype(np.int64)[:-1])
+    stops = np.append(starts[1:], n)
+    return (
+        starts,
+        stops,
+        opens[starts],
+        np.maximum.reduceat(highs, starts),
+        np.minimum.reduceat(lows, starts),
+        closes[stops - 1],
+    )
+
+
+def _figure(figsize: Tuple[float, float], dpi: int, show: bool):
+    if show:
+        import matplotlib.pyplot as plt
+
+        return plt.figure(figsize=figsize, dpi=dpi)
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=figsize, dpi=dpi)
+
+
+def _triangle_arrays(triangles, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(is_buy[k], x[k, 3], y[k, 3]) in plot coordinates."""
+    if isinstance(triangles, TriangleSet):
+        dirs = triangles["dir"] == DIR_BUY
+        bars = np.column_stack([triangles["bar1"], triangles["bar2"], triangles["bar3"]])
+        ys = np.column_stack([triangles["price1"], triangles["price2"], triangles["price3"]])
+    else:
+        triangles = list(triangles)
+        dirs = np.array([t.dir == "buy" for t in triangles], dtype=bool)
+        bars = np.array([(t.bar1, t.bar2, t.bar3) for t in triangles], dtype=np.int64).reshape(-1, 3)
+        ys = np.array([(t.price1, t.price2, t.price3) for t in triangles], dtype=np.float64).reshape(-1, 3)
+    return dirs, n - 1 - bars, ys
+
+
+def _draw_triangles(ax, dirs: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> None:
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import to_rgba
+
+    colors = np.where(dirs[:, None], np.array(to_rgba(BUY_COLOR)), np.array(to_rgba(SELL_COLOR)))
+    # closed outlines 1-2-3-1: (k, 4, 2) vertex array
+    segs = np.stack([np.concatenate([xs, xs[:, :1]], axis=1), np.concatenate([ys, ys[:, :1]], axis=1)], axis=-1)
+    ax.add_collection(LineCollection(segs, colors=colors, linewidths=1.5, alpha=0.9))
+    for mask, color in ((dirs, BUY_COLOR), (~dirs, SELL_COLOR)):
+        _markers(ax, xs[mask].ravel(), ys[mask].ravel(), 20, color)
+
+
+def _markers(ax, x: np.ndarray, y: np.ndarray, size: float, color: str, **kwargs) -> None:
+    """Same-looking markers as ax.scatter(s=size), but drawn from one cached marker image (much faster)."""
+    if len(x):
+        ax.plot(x, y, ls="none", marker="o", ms=np.sqrt(size), mec="none", color=color, **kwargs)
+
 
+def _draw_candles(ax, dfp: pd.DataFrame, max_points: int) -> None:
+    from matplotlib.collections import LineCollection, PolyCollection
 
+    o, h, l, c = (dfp[k].to_numpy(dtype=float) for k in ("open", "high", "low", "close"))
+    # a candle needs a few pixels to read
+    starts, stops, o, h, l, c = bucket_ohlc(o, h, l, c, max_points // 3)
+    x = (starts + stops - 1) / 2.0
+    half = (stops - starts) * 0.35
+    up = c >= o
+    colors = np.where(up, "tab:green", "tab:red")
+    wicks = np.stack([np.column_stack([x, l]), np.column_stack([x, h])], axis=1)
+    ax.add_collection(LineCollection(wicks, colors=colors, linewidths=0.6, zorder=0))
+    lo, hi = np.minimum(o, c), np.maximum(o, c)
+    bodies = np.stack(
+        [np.column_stack([x - half, lo]), np.column_stack([x - half, hi]), np.column_stack([x + half, hi]), np.column_stack([x + half, lo])],
+        axis=1,
+    )
+    ax.add_collection(PolyCollection(bodies, facecolors=colors, edgecolors=colors, linewidths=0.3, zorder=0))
+    ax.autoscale_view()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+import numpy as np
+
+from .pivots import PivotSet
+from .triangle_set import TriangleSet
+
+# prices further than this (in points) from the point grid are not quoted in that point
+_GRID_TOLERANCE = 1e-6
+
+
+def point_digits(point: float) -> int:
+    """Decimal places of a point size (0.00001 -> 5, 0.25 -> 2, 1.0 -> 0)."""
+    text = f"{point:.12f}".rstrip("0")
+    return len(text.partition(".")[2])
+
+
+def infer_point(*arrays: np.ndarray, max_digits: int = 8) -> float:
+    """
+    Point size of the given prices: the largest 10**-d (d <= max_digits) on whose grid every
+    finite price lies, i.e. the point of a symbol quoted with d digits.
+    """
+    values = np.concatenate([np.asarray(a, dtype=np.float64).ravel() for a in arrays]) if arrays else np.zeros(0)
+    values = values[np.isfinite(values)]
+    for d in range(max_digits + 1):
+        scaled = values * 10.0**d
+        if np.all(np.abs(scaled - np.rint(scaled)) <= _GRID_TOLERANCE):
+            return 10.0**-d
+    raise ValueError(f"prices are not quoted with at most {max_digits} digits; pass the point size explicitly")
+
+
+def to_points(prices: np.ndarray, point: float, dtype=np.int32) -> np.ndarray:
+    """
+    Prices as integer multiples of `point` (1.23456 -> 123456 for point 0.00001).
+
+    Point counts compare exactly, so pivot selection on them matches the float prices, and
+    `deviation_points` / `max_distance_points` become real point counts as in MT4. int32
+    takes half the memory of float64 (prices up to 2**31 points).
+    """
+    if not point > 0:
+        raise ValueError("point must be positive")
+    scaled = np.asarray(prices, dtype=np.float64) / point
+    out = np.rint(scaled)
+    if not np.all(np.isfinite(out)):
+        raise ValueError("prices must be finite")
+    if np.any(np.abs(scaled - out) > _GRID_TOLERANCE):
+        raise ValueError(f"prices are not multiples of point {point:g}")
+    info = np.iinfo(dtype)
+    if out.size and (out.min() < info.min or out.max() > info.max):
+        raise ValueError(f"prices exceed the {np.dtype(dtype).name} range in points of {point:g}")
+    return out.astype(dtype)
+
+
+def from_points(values: np.ndarray, point: float) -> np.ndarray:
+    """Point counts back to prices, rounded to the point's digits (0.0 stays 0.0, so dense buffers convert too)."""
+    return np.round(np.asarray(values, dtype=np.float64) * point, point_digits(point))
+
+
+def price_arrays(
+    df,
+    float32: bool = False,
+    points: bool = False,
+    point: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray, Optional[float]]:
+    """
+    (highs, lows, point) of a bar frame for the semafor pipeline.
+
+    - default: the columns as stored, without an upcasting copy (float32 CSV columns stay float32)
+    - float32: float32 prices, half the memory of float64
+    - points: int32 point counts; `point` defaults to infer_point on the highs and lows and is
+      returned (None otherwise) so results can be mapped back with from_points
+    """
+    if float32 and points:
+        raise ValueError("float32 and points storage are alternatives")
+    highs = df["high"].to_numpy()
+    lows = df["low"].to_numpy()
+    if points:
+        point = point or infer_point(highs, lows)
+        return to_points(highs, point), to_points(lows, point), point
+    dtype = np.float32 if float32 else np.result_type(highs.dtype, np.float32)
+    return highs.astype(dtype, copy=False), lows.astype(dtype, copy=False), None
+
+
+def pivots_from_points(pivots: PivotSet, point: float) -> PivotSet:
+    """Copy of a PivotSet computed on point counts, with prices in price units."""
+    lows = {}
+    highs = {}
+    for lvl in pivots.levels:
+        pos, price = pivots.lows(lvl)
+        lows[lvl] = (pos, from_points(price, point))
+        pos, price = pivots.highs(lvl)
+        highs[lvl] = (pos, from_points(price, point))
+    return PivotSet(pivots.n, lows, highs)
+
+
+def triangles_from_points(tris: TriangleSet, point: float) -> TriangleSet:
+    """Copy of a TriangleSet found on point counts, with price1..price3 in price units."""
+    cols = {name: tris[name] for name in tris.columns}
+    for name in ("price1", "price2", "price3"):
+        cols[name] = from_points(cols[name], point)
+    return TriangleSet(cols)
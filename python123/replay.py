@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from .stream import SemaforStream
+from .triangles import IncrementalTriangleDetector, Triangle
+from .triangle_set import DIR_BUY, DIR_SELL, TriangleSet
+
+EVENT_ADDED = 1
+EVENT_EXPIRED = 0
+EVENT_INVALIDATED = -1
+
+# column name -> dtype; t1..t3 and `at` are bar times (oldest bar = 0), not MT4 indices
+LOG_COLUMNS = {
+    "at": np.dtype(np.int64),
+    "event": np.dtype(np.int8),
+    "dir": np.dtype(np.int8),
+    "t1": np.dtype(np.int64),
+    "price1": np.dtype(np.float64),
+    "t2": np.dtype(np.int64),
+    "price2": np.dtype(np.float64),
+    "t3": np.dtype(np.int64),
+    "price3": np.dtype(np.float64),
+}
+_KEY = ("dir", "t1", "price1", "t2", "price2", "t3", "price3")
+
+
+class ReplayLog:
+    """
+    Point-in-time triangle history produced by replay().
+
+    One row per event: at bar time `at` (oldest bar = 0) a triangle was added, invalidated
+    (repainted away) or expired (point 1 left max_bars_scan). Triangles are identified by
+    bar times, which do not shift as bars arrive. Replaying the events up to bar t gives
+    exactly what detect_123_triangles returned on the first t + 1 bars.
+    """
+
+    __slots__ = ("n", "times", "_cols")
+
+    def __init__(self, n: int, columns: Dict[str, np.ndarray], times: Optional[np.ndarray] = None):
+        self.n = n
+        self.times = times
+        self._cols = {name: np.ascontiguousarray(columns[name], dtype=dtype) for name, dtype in LOG_COLUMNS.items()}
+
+    def __len__(self) -> int:
+        return self._cols["at"].shape[0]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._cols[name]
+
+    def __repr__(self) -> str:
+        added = int((self._cols["event"] == EVENT_ADDED).sum())
+        return f"ReplayLog(bars={self.n}, events={len(self)}, added={added})"
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Events as a DataFrame; with bar times, `time` is the bar at which each event happened."""
+        df = pd.DataFrame(self._cols, copy=False)
+        if self.times is not None:
+            df.insert(1, "time", self.times[self._cols["at"]])
+        return df
+
+    def lifetimes(self) -> pd.DataFrame:
+        """
+        One row per triangle appearance: bar times of its points, `appeared`, `vanished`
+        (-1 while still present at the end) and `end` ("invalidated", "expired" or "alive").
+        """
+        c = self._cols
+        rows: List[list] = []
+        open_rows: Dict[tuple, int] = {}
+        keys = list(zip(*(c[k].tolist() for k in _KEY)))
+        for at, ev, key in zip(c["at"].tolist(), c["event"].tolist(), keys):
+            if ev == EVENT_ADDED:
+                open_rows[key] = len(rows)
+                rows.append([*key, at, -1, "alive"])
+            else:
+                i = open_rows.pop(key)
+                rows[i][-2] = at
+                rows[i][-1] = "invalidated" if ev == EVENT_INVALIDATED else "expired"
+        return pd.DataFrame(rows, columns=[*_KEY, "appeared", "vanished", "end"])
+
+    def as_of(self, t: int) -> TriangleSet:
+        """
+        Triangles present after bar time t closed, with MT4 indices as seen then (bar 0 = t),
+        in detect_123_triangles order.
+        """
+        c = self._cols
+        live: Dict[tuple, None] = {}
+        upto = np.searchsorted(c["at"], t, side="right")
+        keys = zip(*(c[k][:upto].tolist() for k in _KEY))
+        for ev, key in zip(c["event"][:upto].tolist(), keys):
+            if ev == EVENT_ADDED:
+                live[key] = None
+            else:
+                live.pop(key, None)
+        if not live:
+            return TriangleSet.from_triangles([])
+        d, t1, p1, t2, p2, t3, p3 = (np.array(col) for col in zip(*live))
+        order = np.lexsort((-d, t1))
+        times = self.times[: t + 1][::-1] if self.times is not None else None
+        return TriangleSet.from_columns(
+            d[order], t - t1[order], p1[order], t - t2[order], p2[order], t - t3[order], p3[order], times=times
+        )
+
+    def signals(self) -> Tuple[TriangleSet, np.ndarray]:
+        """
+        Every appearance as a trade signal on the full series: (triangles with MT4 indices of
+        the whole history, MT4 index of the bar on whose close each one was first visible).
+        Pass both to backtest(..., signal_bars=...) for a backtest free of repainting.
+        """
+        c = self._cols
+        m = c["event"] == EVENT_ADDED
+        last = self.n - 1
+        times = self.times[::-1] if self.times is not None else None
+        tris = TriangleSet.from_columns(
+            c["dir"][m],
+            last - c["t1"][m],
+            c["price1"][m],
+            last - c["t2"][m],
+            c["price2"][m],
+            last - c["t3"][m],
+            c["price3"][m],
+            times=times,
+        )
+        return tris, last - c["at"][m]
+
+
+def replay(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    big_level: int,
+    small_level: int,
+    max_distance_points: int,
+    max_bars_scan: int,
+    times: Optional[np.ndarray] = None,
+) -> ReplayLog:
+    """
+    Walk MT4-oriented highs/lows (index 0 = newest) from the oldest bar, closing one bar at
+    a time, and log every triangle change a live chart would have shown.
+
+    Only the big and small levels are maintained, incrementally (SemaforStream and
+    IncrementalTriangleDetector), so each bar costs the repaint depth instead of a full
+    recompute of the prefix. `times` (MT4 orientation, any dtype) is kept for to_pandas().
+    """
+    n = highs.shape[0]
+    levels = sorted({big_level, small_level})
+    stream = SemaforStream([periods[lv - 1] for lv in levels], deviation_points, backstep, capacity=max(1024, n))
+    detector = IncrementalTriangleDetector(big_level, small_level, max_distance_points, max_bars_scan)
+
+    h = np.asarray(highs, dtype=np.float64)[::-1].tolist()
+    l = np.asarray(lows, dtype=np.float64)[::-1].tolist()
+    rows: List[tuple] = []
+    for t in range(n):
+        stream.append(h[t], l[t])
+        bufs = stream.levels()
+        sema = {lv: bufs[i] for i, lv in enumerate(levels, start=1)}
+        events = detector.update(sema, changed_from=stream.pop_changed())
+        for kind, tris in ((EVENT_EXPIRED, events.expired), (EVENT_INVALIDATED, events.invalidated), (EVENT_ADDED, events.added)):
+            for tri in tris:
+                rows.append(_row(t, kind, tri))
+
+    cols = dict(zip(LOG_COLUMNS, zip(*rows))) if rows else {name: [] for name in LOG_COLUMNS}
+    ordered = np.asarray(times)[::-1] if times is not None else None
+    return ReplayLog(n, cols, ordered)
+
+
+def _row(t: int, kind: int, tri: Triangle) -> tuple:
+    return (
+        t,
+        kind,
+        DIR_BUY if tri.dir == "buy" else DIR_SELL,
+        t - tri.bar1,
+        tri.price1,
+        t - tri.bar2,
+        tri.price2,
+        t - tri.bar3,
+        tri.price3,
+    )
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
-from typing import Dict, Tuple, List
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, Sequence, Tuple, List, Optional
 import numpy as np
 
-from .zigzag import compute_zigzag_buffers
+from .extrema import RangeExtremaIndex
+from .metrics import METRICS
+from .pivots import PivotSet, dense_to_side
+from .shared import SharedArrays, SharedHandle
+from .zigzag import _pad_extrema_inputs, compute_zigzag_buffers, series_lengths, zigzag_batch_from_index
 
 
 def compute_semafor_levels(
@@ -12,22 +17,191 @@ def compute_semafor_levels(
     periods: List[int],
     deviation_points: int,
     backstep: int,
+    executor: Optional[Executor] = None,
 ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
     """
     Compute 8 (or N) semafor levels using ZigZag-like buffers.
 
+    Window extrema for all periods come from one shared RangeExtremaIndex, so highs/lows are
+    scanned once rather than once per level. Levels are independent: pass an `executor` to
+    run them concurrently. A ThreadPoolExecutor shares the index between workers. With a
+    ProcessPoolExecutor highs/lows and the output buffers live in one shared-memory block
+    (see SharedArrays), so workers attach to them instead of receiving and returning copies;
+    any other executor receives plain arrays and computes each level on its own.
+
     Returns a dict: level_index -> (low_buffer, high_buffer), where level_index starts at 1.
     """
-    results: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
-    for i, depth in enumerate(periods, start=1):
-        low_buf, high_buf = compute_zigzag_buffers(
-            highs=highs,
-            lows=lows,
-            depth=depth,
-            deviation_points=deviation_points,
-            backstep=backstep,
-        )
-        results[i] = (low_buf, high_buf)
-    return results
+    return dict(_iter_levels(highs, lows, periods, deviation_points, backstep, executor))
+
+
+def compute_semafor_pivots(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    executor: Optional[Executor] = None,
+) -> PivotSet:
+    """
+    Same levels as compute_semafor_levels, returned as a sparse PivotSet.
+
+    Each level's dense buffers are compressed as soon as they are computed, so at most one
+    level's worth of dense buffers is alive at a time (without an executor).
+    """
+    lows_sparse = {}
+    highs_sparse = {}
+    for i, (low_buf, high_buf) in _iter_levels(highs, lows, periods, deviation_points, backstep, executor):
+        lows_sparse[i] = dense_to_side(low_buf)
+        highs_sparse[i] = dense_to_side(high_buf)
+    return PivotSet(highs.shape[0], lows_sparse, highs_sparse)
+
+
+def _iter_levels(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    executor: Optional[Executor],
+) -> Iterator[Tuple[int, Tuple[np.ndarray, np.ndarray]]]:
+    share_index = executor is None or isinstance(executor, ThreadPoolExecutor)
+    with METRICS.timer("semafor.extrema"):
+        index = RangeExtremaIndex(highs, lows, periods) if share_index else None
+
+    if executor is None:
+        for i, depth in enumerate(periods, start=1):
+            with METRICS.timer(f"semafor.level{i}"):
+                bufs = compute_zigzag_buffers(
+                    highs=highs,
+                    lows=lows,
+                    depth=depth,
+                    deviation_points=deviation_points,
+                    backstep=backstep,
+                    index=index,
+                )
+            yield i, bufs
+        return
+
+    if isinstance(executor, ProcessPoolExecutor):
+        yield from _iter_shared_levels(highs, lows, periods, deviation_points, backstep, executor)
+        return
+
+    futures = {
+        i: executor.submit(compute_zigzag_buffers, highs, lows, depth, deviation_points, backstep, index)
+        for i, depth in enumerate(periods, start=1)
+    }
+    for i, fut in futures.items():
+        yield i, fut.result()
+
+
+def _iter_shared_levels(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    executor: Executor,
+) -> Iterator[Tuple[int, Tuple[np.ndarray, np.ndarray]]]:
+    n = highs.shape[0]
+    with SharedArrays.from_arrays({"highs": highs, "lows": lows}) as inputs, SharedArrays.create(
+        {"out": ((len(periods), 2, n), np.float64)}
+    ) as outputs:
+        futures = {
+            i: executor.submit(_shared_level, inputs.handle, outputs.handle, i - 1, depth, deviation_points, backstep)
+            for i, depth in enumerate(periods, start=1)
+        }
+        out = outputs["out"]
+        for i, fut in futures.items():
+            fut.result()
+            yield i, (out[i - 1, 0].copy(), out[i - 1, 1].copy())
+        del out
+
+
+def _shared_level(
+    inputs: SharedHandle,
+    outputs: SharedHandle,
+    slot: int,
+    depth: int,
+    deviation_points: int,
+    backstep: int,
+) -> None:
+    """Process-pool task: one level from shared highs/lows, written into its slot of the shared output."""
+    with SharedArrays.attach(inputs) as src, SharedArrays.attach(outputs) as dst:
+        low_buf, high_buf = compute_zigzag_buffers(src["highs"], src["lows"], depth, deviation_points, backstep)
+        dst["out"][slot, 0] = low_buf
+        dst["out"][slot, 1] = high_buf
+
+
+def compute_semafor_levels_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    lengths: Optional[Sequence[int]] = None,
+    block_cells: int = 1 << 16,
+) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    compute_semafor_levels for a (series x bars) matrix of aligned series.
+
+    Rows are MT4-oriented and padded at the old end (see compute_zigzag_buffers_batch for
+    `lengths`). Returns {level: (low_buffers, high_buffers)}, each (series x bars); row i
+    equals compute_semafor_levels on row i alone. Rows are processed in blocks of about
+    `block_cells` cells (at least one row) so each vectorized pass stays cache-resident;
+    within a block one 2-D RangeExtremaIndex serves every period.
+    """
+    highs = np.asarray(highs)
+    lows = np.asarray(lows)
+    lengths = series_lengths(highs, lengths)
+    rows, n = highs.shape
+    out = {
+        i: (np.zeros((rows, n), dtype=float), np.zeros((rows, n), dtype=float))
+        for i in range(1, len(periods) + 1)
+    }
+    step = max(1, block_cells // max(n, 1))
+    for start in range(0, rows, step):
+        block = slice(start, start + step)
+        with METRICS.timer("semafor.extrema"):
+            h, l = _pad_extrema_inputs(highs[block], lows[block], lengths[block])
+            index = RangeExtremaIndex(h, l, [min(d, n) for d in periods])
+        for i, depth in enumerate(periods, start=1):
+            with METRICS.timer(f"semafor.level{i}"):
+                low_buf, high_buf = zigzag_batch_from_index(
+                    h, l, lengths[block], depth, deviation_points, backstep, index
+                )
+            out[i][0][block] = low_buf
+            out[i][1][block] = high_buf
+    return out
 
 
+def compute_semafor_pivots_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    lengths: Optional[Sequence[int]] = None,
+) -> List[PivotSet]:
+    """compute_semafor_levels_batch as one PivotSet per series (sized to its valid bars)."""
+    lengths = series_lengths(highs, lengths)
+    levels = compute_semafor_levels_batch(highs, lows, periods, deviation_points, backstep, lengths)
+    out = []
+    for row, n in enumerate(lengths.tolist()):
+        lows_sparse = {lvl: dense_to_side(low_buf[row, :n]) for lvl, (low_buf, _) in levels.items()}
+        highs_sparse = {lvl: dense_to_side(high_buf[row, :n]) for lvl, (_, high_buf) in levels.items()}
+        out.append(PivotSet(n, lows_sparse, highs_sparse))
+    return out
+
+
+def stack_series(series: Sequence[np.ndarray], dtype=np.float64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack MT4-oriented 1-D arrays of different lengths into a NaN-padded (series x bars)
+    matrix for the batch functions; returns (matrix, lengths). Integer (point) matrices are
+    zero-padded, so pass the returned lengths along with them.
+    """
+    lengths = np.array([len(a) for a in series], dtype=np.int64)
+    fill = np.nan if np.issubdtype(np.dtype(dtype), np.floating) else 0
+    out = np.full((len(series), int(lengths.max(initial=0))), fill, dtype=dtype)
+    for row, a in enumerate(series):
+        out[row, : len(a)] = a
+    return out, lengths
@@ -0,0 +1,421 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+
+from .batch import ScanParams, triangle_rows
+from .sources import SESSION_SOURCES, BarRequest, load_bars, open_session
+from .ticks import TimeframeScanner
+from .triangle_set import TriangleSet
+from .triangles import TriangleEvents
+
+FeedKey = Tuple[str, str]
+
+
+class Feed:
+    """
+    One (symbol, timeframe) of the service: its scanner and the encoded snapshot of its triangles.
+
+    State only changes on the service's worker thread (apply), which also encodes the new
+    snapshot; the event loop only reads finished snapshots, never a half-applied update.
+    """
+
+    def __init__(self, symbol: str, timeframe: str, params: ScanParams):
+        self.symbol = symbol
+        self.timeframe = timeframe.upper()
+        self.scanner = TimeframeScanner(
+            list(params.periods), params.dev, params.backstep, params.big, params.small, params.maxdist, params.bars
+        )
+        # open time (epoch seconds) of the newest closed bar scanned, -1 before the first load
+        self.last_closed = -1
+        self.seq = 0
+        self.error: Optional[str] = None
+        self._snapshot = self._encode_snapshot()
+
+    @property
+    def key(self) -> FeedKey:
+        return (self.symbol, self.timeframe)
+
+    def apply(self, df, closed_only: bool) -> Optional[dict]:
+        """
+        Scan the closed bars of `df` (oldest first) newer than the last ones seen. Returns the
+        update message, or None when no bar closed.
+        """
+        times = _epoch_seconds(df["time"].to_numpy())
+        end = times.shape[0] - 1 if closed_only else times.shape[0]
+        start = int(np.searchsorted(times[:end], self.last_closed, side="right"))
+        if start >= end:
+            return None
+        bars = {"time": times[start:end], "high": df["high"].to_numpy()[start:end], "low": df["low"].to_numpy()[start:end]}
+        events = self.scanner.append(bars)
+        self.last_closed = int(times[end - 1])
+        self.seq += 1
+        self.error = None
+        msg = self._message(events)
+        # replaced in one assignment, so readers on the event loop see the old or the new snapshot
+        self._snapshot = self._encode_snapshot()
+        return msg
+
+    def status(self) -> dict:
+        out = {"symbol": self.symbol, "timeframe": self.timeframe, "bars": len(self.scanner), "last_bar": _iso(self.last_closed), "seq": self.seq}
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+    def snapshot(self) -> bytes:
+        """Triangles as of the last update as JSON, encoded once per update however many clients ask."""
+        return self._snapshot
+
+    def _encode_snapshot(self) -> bytes:
+        out = self.status()
+        out["triangles"] = triangle_rows(self.scanner.triangles()) if len(self.scanner) else []
+        return json.dumps(out).encode()
+
+    def _message(self, events: TriangleEvents) -> dict:
+        out = self.status()
+        times = self.scanner.times().astype("datetime64[s]")
+        for name in ("added", "invalidated", "expired"):
+            tris = getattr(events, name)
+            out[name] = triangle_rows(TriangleSet.from_triangles(tris, times=times)) if tris else []
+        return out
+
+
+class Subscriber:
+    """
+    One streaming client. Messages are queued as already-encoded frames shared by every
+    subscriber; a client whose queue fills up is disconnected rather than slowing the rest.
+    """
+
+    def __init__(self, keys: Optional[Set[FeedKey]], maxsize: int):
+        self.keys = keys
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def wants(self, key: FeedKey) -> bool:
+        return self.keys is None or key in self.keys
+
+    def offer(self, frame: bytes) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self) -> None:
+        """End the stream after the frames already queued (an empty frame is the end marker)."""
+        try:
+            self.queue.put_nowait(b"")
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class SignalService:
+    """
+    Long-running scanner for a set of (symbol, timeframe) feeds that pushes triangle changes
+    to subscribers.
+
+    - One data-source session (mt5, fake) polled every `poll_interval` seconds; feeds are
+      rescanned only when a bar closed, with the same incremental scanner as tick mode.
+      Other sources (csv, cache) are loaded once and only serve snapshots.
+    - Blocking MT5 calls and scans run on one worker thread (the MetaTrader5 package is not
+      thread-safe); the event loop only routes bytes.
+    - Every update is encoded once and shared by all subscribers. Each subscriber has a
+      bounded queue of `queue_size` frames and `write_timeout` seconds per write; past
+      either, it is dropped and can reconnect for a fresh snapshot.
+
+    HTTP API (TCP or Unix socket; symbol/timeframe query parameters filter feeds):
+    GET /feeds, GET /snapshot and GET /events (Server-Sent Events: a `snapshot` event, then
+    one `update` event per closed bar with added/invalidated/expired triangles).
+    """
+
+    def __init__(
+        self,
+        feeds: Iterable[FeedKey],
+        params: ScanParams,
+        source: str = "mt5",
+        poll_interval: float = 1.0,
+        queue_size: int = 256,
+        write_timeout: float = 10.0,
+        keepalive: float = 15.0,
+        backlog: int = 1024,
+    ):
+        self.params = params
+        self.source = source
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.write_timeout = write_timeout
+        self.keepalive = keepalive
+        self.backlog = backlog
+        self.feeds: Dict[FeedKey, Feed] = {}
+        for symbol, tf in feeds:
+            feed = Feed(symbol, tf, params)
+            self.feeds[feed.key] = feed
+        self.subscribers: Set[Subscriber] = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="python123-service")
+        self._session = None
+        self._servers: List[asyncio.AbstractServer] = []
+        self._handlers: Set[asyncio.Task] = set()
+        self._unix_path: Optional[str] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    # --- data ---
+
+    def _poll_feed(self, feed: Feed) -> Optional[dict]:
+        """Fetch and scan one feed (worker thread)."""
+        request = BarRequest(
+            symbol=feed.symbol,
+            timeframe=feed.timeframe,
+            bars=self.params.bars,
+            path=self.params.data_dir,
+            cache_dir=self.params.cache_dir,
+        )
+        if self.source not in SESSION_SOURCES:
+            if feed.last_closed >= 0:
+                return None
+            return feed.apply(load_bars(self.source, request).iloc[::-1], closed_only=False)
+        if self._session is None:
+            self._session = open_session(self.source, request)
+        # the newest bar is still forming: it is scanned once fetch_new returns a newer one
+        df = self._session.fetch_new(feed.symbol, feed.timeframe, self.params.bars)
+        return feed.apply(df, closed_only=True)
+
+    async def poll_once(self) -> int:
+        """Poll every feed once and publish what changed; returns the number of updates."""
+        loop = asyncio.get_running_loop()
+        updates = 0
+        for feed in self.feeds.values():
+            try:
+                msg = await loop.run_in_executor(self._executor, self._poll_feed, feed)
+            except Exception as exc:
+                feed.error = f"{type(exc).__name__}: {exc}"
+                print(f"{feed.symbol} {feed.timeframe}: {feed.error}", file=sys.stderr)
+                continue
+            if msg is not None:
+                updates += 1
+                self.publish(feed.key, _frame("update", msg, feed.seq))
+        return updates
+
+    async def _poll_loop(self) -> None:
+        while True:
+            started = time.monotonic()
+            await self.poll_once()
+            await asyncio.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+
+    # --- subscribers ---
+
+    def subscribe(self, keys: Optional[Set[FeedKey]] = None) -> Subscriber:
+        sub = Subscriber(keys, self.queue_size)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+
+    def publish(self, key: FeedKey, frame: bytes) -> None:
+        for sub in self.subscribers:
+            if sub.wants(key):
+                sub.offer(frame)
+
+    def select(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> List[Feed]:
+        tf = timeframe.upper() if timeframe else None
+        return [f for f in self.feeds.values() if (symbol is None or f.symbol == symbol) and (tf is None or f.timeframe == tf)]
+
+    def snapshot(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> bytes:
+        """JSON array of the selected feeds' snapshots, from memory."""
+        return b"[" + b",".join(f.snapshot() for f in self.select(symbol, timeframe)) + b"]"
+
+    # --- HTTP ---
+
+    async def start(self, host: Optional[str] = "127.0.0.1", port: Optional[int] = 8765, unix_path: Optional[str] = None) -> None:
+        """Load every feed, then listen on host:port and/or a Unix socket and start polling."""
+        self._stop = asyncio.Event()
+        await self.poll_once()
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            self._servers.append(await asyncio.start_unix_server(self._handle, path=unix_path, backlog=self.backlog))
+            self._unix_path = unix_path
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._handle, host, port, backlog=self.backlog))
+        self._poller = asyncio.create_task(self._poll_loop())
+
+    async def serve_forever(self) -> None:
+        try:
+            await self._stop.wait()
+        finally:
+            await self.close()
+
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+
+    async def close(self) -> None:
+        poller = getattr(self, "_poller", None)
+        if poller is not None:
+            poller.cancel()
+        for server in self._servers:
+            server.close()
+        for sub in self.subscribers:
+            sub.close()
+        if self._handlers:
+            await asyncio.wait(self._handlers, timeout=self.write_timeout)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+        if self._unix_path is not None and os.path.exists(self._unix_path):
+            os.unlink(self._unix_path)
+            self._unix_path = None
+        if self._session is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._session.close)
+            self._session = None
+        self._executor.shutdown(wait=False)
+
+    @property
+    def addresses(self) -> List:
+        return [sock.getsockname() for server in self._servers for sock in server.sockets]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.write_timeout)
+            method, target = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ")[:2]
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            writer.close()
+            return
+        url = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        symbol, timeframe = query.get("symbol"), query.get("timeframe")
+        try:
+            if method != "GET":
+                await self._respond(writer, 405, b'{"error": "method not allowed"}')
+            elif url.path == "/feeds":
+                await self._respond(writer, 200, json.dumps([f.status() for f in self.select(symbol, timeframe)]).encode())
+            elif url.path == "/snapshot":
+                await self._respond(writer, 200, self.snapshot(symbol, timeframe))
+            elif url.path == "/events":
+                await self._stream(writer, symbol, timeframe)
+            else:
+                await self._respond(writer, 404, b'{"error": "not found"}')
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: bytes) -> None:
+        reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def _stream(self, writer: asyncio.StreamWriter, symbol: Optional[str], timeframe: Optional[str]) -> None:
+        feeds = self.select(symbol, timeframe)
+        # subscribing and taking the snapshot in one step leaves no gap between them
+        sub = self.subscribe({f.key for f in feeds})
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            writer.write(b"event: snapshot\ndata: [" + b",".join(f.snapshot() for f in feeds) + b"]\n\n")
+            while not sub.overflowed:
+                await asyncio.wait_for(writer.drain(), self.write_timeout)
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    frame = b": keepalive\n\n"
+                if not frame:
+                    return
+                writer.write(frame)
+            writer.write(b'event: overflow\ndata: {"error": "client too slow, reconnect for a new snapshot"}\n\n')
+            await asyncio.wait_for(writer.drain(), self.write_timeout)
+        finally:
+            self.unsubscribe(sub)
+
+
+def _frame(event: str, msg: dict, seq: int) -> bytes:
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(msg)}\n\n".encode()
+
+
+def _epoch_seconds(times: np.ndarray) -> np.ndarray:
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype("datetime64[s]").astype(np.int64)
+    return times.astype(np.int64)
+
+
+def _iso(epoch: int) -> Optional[str]:
+    if epoch < 0:
+        return None
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch))
+
+
+def main(argv=None) -> int:
+    """`python -m python123.cli serve ...`: run the signal service until interrupted."""
+    p = argparse.ArgumentParser(prog="python -m python123.cli serve", description="Push new 1-2-3 triangles to subscribers over HTTP (SSE)")
+    p.add_argument("--symbols", required=True, help="Comma-separated symbols")
+    p.add_argument("--timeframes", default="M15", help="Comma-separated timeframes")
+    p.add_argument("--source", default=os.getenv("DATA_SOURCE") or "mt5", help="Data source (mt5 and fake are polled; others are loaded once)")
+    p.add_argument("--data-dir", dest="data_dir", help="Directory of SYMBOL_TF.csv files for --source fake")
+    p.add_argument("--cache-dir", dest="cache_dir", help="Bar cache directory")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765, help="TCP port (0 picks a free one)")
+    p.add_argument("--unix", help="Also listen on this Unix socket path")
+    p.add_argument("--no-tcp", dest="no_tcp", action="store_true", help="Only listen on --unix")
+    p.add_argument("--poll", type=float, default=1.0, help="Seconds between polls of the data source")
+    p.add_argument("--queue-size", dest="queue_size", type=int, default=256, help="Frames buffered per subscriber before it is dropped")
+    p.add_argument("--bars", type=int, default=2000, help="History bars loaded and max bars to scan")
+    p.add_argument("--periods", default="610,377,233,144,89,55,34,8", help="Comma-separated depths")
+    p.add_argument("--dev", type=int, default=1, help="Deviation in points")
+    p.add_argument("--backstep", type=int, default=1)
+    p.add_argument("--big", type=int, default=7, help="Big level index (1-based)")
+    p.add_argument("--small", type=int, default=8, help="Small level index (1-based)")
+    p.add_argument("--maxdist", type=int, default=10000, help="Max distance between point1 and point2 (points)")
+    args = p.parse_args(argv)
+
+    if args.no_tcp and not args.unix:
+        p.error("--no-tcp needs --unix")
+    params = ScanParams(
+        periods=tuple(int(x) for x in args.periods.split(",") if x.strip()),
+        dev=args.dev,
+        backstep=args.backstep,
+        big=args.big,
+        small=args.small,
+        maxdist=args.maxdist,
+        bars=args.bars,
+        cache_dir=args.cache_dir,
+        data_dir=args.data_dir,
+    )
+    if len(params.periods) < max(params.big, params.small):
+        print("Error: not enough periods for selected levels", file=sys.stderr)
+        return 2
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    timeframes = [t.strip().upper() for t in args.timeframes.split(",") if t.strip()]
+    service = SignalService([(s, tf) for s in symbols for tf in timeframes], params, args.source, args.poll, args.queue_size)
+
+    async def run() -> None:
+        await service.start(args.host, None if args.no_tcp else args.port, args.unix)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, service.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+        for addr in service.addresses:
+            print(f"listening on {addr}", file=sys.stderr)
+        await service.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
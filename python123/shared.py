@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, Mapping, NamedTuple, Tuple
+import numpy as np
+
+# arrays start on cache-line boundaries inside the block
+_ALIGN = 64
+
+
+class SharedHandle(NamedTuple):
+    """Picklable reference to a SharedArrays block: its name and (array, dtype, shape, offset) entries."""
+
+    name: str
+    layout: Tuple[Tuple[str, str, Tuple[int, ...], int], ...]
+
+
+class SharedArrays:
+    """
+    Named numpy arrays laid out in one multiprocessing.shared_memory block.
+
+    The process that creates the block (`create`, `from_arrays`) owns it and unlinks it on
+    close. Pool workers receive the small `handle` instead of the arrays and `attach` to it,
+    so every process maps the same pages and nothing is pickled or copied per task.
+
+    Views returned by indexing must not outlive `close`; a view still held elsewhere keeps
+    its mapping alive until it is garbage collected, but the block name is released anyway.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, handle: SharedHandle, owner: bool):
+        self._shm = shm
+        self.handle = handle
+        self.owner = owner
+        self._arrays: Dict[str, np.ndarray] = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, dtype, shape, offset in handle.layout
+        }
+
+    @classmethod
+    def create(cls, spec: Mapping[str, Tuple[Tuple[int, ...], np.dtype]]) -> "SharedArrays":
+        """New zero-filled block holding one array per `spec` entry: name -> (shape, dtype)."""
+        layout = []
+        size = 0
+        for name, (shape, dtype) in spec.items():
+            dtype = np.dtype(dtype)
+            shape = (int(shape),) if np.isscalar(shape) else tuple(int(s) for s in shape)
+            size = -(-size // _ALIGN) * _ALIGN
+            layout.append((name, dtype.str, shape, size))
+            size += int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        return cls(shm, SharedHandle(shm.name, tuple(layout)), owner=True)
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "SharedArrays":
+        """New block holding copies of `arrays` (dtypes and shapes kept)."""
+        arrays = {name: np.asarray(a) for name, a in arrays.items()}
+        out = cls.create({name: (a.shape, a.dtype) for name, a in arrays.items()})
+        for name, a in arrays.items():
+            out[name][...] = a
+        return out
+
+    @classmethod
+    def attach(cls, handle: SharedHandle) -> "SharedArrays":
+        """Map an existing block in this process (e.g. a pool worker) without taking ownership."""
+        # pool workers share the parent's resource tracker, so attaching here does not take ownership
+        return cls(shared_memory.SharedMemory(name=handle.name), handle, owner=False)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._arrays
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._arrays)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self._arrays.values())
+
+    def close(self) -> None:
+        """Unmap the block; the owner also unlinks it."""
+        if self._shm is None:
+            return
+        self._arrays = {}
+        shm, self._shm = self._shm, None
+        try:
+            shm.close()
+        except BufferError:
+            pass  # a caller still holds a view; the mapping goes away with it
+        if self.owner:
+            shm.unlink()
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        arrays = ", ".join(f"{name}: {dtype}{list(shape)}" for name, dtype, shape, _ in self.handle.layout)
+        return f"SharedArrays({self.handle.name!r}, {{{arrays}}})"
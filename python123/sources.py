@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import importlib
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Union
+
+# loader(request, session=None) -> DataFrame with time, open, high, low, close, newest first
+Loader = Callable[..., "pd.DataFrame"]  # noqa: F821
+
+# name -> loader or "module:function"; dotted entries are imported on first use only
+_REGISTRY: Dict[str, Union[str, Loader]] = {
+    "csv": "python123.sources:load_csv_source",
+    "mt5": "python123.sources:load_mt5_source",
+    "cache": "python123.sources:load_cache_source",
+    "fake": "python123.sources:load_fake_source",
+}
+
+# sources whose loaders accept an open MT5Session to reuse
+SESSION_SOURCES = {"mt5", "fake"}
+
+
+@dataclass(frozen=True)
+class BarRequest:
+    """
+    What to load. `path` is the CSV file (csv) or data directory (fake, default env
+    FAKE_MT5_DATA); `cache_dir` routes csv/mt5/fake through a BarCache and is the cache to
+    read for the cache source.
+    """
+
+    symbol: Optional[str] = None
+    timeframe: str = "M15"
+    bars: int = 2000
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    path: Optional[str] = None
+    cache_dir: Optional[str] = None
+    float32: bool = False
+
+
+def register_source(name: str, loader: Union[str, Loader]) -> None:
+    """Add or replace a data source; `loader` may be a callable or a lazy "module:function"."""
+    _REGISTRY[name] = loader
+
+
+def available_sources() -> List[str]:
+    return sorted(_REGISTRY)
+
+
+def get_source(name: str) -> Loader:
+    """The loader registered as `name`, importing its module on first use."""
+    try:
+        entry = _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Unknown data source: {name} (available: {', '.join(available_sources())})") from None
+    if isinstance(entry, str):
+        module, _, attr = entry.partition(":")
+        entry = getattr(importlib.import_module(module), attr)
+        _REGISTRY[name] = entry
+    return entry
+
+
+def load_bars(source: str, request: BarRequest, session=None):
+    """OHLC DataFrame (time, open, high, low, close), newest bar at index 0 like MT4 buffers."""
+    loader = get_source(source)
+    if source in SESSION_SOURCES:
+        return loader(request, session=session)
+    return loader(request)
+
+
+def open_session(source: str, request: Optional[BarRequest] = None):
+    """An unopened MT5Session for a session source (MT5Session opens it on first use)."""
+    from .mt5_loader import MT5Session
+
+    if source == "fake":
+        return MT5Session(backend=_fake_backend(request))
+    return MT5Session()
+
+
+# --- built-in sources ---
+
+
+def load_csv_source(request: BarRequest):
+    import numpy as np
+    import pandas as pd
+
+    if not request.path:
+        raise ValueError("csv source needs a path")
+    if request.cache_dir:
+        from .bar_cache import BarCache, cached_csv_ohlc
+
+        df = cached_csv_ohlc(BarCache(request.cache_dir), request.path)
+        return _newest_first(_between(df, request.start_date, request.end_date))
+    from .csv_loader import read_ohlc_csv
+
+    # dates are applied while reading; only the requested range is parsed
+    cols = read_ohlc_csv(
+        request.path,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        price_dtype=np.float32 if request.float32 else np.float64,
+    )
+    return pd.DataFrame(cols, copy=False)
+
+
+def load_mt5_source(request: BarRequest, session=None):
+    if session is None:
+        with open_session("mt5", request) as s:
+            return _fetch_mt5(request, s)
+    return _fetch_mt5(request, session)
+
+
+def load_fake_source(request: BarRequest, session=None):
+    if session is None:
+        with open_session("fake", request) as s:
+            return _fetch_mt5(request, s)
+    return _fetch_mt5(request, session)
+
+
+def load_cache_source(request: BarRequest):
+    """Bars previously cached from MT5 for (symbol, timeframe); no terminal needed."""
+    from .bar_cache import BarCache
+
+    if not request.symbol:
+        raise ValueError("cache source needs a symbol")
+    df = BarCache(request.cache_dir).load("mt5", request.symbol, request.timeframe)
+    if len(df) == 0:
+        raise ValueError(f"no cached bars for {request.symbol} {request.timeframe}")
+    df = _between(df, request.start_date, request.end_date, epoch=True)
+    if request.start_date is None and request.end_date is None:
+        df = df.iloc[max(0, len(df) - request.bars) :]
+    return _newest_first(df)
+
+
+def _fetch_mt5(request: BarRequest, session):
+    if not request.symbol:
+        raise ValueError("mt5 source needs a symbol")
+    if request.cache_dir and request.start_date is None and request.end_date is None:
+        from .bar_cache import BarCache, cached_mt5_ohlc
+
+        df = cached_mt5_ohlc(BarCache(request.cache_dir), session, request.symbol, request.timeframe, request.bars)
+    else:
+        df = session.fetch(request.symbol, request.timeframe, request.bars, request.start_date, request.end_date)
+    return _newest_first(df)
+
+
+def _fake_backend(request: Optional[BarRequest]):
+    from .fake_mt5 import FakeMT5
+
+    return FakeMT5(request.path if request is not None and request.path else os.getenv("FAKE_MT5_DATA"))
+
+
+def _between(df, start: Optional[datetime], end: Optional[datetime], epoch: bool = False):
+    """Rows with start <= time <= end (inclusive); `epoch` when time holds epoch seconds."""
+    if start is None and end is None:
+        return df
+    import pandas as pd
+
+    t = pd.to_datetime(df["time"], unit="s") if epoch else df["time"]
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= t >= start
+    if end is not None:
+        mask &= t <= end
+    return df.loc[mask]
+
+
+def _newest_first(df):
+    return df.iloc[::-1].reset_index(drop=True)
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+
+from .triangle_set import TriangleSet, _time_value
+
+# Triangles are keyed by bar open times (epoch seconds, UTC) rather than MT4 indices, which
+# shift with every new bar. A series is one (symbol, timeframe, params) combination, so each
+# triangle row carries a small integer instead of repeating the three strings.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS params (
+    key TEXT PRIMARY KEY,
+    json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    params TEXT NOT NULL,
+    UNIQUE (symbol, timeframe, params)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    series INTEGER NOT NULL,
+    created INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_series ON runs (series);
+CREATE TABLE IF NOT EXISTS triangles (
+    series INTEGER NOT NULL,
+    time1 INTEGER NOT NULL,
+    dir INTEGER NOT NULL,
+    price1 REAL NOT NULL,
+    time2 INTEGER NOT NULL,
+    price2 REAL NOT NULL,
+    time3 INTEGER NOT NULL,
+    price3 REAL NOT NULL,
+    first_run INTEGER NOT NULL,
+    last_run INTEGER NOT NULL,
+    PRIMARY KEY (series, time1, dir)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS triangles_time ON triangles (time1);
+CREATE INDEX IF NOT EXISTS triangles_last_run ON triangles (last_run);
+"""
+
+# fields of ScanParams that change which triangles are found or what their prices mean
+PARAM_FIELDS = ("periods", "dev", "backstep", "big", "small", "maxdist", "points", "point")
+
+COLUMNS = ("symbol", "timeframe", "params", "time1", "dir", "price1", "time2", "price2", "time3", "price3", "first_run", "last_run")
+_ROW_COLUMNS = ("series", "time1", "dir", "price1", "time2", "price2", "time3", "price3", "first_run", "last_run")
+RECORD_DTYPE = np.dtype(
+    [(name, np.float64 if name.startswith("price") else np.int8 if name == "dir" else np.int64) for name in _ROW_COLUMNS]
+)
+_FETCH_ROWS = 100_000
+
+
+def params_key(params) -> str:
+    """Short stable hash of the detection settings of a ScanParams (see PARAM_FIELDS)."""
+    return hashlib.blake2b(_params_json(params).encode(), digest_size=8).hexdigest()
+
+
+def _params_json(params) -> str:
+    values = {name: getattr(params, name) for name in PARAM_FIELDS}
+    values["periods"] = list(values["periods"])
+    return json.dumps(values, sort_keys=True)
+
+
+@dataclass
+class UpsertResult:
+    """Outcome of one TriangleStore.upsert; `new`/`changed` are masks over the input triangles."""
+
+    run: int
+    new: np.ndarray
+    changed: np.ndarray
+
+    @property
+    def written(self) -> np.ndarray:
+        return self.new | self.changed
+
+
+class TriangleStore:
+    """
+    SQLite store of detected triangles, one row per (symbol, timeframe, params, time1, dir).
+
+    - upsert writes a scan's triangles in one transaction, inserting new keys and updating
+      only rows whose later points or prices changed (a repainted point 2/3); unchanged
+      rows are not touched, so re-running over the same history is idempotent
+    - every upsert is a run; rows remember the run that first saw and last changed them,
+      so "new since the last run" is a lookup on an index
+    - query filters by symbol, timeframe, params, time1 range, direction and run, using
+      the primary key for per-series ranges and an index on time1 across series
+
+    The database uses WAL journaling, so readers are not blocked by a writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "TriangleStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def upsert(self, symbol: str, timeframe: str, params, tris: TriangleSet) -> UpsertResult:
+        """
+        Store the triangles of one scan of (symbol, timeframe) with ScanParams `params`.
+        `tris` needs bar times (detect_123_triangle_set(..., times=...)).
+        """
+        if len(tris) and not tris.has_times:
+            raise ValueError("triangles need bar times to be stored (pass times= when detecting them)")
+        rows = _rows(tris)
+        n = len(rows)
+        new = np.zeros(n, dtype=bool)
+        changed = np.zeros(n, dtype=bool)
+        with self.conn:
+            series = self._series(symbol, timeframe, params)
+            run = self.conn.execute("INSERT INTO runs (series, created) VALUES (?, ?)", (series, int(time.time()))).lastrowid
+            if not n:
+                return UpsertResult(run, new, changed)
+            # one range scan on the primary key instead of a lookup per triangle
+            existing = {
+                (t1, d): rest
+                for t1, d, *rest in self.conn.execute(
+                    "SELECT time1, dir, price1, time2, price2, time3, price3 FROM triangles"
+                    " WHERE series = ? AND time1 BETWEEN ? AND ?",
+                    (series, min(r[0] for r in rows), max(r[0] for r in rows)),
+                )
+            }
+            inserts = []
+            updates = []
+            for i, (t1, d, p1, t2, p2, t3, p3) in enumerate(rows):
+                old = existing.get((t1, d))
+                if old is None:
+                    new[i] = True
+                    inserts.append((series, t1, d, p1, t2, p2, t3, p3, run, run))
+                elif old != [p1, t2, p2, t3, p3]:
+                    changed[i] = True
+                    updates.append((p1, t2, p2, t3, p3, run, series, t1, d))
+            self.conn.executemany(
+                f"INSERT INTO triangles ({', '.join(_ROW_COLUMNS)}) VALUES ({', '.join('?' * len(_ROW_COLUMNS))})", inserts
+            )
+            self.conn.executemany(
+                "UPDATE triangles SET price1 = ?, time2 = ?, price2 = ?, time3 = ?, price3 = ?, last_run = ?"
+                " WHERE series = ? AND time1 = ? AND dir = ?",
+                updates,
+            )
+        return UpsertResult(run, new, changed)
+
+    def _series(self, symbol: str, timeframe: str, params) -> int:
+        key = params_key(params)
+        self.conn.execute("INSERT OR IGNORE INTO params (key, json) VALUES (?, ?)", (key, _params_json(params)))
+        self.conn.execute("INSERT OR IGNORE INTO series (symbol, timeframe, params) VALUES (?, ?, ?)", (symbol, timeframe, key))
+        return self.conn.execute(
+            "SELECT id FROM series WHERE symbol = ? AND timeframe = ? AND params = ?", (symbol, timeframe, key)
+        ).fetchone()[0]
+
+    def last_run(self, symbol: str, timeframe: str, params) -> Optional[int]:
+        """Id of the latest run of (symbol, timeframe, params), or None."""
+        row = self.conn.execute(
+            "SELECT MAX(runs.id) FROM runs JOIN series ON series.id = runs.series"
+            " WHERE symbol = ? AND timeframe = ? AND params = ?",
+            (symbol, timeframe, params_key(params)),
+        ).fetchone()
+        return row[0]
+
+    def records(
+        self,
+        symbol: Optional[str] = None,
+        timeframe: Optional[str] = None,
+        params=None,
+        start=None,
+        end=None,
+        dir: Optional[str] = None,
+        since_run: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Stored triangles as a RECORD_DTYPE array (series ids, epoch-second times), oldest
+        time1 first.
+
+        - start/end: inclusive time1 bounds (datetime-like or epoch seconds)
+        - params: a ScanParams or a params_key string
+        - dir: "buy" or "sell"
+        - since_run: only rows inserted or changed after that run id
+        - limit: at most this many rows, the oldest ones
+        """
+        where, args = self._filters(symbol, timeframe, params, start, end, dir, since_run)
+        sql = f"SELECT {', '.join(_ROW_COLUMNS)} FROM triangles{where}"
+        if limit is not None:
+            sql += f" ORDER BY time1, dir LIMIT {int(limit)}"
+        cur = self.conn.execute(sql, args)
+        # fetched in chunks straight into arrays, so a large result never exists as Python tuples all at once
+        parts = []
+        while True:
+            chunk = cur.fetchmany(_FETCH_ROWS)
+            if not chunk:
+                break
+            parts.append(np.array(chunk, dtype=RECORD_DTYPE))
+        out = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD_DTYPE)
+        # sorting here is cheaper than walking the time index and looking up every row
+        return out[np.lexsort((out["dir"], out["time1"]))]
+
+    def query(self, **filters):
+        """records() as a DataFrame with COLUMNS: series names, "buy"/"sell" and UTC datetimes."""
+        import pandas as pd
+
+        rec = self.records(**filters)
+        ids, inverse = np.unique(rec["series"], return_inverse=True)
+        names = self._series_names()
+        df = pd.DataFrame({
+            name: np.array([names[i][k] for i in ids.tolist()], dtype=object)[inverse]
+            for k, name in enumerate(("symbol", "timeframe", "params"))
+        })
+        for name in COLUMNS[3:]:
+            col = rec[name]
+            if name.startswith("time"):
+                col = pd.to_datetime(col, unit="s", utc=True)
+            elif name == "dir":
+                col = np.where(col > 0, "buy", "sell")
+            df[name] = col
+        return df
+
+    def _series_names(self) -> dict:
+        """series id -> [symbol, timeframe, params]; one row per series, so it is read whole."""
+        return {i: names for i, *names in self.conn.execute("SELECT id, symbol, timeframe, params FROM series")}
+
+    def count(self, **filters) -> int:
+        """Number of stored triangles matching the query filters."""
+        where, args = self._filters(**filters)
+        return self.conn.execute(f"SELECT COUNT(*) FROM triangles{where}", args).fetchone()[0]
+
+    def _filters(self, symbol=None, timeframe=None, params=None, start=None, end=None, dir=None, since_run=None) -> Tuple[str, list]:
+        clauses = []
+        args: list = []
+        series = []
+        for column, value in (("symbol", symbol), ("timeframe", timeframe)):
+            if value is not None:
+                series.append(f"{column} = ?")
+                args.append(value)
+        if params is not None:
+            series.append("params = ?")
+            args.append(params if isinstance(params, str) else params_key(params))
+        if series:
+            # resolved to ids first, then probed on the primary key
+            clauses.append(f"series IN (SELECT id FROM series WHERE {' AND '.join(series)})")
+        if start is not None:
+            clauses.append("time1 >= ?")
+            args.append(_time_value(start) // 1_000_000_000)
+        if end is not None:
+            clauses.append("time1 <= ?")
+            args.append(_time_value(end) // 1_000_000_000)
+        if dir is not None:
+            clauses.append("dir = ?")
+            args.append(1 if dir == "buy" else -1)
+        if since_run is not None:
+            clauses.append("last_run > ?")
+            args.append(int(since_run))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+
+def _rows(tris: TriangleSet) -> list:
+    """(time1, dir, price1, time2, price2, time3, price3) tuples, times in epoch seconds."""
+    if not len(tris):
+        return []
+    cols = [
+        tris["time1"] // 1_000_000_000,
+        tris["dir"].astype(np.int64),
+        tris["price1"],
+        tris["time2"] // 1_000_000_000,
+        tris["price2"],
+        tris["time3"] // 1_000_000_000,
+        tris["price3"],
+    ]
+    return list(zip(*(c.tolist() for c in cols)))
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+
+class _Pending:
+    """A closed bar whose candidate pivots can still be cleared by a newer bar's backstep."""
+
+    __slots__ = ("t", "low", "high", "low_ok", "high_ok")
+
+    def __init__(self, t: int, low: float, high: float, low_ok: bool, high_ok: bool):
+        self.t = t
+        self.low = low
+        self.high = high
+        self.low_ok = low_ok
+        self.high_ok = high_ok
+
+
+class ZigZagStream:
+    """
+    Incremental CountZZ for live bars; after every call `buffers()` equals
+    compute_zigzag_buffers() over the full history.
+
+    Internally bars are kept oldest first (time index t). In that order every CountZZ pass is
+    causal: a bar's window extremum only looks back `depth` bars, a candidate is only cleared
+    by candidates at most `backstep` bars newer, and the cutting pass walks old to new. So a
+    bar is committed once `backstep` newer bars have closed, and each call only recomputes
+    the still-repainting tail (like `IndicatorCounted()` in the mq4), which is O(backstep).
+
+    - append(high, low): a bar has closed (replaces the forming bar, if any).
+    - update(high, low): the forming bar has new high/low; it is shown as bar 0 until appended.
+    """
+
+    def __init__(self, depth: int, deviation_points: int, backstep: int, capacity: int = 1024):
+        if depth < 1:
+            raise ValueError("depth must be >= 1")
+        self.depth = depth
+        self.deviation_points = deviation_points
+        self.backstep = backstep
+
+        self._closed = 0
+        self._forming: Optional[Tuple[float, float]] = None
+        self._low = np.zeros(max(capacity, 1), dtype=float)
+        self._high = np.zeros(max(capacity, 1), dtype=float)
+
+        # monotonic deques of (t, price) over closed bars
+        self._low_dq: Deque[Tuple[int, float]] = deque()
+        self._high_dq: Deque[Tuple[int, float]] = deque()
+        self._last_win_low = -1.0
+        self._last_win_high = -1.0
+        self._pending: Deque[_Pending] = deque()
+
+        # cutting pass state over committed bars: last_high, last_high_pos, last_low, last_low_pos
+        self._cut_state = (-1.0, -1, -1.0, -1)
+        # (buffer name, t, committed value) overwritten by the provisional tail
+        self._undo: List[Tuple[str, int, float]] = []
+        # value each cell written during the current call had before it; the tail is undone and
+        # rewritten on every call, so only cells that end up different count as changed
+        self._before: Dict[Tuple[str, int], float] = {}
+        # oldest t whose buffers may have changed since the last pop_changed()
+        self._dirty: Optional[int] = None
+
+    def __len__(self) -> int:
+        return self._closed + (self._forming is not None)
+
+    def append(self, high: float, low: float) -> None:
+        """Add a closed bar."""
+        high = float(high)
+        low = float(low)
+        self._restore()
+        self._forming = None
+        t = self._closed
+        self._reserve(t + 1)
+        self._touch(t)
+
+        win_low = self._push(self._low_dq, t, low, is_low=True)
+        win_high = self._push(self._high_dq, t, high, is_low=False)
+        if t >= self.depth - 1:
+            entry = self._candidate(t, high, low, win_low, win_high)
+            self._clear_backstep(self._pending, entry)
+            self._pending.append(entry)
+        self._last_win_low = win_low
+        self._last_win_high = win_high
+        self._closed += 1
+
+        # bars with `backstep` closed successors can no longer be cleared
+        while self._pending and self._pending[0].t + self.backstep <= self._closed - 1:
+            entry = self._pending.popleft()
+            self._write("_low", entry.t, entry.low)
+            self._write("_high", entry.t, entry.high)
+            self._cut_state = self._cut(self._cut_state, entry.t, entry.low, entry.high, self._write)
+        self._provisional()
+        self._settle()
+
+    def update(self, high: float, low: float) -> None:
+        """Set the forming (not yet closed) bar."""
+        self._restore()
+        self._forming = (float(high), float(low))
+        self._reserve(self._closed + 1)
+        self._touch(self._closed)
+        self._provisional()
+        self._settle()
+
+    def buffers(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (low_buffer, high_buffer) in MT4 orientation (index 0 = newest bar).
+
+        These are views into the stream's storage, valid until the next update/append.
+        """
+        n = len(self)
+        return self._low[:n][::-1], self._high[:n][::-1]
+
+    def pop_changed(self) -> int:
+        """
+        MT4 index of the oldest bar whose buffers may have changed since the previous call
+        (-1 if nothing changed), then reset. Every index below it may have changed too.
+        """
+        dirty = self._dirty
+        self._dirty = None
+        if dirty is None:
+            return -1
+        return len(self) - 1 - dirty
+
+    # --- internals ---
+
+    def _reserve(self, size: int) -> None:
+        cap = self._low.shape[0]
+        if size <= cap:
+            return
+        while cap < size:
+            cap *= 2
+        for name in ("_low", "_high"):
+            grown = np.zeros(cap, dtype=float)
+            old = getattr(self, name)
+            grown[: old.shape[0]] = old
+            setattr(self, name, grown)
+
+    def _push(self, dq: Deque[Tuple[int, float]], t: int, price: float, is_low: bool) -> float:
+        if is_low:
+            while dq and dq[-1][1] >= price:
+                dq.pop()
+        else:
+            while dq and dq[-1][1] <= price:
+                dq.pop()
+        dq.append((t, price))
+        while dq[0][0] <= t - self.depth:
+            dq.popleft()
+        return dq[0][1]
+
+    def _peek(self, dq: Deque[Tuple[int, float]], t: int, price: float, is_low: bool) -> float:
+        # window extremum at t for a bar that is not pushed; only dq[0] can have expired
+        best = None
+        for i in range(min(2, len(dq))):
+            if dq[i][0] > t - self.depth:
+                best = dq[i][1]
+                break
+        if best is None:
+            return price
+        return min(best, price) if is_low else max(best, price)
+
+    def _candidate(self, t: int, high: float, low: float, win_low: float, win_high: float) -> _Pending:
+        first = t == self.depth - 1
+        prev_low = -1.0 if first else self._last_win_low
+        prev_high = -1.0 if first else self._last_win_high
+        low_ok = win_low != prev_low and not (low - win_low) > self.deviation_points
+        high_ok = win_high != prev_high and not (win_high - high) > self.deviation_points
+        return _Pending(t, win_low if low_ok else 0.0, win_high if high_ok else 0.0, low_ok, high_ok)
+
+    def _clear_backstep(self, older: Iterable[_Pending], entry: _Pending) -> None:
+        for prev in older:
+            if entry.t - prev.t > self.backstep:
+                continue
+            if entry.low_ok and prev.low != 0.0 and prev.low > entry.low:
+                prev.low = 0.0
+            if entry.high_ok and prev.high != 0.0 and prev.high < entry.high:
+                prev.high = 0.0
+
+    @staticmethod
+    def _cut(state, t: int, curlow: float, curhigh: float, write: Callable[..., None]):
+        last_high, last_high_pos, last_low, last_low_pos = state
+        if curhigh != 0.0:
+            if last_high > 0:
+                if last_high < curhigh:
+                    write("_high", last_high_pos)
+                else:
+                    write("_high", t)
+            if last_high < curhigh or last_high < 0:
+                last_high = curhigh
+                last_high_pos = t
+            last_low = -1.0
+        if curlow != 0.0:
+            if last_low > 0:
+                if last_low > curlow:
+                    write("_low", last_low_pos)
+                else:
+                    write("_low", t)
+            if curlow < last_low or last_low < 0:
+                last_low = curlow
+                last_low_pos = t
+            last_high = -1.0
+        return last_high, last_high_pos, last_low, last_low_pos
+
+    def _touch(self, t: int) -> None:
+        if self._dirty is None or t < self._dirty:
+            self._dirty = t
+
+    def _note(self, name: str, t: int) -> np.ndarray:
+        arr = getattr(self, name)
+        self._before.setdefault((name, t), arr[t])
+        return arr
+
+    def _write(self, name: str, t: int, value: float = 0.0) -> None:
+        self._note(name, t)[t] = value
+
+    def _write_provisional(self, name: str, t: int, value: float = 0.0) -> None:
+        arr = self._note(name, t)
+        self._undo.append((name, t, arr[t]))
+        arr[t] = value
+
+    def _restore(self) -> None:
+        for name, t, value in reversed(self._undo):
+            self._note(name, t)[t] = value
+        self._undo.clear()
+
+    def _settle(self) -> None:
+        """Mark the cells whose value this call actually changed."""
+        for (name, t), value in self._before.items():
+            if getattr(self, name)[t] != value:
+                self._touch(t)
+        self._before.clear()
+
+    def _provisional(self) -> None:
+        n = len(self)
+        if n == 0:
+            return
+        write = self._write_provisional
+
+        if n < self.depth:
+            # short history: CountZZ scans only bar 0 with a window spanning every bar
+            if self._forming is not None:
+                high = self._forming[0]
+                win_high = self._peek(self._high_dq, n - 1, high, is_low=False)
+            else:
+                high = self._high_dq[-1][1]
+                win_high = self._high_dq[0][1]
+            if win_high != -1.0 and not (win_high - high) > self.deviation_points:
+                write("_high", n - 1, win_high)
+            return
+
+        tail = [_Pending(p.t, p.low, p.high, p.low_ok, p.high_ok) for p in self._pending]
+        if self._forming is not None:
+            t = self._closed
+            high, low = self._forming
+            win_low = self._peek(self._low_dq, t, low, is_low=True)
+            win_high = self._peek(self._high_dq, t, high, is_low=False)
+            entry = self._candidate(t, high, low, win_low, win_high)
+            self._clear_backstep(tail, entry)
+            tail.append(entry)
+
+        state = self._cut_state
+        for entry in tail:
+            write("_low", entry.t, entry.low)
+            write("_high", entry.t, entry.high)
+            state = self._cut(state, entry.t, entry.low, entry.high, write)
+
+        # tail alignment: the oldest scanned bar never keeps a low
+        if self._low[self.depth - 1] != 0.0:
+            write("_low", self.depth - 1)
+
+
+class SemaforStream:
+    """
+    Incremental compute_semafor_levels: one ZigZagStream per period, fed the same bars.
+    """
+
+    def __init__(self, periods: List[int], deviation_points: int, backstep: int, capacity: int = 1024):
+        self.periods = list(periods)
+        self.streams = [ZigZagStream(d, deviation_points, backstep, capacity) for d in self.periods]
+
+    def __len__(self) -> int:
+        return len(self.streams[0]) if self.streams else 0
+
+    def append(self, high: float, low: float) -> None:
+        """Add a closed bar to every level."""
+        for s in self.streams:
+            s.append(high, low)
+
+    def update(self, high: float, low: float) -> None:
+        """Set the forming bar on every level."""
+        for s in self.streams:
+            s.update(high, low)
+
+    def levels(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """{level: (low_buffer, high_buffer)} like compute_semafor_levels; views, see ZigZagStream.buffers."""
+        return {i: s.buffers() for i, s in enumerate(self.streams, start=1)}
+
+    def pop_changed(self, levels: Optional[Iterable[int]] = None) -> int:
+        """
+        Oldest changed MT4 index over `levels` (default: all) since their previous pop, see
+        ZigZagStream.pop_changed.
+        """
+        if levels is None:
+            levels = range(1, len(self.streams) + 1)
+        return max((self.streams[i - 1].pop_changed() for i in set(levels)), default=-1)
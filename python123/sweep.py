@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import itertools
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+from .pivots import PivotSet, SideArrays, dense_to_side
+from .shared import SharedArrays, SharedHandle
+from .triangle_set import detect_123_triangle_set
+from .zigzag import compute_zigzag_buffers
+
+GRID_KEYS = ("periods", "dev", "backstep", "big", "small", "maxdist")
+
+
+def series_key(highs: np.ndarray, lows: np.ndarray) -> str:
+    """Content hash of a (highs, lows) series; equal data gives equal keys across processes."""
+    h = hashlib.blake2b(digest_size=16)
+    for a in (highs, lows):
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(np.int64(a.shape[0]).tobytes())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+class ZigZagCache:
+    """
+    LRU of compute_zigzag_buffers results keyed by (series hash, depth, dev, backstep).
+
+    Buffers are stored sparse (pivot positions and prices), so a cached level costs memory
+    proportional to its pivot count rather than to the series length.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[tuple, Tuple[SideArrays, SideArrays]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(
+        self,
+        key: str,
+        highs: np.ndarray,
+        lows: np.ndarray,
+        depth: int,
+        deviation_points: int,
+        backstep: int,
+    ) -> Tuple[SideArrays, SideArrays]:
+        """(lows, highs) pivot sides for one zigzag level of the series identified by `key`."""
+        k = (key, depth, deviation_points, backstep)
+        item = self._items.get(k)
+        if item is not None:
+            self.hits += 1
+            self._items.move_to_end(k)
+            return item
+        self.misses += 1
+        low_buf, high_buf = compute_zigzag_buffers(highs, lows, depth, deviation_points, backstep)
+        item = (dense_to_side(low_buf), dense_to_side(high_buf))
+        self._items[k] = item
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return item
+
+
+def expand_grid(grid: Dict[str, Sequence]) -> List[dict]:
+    """Cartesian product of the grid; missing keys take the CLI defaults."""
+    defaults = {
+        "periods": [(610, 377, 233, 144, 89, 55, 34, 8)],
+        "dev": [1],
+        "backstep": [1],
+        "big": [7],
+        "small": [8],
+        "maxdist": [10000],
+    }
+    unknown = set(grid) - set(GRID_KEYS)
+    if unknown:
+        raise ValueError(f"unknown sweep parameters: {sorted(unknown)}")
+    axes = [[tuple(v) if k == "periods" else v for v in grid.get(k, defaults[k])] for k in GRID_KEYS]
+    combos = [dict(zip(GRID_KEYS, values)) for values in itertools.product(*axes)]
+    for c in combos:
+        if len(c["periods"]) < max(c["big"], c["small"]):
+            raise ValueError(f"not enough periods for levels big={c['big']} small={c['small']}: {c['periods']}")
+    return combos
+
+
+def evaluate(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    combo: dict,
+    max_bars_scan: int,
+    cache: ZigZagCache,
+    key: Optional[str] = None,
+) -> dict:
+    """
+    Triangle metrics for one parameter combination. Only the big and small levels are
+    computed (through `cache`); the other periods do not affect the detector.
+    """
+    key = key or series_key(highs, lows)
+    lows_sparse: Dict[int, SideArrays] = {}
+    highs_sparse: Dict[int, SideArrays] = {}
+    for level in {combo["big"], combo["small"]}:
+        depth = combo["periods"][level - 1]
+        lows_sparse[level], highs_sparse[level] = cache.get(key, highs, lows, depth, combo["dev"], combo["backstep"])
+    pivots = PivotSet(highs.shape[0], lows_sparse, highs_sparse)
+    tris = detect_123_triangle_set(pivots, combo["big"], combo["small"], combo["maxdist"], max_bars_scan)
+    dist = tris.distance
+    buys = int((tris["dir"] > 0).sum())
+    return {
+        **combo,
+        "periods": ",".join(str(p) for p in combo["periods"]),
+        "triangles": len(tris),
+        "buys": buys,
+        "sells": len(tris) - buys,
+        "mean_distance": float(dist.mean()) if dist.size else np.nan,
+        "max_distance": float(dist.max()) if dist.size else np.nan,
+        "mean_span": float((tris["bar1"] - tris["bar3"]).mean()) if dist.size else np.nan,
+    }
+
+
+def sweep(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    grid: Dict[str, Sequence],
+    max_bars_scan: int = 2000,
+    workers: Optional[int] = None,
+    cache_size: int = 256,
+) -> pd.DataFrame:
+    """
+    Evaluate every combination of `grid` (keys from GRID_KEYS, values are lists; periods is
+    a list of period tuples) on one MT4-oriented series and return one row per combination.
+
+    Combinations are ordered so that ones sharing (dev, backstep, depths) land on the same
+    worker, where a ZigZagCache reuses their buffers. With workers > 1 the series is placed
+    in shared memory once and every worker maps it instead of receiving a copy per task.
+    """
+    highs = np.ascontiguousarray(highs, dtype=np.float64)
+    lows = np.ascontiguousarray(lows, dtype=np.float64)
+    combos = expand_grid(grid)
+    key = series_key(highs, lows)
+    workers = min(workers or os.cpu_count() or 1, len(combos))
+
+    if workers <= 1:
+        cache = ZigZagCache(cache_size)
+        rows = [evaluate(highs, lows, c, max_bars_scan, cache, key) for c in combos]
+        return pd.DataFrame(rows)
+
+    order = sorted(range(len(combos)), key=lambda i: _locality(combos[i]))
+    chunks = _split(order, workers * 4)
+    with SharedArrays.from_arrays({"highs": highs, "lows": lows}) as shared:
+        rows: List[Optional[dict]] = [None] * len(combos)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shared.handle, key, cache_size),
+        ) as pool:
+            futures = [pool.submit(_worker_chunk, [combos[i] for i in chunk], max_bars_scan) for chunk in chunks]
+            for chunk, fut in zip(chunks, futures):
+                for i, row in zip(chunk, fut.result()):
+                    rows[i] = row
+    return pd.DataFrame(rows)
+
+
+def _locality(combo: dict) -> tuple:
+    big = combo["periods"][combo["big"] - 1]
+    small = combo["periods"][combo["small"] - 1]
+    return (combo["dev"], combo["backstep"], big, small)
+
+
+def _split(order: List[int], parts: int) -> List[List[int]]:
+    """Contiguous chunks, so neighbouring (cache-sharing) combinations stay together."""
+    size = max(1, -(-len(order) // parts))
+    return [order[i : i + size] for i in range(0, len(order), size)]
+
+
+# per-process state for pool workers
+_worker: dict = {}
+
+
+def _init_worker(handle: SharedHandle, key: str, cache_size: int) -> None:
+    shared = SharedArrays.attach(handle)
+    _worker.update(shared=shared, highs=shared["highs"], lows=shared["lows"], key=key, cache=ZigZagCache(cache_size))
+
+
+def _worker_chunk(combos: List[dict], max_bars_scan: int) -> List[dict]:
+    w = _worker
+    return [evaluate(w["highs"], w["lows"], c, max_bars_scan, w["cache"], w["key"]) for c in combos]
+
+
+def _int_list(s: str) -> List[int]:
+    return [int(x) for x in str(s).split(",") if x.strip()]
+
+
+def main(argv=None) -> int:
+    """`python -m python123.cli sweep ...`: run a parameter grid over one CSV or MT5 series."""
+    from .sources import BarRequest, available_sources, load_bars
+
+    p = argparse.ArgumentParser(prog="python -m python123.cli sweep", description="Sweep semafor/triangle parameters over one series")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", help="Path to CSV with columns time,open,high,low,close")
+    src.add_argument("--mt5", action="store_true", help="Use MetaTrader5 terminal as data source")
+    src.add_argument("--source", help=f"Data source by name ({', '.join(available_sources())})")
+    p.add_argument("--symbol", help="Symbol for MT5 source, e.g., EURUSD")
+    p.add_argument("--data-dir", dest="data_dir", help="Directory of SYMBOL_TF.csv files for --source fake")
+    p.add_argument("--timeframe", default="M15", help="MT5 timeframe, e.g., M15,H1,D1")
+    p.add_argument("--bars", type=int, default=2000, help="Bars to load and max bars to scan")
+    p.add_argument("--start-date", dest="start_date", help="Start datetime (YYYY-MM-DD[ HH:MM[:SS]])")
+    p.add_argument("--end-date", dest="end_date", help="End datetime (YYYY-MM-DD[ HH:MM[:SS]])")
+    p.add_argument("--cache-dir", dest="cache_dir", help="Bar cache directory (see the main CLI)")
+    p.add_argument("--periods", action="append", help="Comma-separated depths; repeat the option for more period sets")
+    p.add_argument("--dev", default="1", help="Comma-separated deviations in points")
+    p.add_argument("--backstep", default="1", help="Comma-separated backsteps")
+    p.add_argument("--big", default="7", help="Comma-separated big level indexes")
+    p.add_argument("--small", default="8", help="Comma-separated small level indexes")
+    p.add_argument("--maxdist", default="10000", help="Comma-separated max point1-point2 distances (points)")
+    p.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    p.add_argument("--cache-size", dest="cache_size", type=int, default=256, help="Zigzag levels kept per worker")
+    p.add_argument("--out", help="Write the result table to this CSV instead of printing it")
+    args = p.parse_args(argv)
+
+    if args.mt5 and not args.symbol:
+        p.error("--symbol is required with --mt5")
+    grid = {
+        "periods": [tuple(_int_list(s)) for s in (args.periods or ["610,377,233,144,89,55,34,8"])],
+        "dev": _int_list(args.dev),
+        "backstep": _int_list(args.backstep),
+        "big": _int_list(args.big),
+        "small": _int_list(args.small),
+        "maxdist": _int_list(args.maxdist),
+    }
+    start = pd.to_datetime(args.start_date).to_pydatetime() if args.start_date else None
+    end = pd.to_datetime(args.end_date).to_pydatetime() if args.end_date else None
+    source = "csv" if args.csv else "mt5" if args.mt5 else args.source
+    request = BarRequest(
+        symbol=args.symbol,
+        timeframe=args.timeframe.upper(),
+        bars=args.bars,
+        start_date=start,
+        end_date=end,
+        path=args.csv or args.data_dir,
+        cache_dir=args.cache_dir,
+    )
+    try:
+        df = load_bars(source, request)
+        table = sweep(
+            df["high"].to_numpy(dtype=float),
+            df["low"].to_numpy(dtype=float),
+            grid,
+            max_bars_scan=args.bars,
+            workers=args.workers,
+            cache_size=args.cache_size,
+        )
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+
+    if args.out:
+        table.to_csv(args.out, index=False)
+    else:
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(table.to_string(index=False))
+    return 0
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+
+def generate_arrays(
+    n: int,
+    seed: int = 0,
+    s0: float = 100.0,
+    mu: float = 0.0,
+    sigma: float = 0.002,
+    wick: float = 0.001,
+    gap: float = 0.0005,
+) -> Dict[str, np.ndarray]:
+    """
+    Seeded geometric-Brownian-motion bars, oldest first: {"open", "high", "low", "close"}.
+
+    - sigma: per-bar log-return volatility of the close; mu: per-bar drift.
+    - gap: volatility of the open around the previous close.
+    - wick: scale of the high/low excursions beyond max/min(open, close).
+    The same (n, seed, parameters) always gives the same bars, on any platform.
+    """
+    rng = np.random.default_rng(seed)
+    close = s0 * np.exp(np.cumsum(rng.normal(mu, sigma, n)))
+    prev = np.empty(n)
+    prev[0] = s0
+    prev[1:] = close[:-1]
+    open_ = prev * np.exp(rng.normal(0.0, gap, n))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0.0, wick, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0.0, wick, n)))
+    return {"open": open_, "high": high, "low": low, "close": close}
+
+
+def generate_ohlc(
+    n: int,
+    seed: int = 0,
+    start: str = "2024-01-01",
+    freq: str = "h",
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    generate_arrays as a time, open, high, low, close DataFrame (oldest first), the layout of
+    TradingBot/sample_data.csv and of fetch_ohlc. Extra keyword arguments go to generate_arrays.
+    """
+    cols = generate_arrays(n, seed, **kwargs)
+    df = pd.DataFrame(cols, copy=False)
+    df.insert(0, "time", pd.date_range(start, periods=n, freq=freq))
+    return df
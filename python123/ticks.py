@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from .stream import SemaforStream
+from .triangles import IncrementalTriangleDetector, TriangleEvents
+from .triangle_set import TriangleSet
+
+# bar length of the timeframes built from ticks; buckets are aligned to the epoch (UTC midnight)
+TIMEFRAME_SECONDS = {
+    "M1": 60,
+    "M5": 300,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H4": 14400,
+    "D1": 86400,
+}
+
+BAR_COLUMNS = ("time", "open", "high", "low", "close", "tick_volume")
+
+# a chunk of ticks: (epoch seconds int64, price float64), oldest first
+TickChunk = Tuple[np.ndarray, np.ndarray]
+# bars as columns (BAR_COLUMNS), oldest first; time is the bar open in epoch seconds
+Bars = Dict[str, np.ndarray]
+
+
+def empty_bars() -> Bars:
+    return {name: np.zeros(0, dtype=np.int64 if name in ("time", "tick_volume") else np.float64) for name in BAR_COLUMNS}
+
+
+class BarAggregator:
+    """
+    Streaming tick -> OHLC aggregation for several timeframes in one pass.
+
+    Ticks build the smallest requested timeframe; every larger one is built from the finished
+    bars of the next smaller one (all of TIMEFRAME_SECONDS divide each other), never from the
+    ticks again. Each timeframe keeps only its forming bar between calls, so memory is bounded
+    by the chunk size. Like MT5, a bar is finished when data for a later bar arrives, and
+    periods without ticks produce no bar. Ticks must arrive in time order.
+
+        agg = BarAggregator(["M1", "M15", "H1"])
+        for times, prices in iter_tick_file("EURUSD_ticks.csv"):
+            for tf, bars in agg.add_ticks(times, prices).items():
+                ...  # finished bars of tf, oldest first
+        last = agg.flush()  # close the forming bars at the end of the data
+    """
+
+    def __init__(self, timeframes: Iterable[str]):
+        names = {tf.upper() for tf in timeframes}
+        unknown = names - set(TIMEFRAME_SECONDS)
+        if unknown or not names:
+            raise ValueError(f"Unsupported tick timeframes: {sorted(unknown) or 'none'} (use {', '.join(TIMEFRAME_SECONDS)})")
+        self.timeframes: List[str] = sorted(names, key=TIMEFRAME_SECONDS.get)
+        self._forming: Dict[str, Optional[Tuple[int, float, float, float, float, int]]] = {tf: None for tf in self.timeframes}
+
+    def add_ticks(self, times: np.ndarray, prices: np.ndarray) -> Dict[str, Bars]:
+        """Bars finished by these ticks, per timeframe (timeframes with none are included, empty)."""
+        times = np.asarray(times, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        ones = np.ones(times.shape[0], dtype=np.int64)
+        return self._cascade((times, prices, prices, prices, prices, ones))
+
+    def add_bars(self, bars: Bars) -> Dict[str, Bars]:
+        """
+        Like add_ticks, for finished bars (oldest first) of a timeframe that divides every
+        aggregated one, e.g. M15 bars into H1 and H4. Tick volumes add up.
+        """
+        cols = tuple(np.asarray(bars[name]) for name in BAR_COLUMNS[:5])
+        volume = bars.get("tick_volume")
+        volume = np.ones(cols[0].shape[0], dtype=np.int64) if volume is None else np.asarray(volume, dtype=np.int64)
+        return self._cascade(cols + (volume,))
+
+    def _cascade(self, cols) -> Dict[str, Bars]:
+        out: Dict[str, Bars] = {}
+        for tf in self.timeframes:
+            out[tf] = self._roll(tf, *cols)
+            cols = tuple(out[tf][name] for name in BAR_COLUMNS)
+        return out
+
+    def flush(self) -> Dict[str, Bars]:
+        """Finish the forming bar of every timeframe (end of data)."""
+        out: Dict[str, Bars] = {}
+        pending: Optional[Bars] = None
+        for tf in self.timeframes:
+            bars = self._roll(tf, *(pending[name] for name in BAR_COLUMNS)) if pending is not None else empty_bars()
+            forming, self._forming[tf] = self._forming[tf], None
+            if forming is not None:
+                bars = {name: np.append(bars[name], value) for name, value in zip(BAR_COLUMNS, forming)}
+            out[tf] = pending = bars
+        return out
+
+    def forming(self, timeframe: str) -> Optional[Dict[str, float]]:
+        """The bar still open for `timeframe` as {column: value}, or None."""
+        bar = self._forming[timeframe.upper()]
+        return dict(zip(BAR_COLUMNS, bar)) if bar is not None else None
+
+    def _roll(self, tf: str, t, o, h, l, c, v) -> Bars:
+        """Merge rows (ticks or finished bars, oldest first) into tf bars; return the finished ones."""
+        if t.shape[0] == 0:
+            return empty_bars()
+        seconds = TIMEFRAME_SECONDS[tf]
+        bucket = t - t % seconds
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ends = np.r_[starts[1:], t.shape[0]]
+        bt = bucket[starts]
+        bo = o[starts]
+        bh = np.maximum.reduceat(h, starts)
+        bl = np.minimum.reduceat(l, starts)
+        bc = c[ends - 1]
+        bv = np.add.reduceat(v, starts)
+        forming = self._forming[tf]
+        if forming is not None:
+            ft, fo, fh, fl, fc, fv = forming
+            if ft == bt[0]:
+                bo[0] = fo
+                bh[0] = max(fh, bh[0])
+                bl[0] = min(fl, bl[0])
+                bv[0] += fv
+            else:
+                bt, bo, bh, bl, bc, bv = (np.r_[x0, x] for x0, x in zip(forming, (bt, bo, bh, bl, bc, bv)))
+        self._forming[tf] = (int(bt[-1]), float(bo[-1]), float(bh[-1]), float(bl[-1]), float(bc[-1]), int(bv[-1]))
+        return dict(zip(BAR_COLUMNS, (bt[:-1], bo[:-1], bh[:-1], bl[:-1], bc[:-1], bv[:-1])))
+
+
+class TimeframeScanner:
+    """
+    Semafor levels and 1-2-3 triangles of one timeframe, fed finished bars as they are built.
+
+    Only the big and small levels are maintained (SemaforStream), and the triangle detector
+    rescans only what the new bars changed, so feeding a series in batches ends with the
+    same triangles as detect_123_triangle_set on the whole series.
+    """
+
+    def __init__(
+        self,
+        periods: List[int],
+        deviation_points: int,
+        backstep: int,
+        big_level: int,
+        small_level: int,
+        max_distance_points: int,
+        max_bars_scan: int,
+    ):
+        self.levels = sorted({big_level, small_level})
+        self.stream = SemaforStream([periods[lv - 1] for lv in self.levels], deviation_points, backstep)
+        self.detector = IncrementalTriangleDetector(big_level, small_level, max_distance_points, max_bars_scan)
+        self._times: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self.stream)
+
+    def append(self, bars: Bars) -> TriangleEvents:
+        """Add finished bars (oldest first); returns the triangle changes they caused."""
+        if bars["time"].shape[0] == 0:
+            return TriangleEvents()
+        for high, low in zip(bars["high"].tolist(), bars["low"].tolist()):
+            self.stream.append(high, low)
+        self._times.append(bars["time"])
+        bufs = self.stream.levels()
+        sema = {lv: bufs[i] for i, lv in enumerate(self.levels, start=1)}
+        return self.detector.update(sema, changed_from=self.stream.pop_changed())
+
+    def times(self) -> np.ndarray:
+        """Bar open times (epoch seconds), MT4 orientation (index 0 = newest)."""
+        if len(self._times) > 1:
+            self._times = [np.concatenate(self._times)]
+        return self._times[0][::-1] if self._times else np.zeros(0, dtype=np.int64)
+
+    def triangles(self) -> TriangleSet:
+        """Current triangles with MT4 indices and bar times (datetime64[s])."""
+        return TriangleSet.from_triangles(self.detector.triangles(), times=self.times().astype("datetime64[s]"))
+
+
+def bars_from_frame(df) -> Bars:
+    """Bars (oldest first, epoch-second times) from a newest-first OHLC frame as the data sources return it."""
+    times = df["time"].to_numpy()
+    if np.issubdtype(times.dtype, np.datetime64):
+        times = times.astype("datetime64[s]")
+    out = {"time": times[::-1].astype(np.int64)}
+    for name in BAR_COLUMNS[1:5]:
+        out[name] = df[name].to_numpy(dtype=np.float64)[::-1]
+    out["tick_volume"] = df["tick_volume"].to_numpy(dtype=np.int64)[::-1] if "tick_volume" in df else np.ones(len(df), dtype=np.int64)
+    return out
+
+
+def resample_bars(bars: Bars, base: str, timeframes: Iterable[str]) -> Dict[str, Bars]:
+    """
+    Bars of every timeframe from `bars` of the `base` timeframe (oldest first), in one
+    cascade: each timeframe is rolled up from the next smaller one rather than from the base
+    bars again. The last bar of each timeframe may be incomplete, like the newest bar of an
+    MT5 chart.
+    """
+    base = base.upper()
+    if base not in TIMEFRAME_SECONDS:
+        raise ValueError(f"Unsupported base timeframe: {base} (use {', '.join(TIMEFRAME_SECONDS)})")
+    agg = BarAggregator(timeframes)
+    step = TIMEFRAME_SECONDS[base]
+    finer = [tf for tf in agg.timeframes if TIMEFRAME_SECONDS[tf] % step]
+    if finer:
+        raise ValueError(f"Timeframes {finer} cannot be built from {base} bars")
+    done = agg.add_bars(bars)
+    last = agg.flush()
+    return {tf: {name: np.concatenate([done[tf][name], last[tf][name]]) for name in BAR_COLUMNS} for tf in agg.timeframes}
+
+
+def aggregate_ticks(chunks: Iterable[TickChunk], timeframes: Iterable[str]) -> Dict[str, pd.DataFrame]:
+    """Every bar (forming ones included) per timeframe as time, open, high, low, close, tick_volume DataFrames, oldest first."""
+    agg = BarAggregator(timeframes)
+    parts: Dict[str, List[Bars]] = {tf: [] for tf in agg.timeframes}
+    for times, prices in chunks:
+        for tf, bars in agg.add_ticks(times, prices).items():
+            parts[tf].append(bars)
+    for tf, bars in agg.flush().items():
+        parts[tf].append(bars)
+    out = {}
+    for tf, bars in parts.items():
+        df = pd.DataFrame({name: np.concatenate([b[name] for b in bars]) for name in BAR_COLUMNS})
+        df["time"] = pd.to_datetime(df["time"], unit="s")
+        out[tf] = df
+    return out
+
+
+def scan_ticks(
+    chunks: Iterable[TickChunk],
+    timeframes: Iterable[str],
+    periods: List[int],
+    deviation_points: int,
+    backstep: int,
+    big_level: int,
+    small_level: int,
+    max_distance_points: int,
+    max_bars_scan: int,
+    include_forming: bool = True,
+) -> Dict[str, TimeframeScanner]:
+    """
+    Read ticks once and scan every timeframe: each finished bar goes straight from the
+    aggregator into that timeframe's TimeframeScanner. With include_forming, the bars still
+    forming at the end of the data are added too (like the newest bar of an MT5 chart).
+    """
+    agg = BarAggregator(timeframes)
+    scanners = {
+        tf: TimeframeScanner(periods, deviation_points, backstep, big_level, small_level, max_distance_points, max_bars_scan)
+        for tf in agg.timeframes
+    }
+    for times, prices in chunks:
+        for tf, bars in agg.add_ticks(times, prices).items():
+            scanners[tf].append(bars)
+    if include_forming:
+        for tf, bars in agg.flush().items():
+            scanners[tf].append(bars)
+    return scanners
+
+
+# --- tick sources ---
+
+
+def iter_tick_file(
+    path: str,
+    price: str = "bid",
+    chunksize: int = 1_000_000,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Iterator[TickChunk]:
+    """
+    Ticks from a file in chunks: a `.npy` array of MT5 tick records (read through a memory
+    map) or a CSV with time (epoch seconds or datetime) and/or time_msc plus a `price` column
+    (bid, ask or last). Only the inclusive [start_date, end_date] range is returned.
+    """
+    if os.path.splitext(path)[1].lower() == ".npy":
+        chunks = iter_tick_array(np.load(path, mmap_mode="r"), price, chunksize)
+    else:
+        chunks = _iter_tick_csv(path, price, chunksize)
+    return _between(chunks, start_date, end_date)
+
+
+def iter_tick_array(ticks: np.ndarray, price: str = "bid", chunksize: int = 1_000_000) -> Iterator[TickChunk]:
+    """Chunks of a structured tick array (MT5 copy_ticks_* layout, or anything with time/time_msc and `price`)."""
+    names = ticks.dtype.names or ()
+    for i in range(0, ticks.shape[0], chunksize):
+        part = ticks[i : i + chunksize]
+        t = part["time_msc"] // 1000 if "time_msc" in names else part["time"]
+        yield _valid(np.asarray(t, dtype=np.int64), np.asarray(part[price], dtype=np.float64))
+
+
+def iter_mt5_ticks(
+    session,
+    symbol: str,
+    start_date: datetime,
+    end_date: datetime,
+    price: str = "bid",
+    window: timedelta = timedelta(hours=6),
+) -> Iterator[TickChunk]:
+    """
+    Ticks of `symbol` from an MT5Session via copy_ticks_range, one `window` at a time, so
+    months of ticks never sit in memory at once. Works with FakeMT5 as the session backend.
+    """
+    session.open()
+    session.select_symbol(symbol)
+    backend = session.backend
+    flags = getattr(backend, "COPY_TICKS_ALL", -1)
+    lo = start_date
+    while lo <= end_date:
+        hi = min(lo + window, end_date)
+        ticks = backend.copy_ticks_range(symbol, lo, hi, flags)
+        if ticks is None:
+            raise RuntimeError(f"MT5 copy_ticks_range failed: {backend.last_error()}")
+        if len(ticks):
+            msc = ticks["time_msc"]
+            # windows share their boundary second; each tick belongs to the window it starts in
+            lo_ms = int(pd.Timestamp(lo).value // 1_000_000)
+            hi_ms = int(pd.Timestamp(hi).value // 1_000_000)
+            keep = (msc >= lo_ms) & ((msc < hi_ms) | (hi == end_date))
+            if keep.any():
+                part = ticks[keep]
+                yield _valid(np.asarray(part["time_msc"], dtype=np.int64) // 1000, np.asarray(part[price], dtype=np.float64))
+        if hi == end_date:
+            break
+        lo = hi
+
+
+def _iter_tick_csv(path: str, price: str, chunksize: int) -> Iterator[TickChunk]:
+    from .csv_loader import _time_ns
+
+    header = pd.read_csv(path, nrows=0).columns
+    lower = {c.lower(): c for c in header}
+    if price not in lower or not ({"time", "time_msc"} & set(lower)):
+        raise ValueError(f"tick CSV must contain time or time_msc and {price} columns")
+    time_col = lower.get("time_msc", lower.get("time"))
+    for chunk in pd.read_csv(path, usecols=[time_col, lower[price]], dtype={lower[price]: np.float64}, chunksize=chunksize):
+        if time_col.lower() == "time_msc":
+            t = chunk[time_col].to_numpy(dtype=np.int64) // 1000
+        else:
+            t = _time_ns(chunk[time_col]) // 1_000_000_000
+        yield _valid(t, chunk[lower[price]].to_numpy(dtype=np.float64))
+
+
+def _valid(t: np.ndarray, p: np.ndarray) -> TickChunk:
+    # ticks that did not change this price side carry 0 (e.g. `last` on FX); NaN from gaps
+    ok = p > 0
+    return (t, p) if ok.all() else (t[ok], p[ok])
+
+
+def _between(chunks: Iterator[TickChunk], start: Optional[datetime], end: Optional[datetime]) -> Iterator[TickChunk]:
+    if start is None and end is None:
+        yield from chunks
+        return
+    lo = int(pd.Timestamp(start).value // 1_000_000_000) if start is not None else None
+    hi = int(pd.Timestamp(end).value // 1_000_000_000) if end is not None else None
+    for t, p in chunks:
+        m = np.ones(t.shape[0], dtype=bool)
+        if lo is not None:
+            m &= t >= lo
+        if hi is not None:
+            m &= t <= hi
+        yield t[m], p[m]
+        if hi is not None and t.size and t[-1] > hi:
+            return
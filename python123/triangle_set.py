@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+from .pivots import PivotSet, as_pivots
+from .triangles import Triangle, _indexed_columns
+
+DIR_BUY = 1
+DIR_SELL = -1
+
+# column name -> dtype; time columns are only present when bar times were supplied
+COLUMNS: Dict[str, np.dtype] = {
+    "dir": np.dtype(np.int8),
+    "bar1": np.dtype(np.int32),
+    "price1": np.dtype(np.float64),
+    "bar2": np.dtype(np.int32),
+    "price2": np.dtype(np.float64),
+    "bar3": np.dtype(np.int32),
+    "price3": np.dtype(np.float64),
+}
+TIME_COLUMNS = ("time1", "time2", "time3")
+
+
+class TriangleSet:
+    """
+    Columnar collection of 1-2-3 triangles.
+
+    Each field is its own contiguous array (dir as int8 +1/-1, bars as int32 MT4 indices,
+    prices as float64, optional int64 times), so pandas and Arrow can wrap the columns without
+    copying and filters are plain boolean masks. Iterating yields Triangle objects, so code
+    written against the list returned by detect_123_triangles keeps working.
+    """
+
+    __slots__ = ("_cols",)
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        missing = set(COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(f"missing triangle columns: {sorted(missing)}")
+        cols = {name: np.ascontiguousarray(columns[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+        if all(name in columns for name in TIME_COLUMNS):
+            for name in TIME_COLUMNS:
+                cols[name] = np.ascontiguousarray(columns[name], dtype=np.int64)
+        sizes = {c.shape[0] for c in cols.values()}
+        if len(sizes) > 1:
+            raise ValueError("triangle columns must have the same length")
+        self._cols = cols
+
+    @classmethod
+    def from_triangles(cls, triangles: Iterable[Triangle], times: Optional[np.ndarray] = None) -> "TriangleSet":
+        """Build from Triangle objects (e.g. detect_123_triangles output)."""
+        rows = [
+            (DIR_BUY if t.dir == "buy" else DIR_SELL, t.bar1, t.price1, t.bar2, t.price2, t.bar3, t.price3)
+            for t in triangles
+        ]
+        cols = [np.array(c) for c in zip(*rows)] if rows else [np.zeros(0)] * len(COLUMNS)
+        return cls.from_columns(*cols, times=times)
+
+    @classmethod
+    def from_columns(
+        cls,
+        dirs,
+        bar1,
+        price1,
+        bar2,
+        price2,
+        bar3,
+        price3,
+        times: Optional[np.ndarray] = None,
+    ) -> "TriangleSet":
+        """
+        Build from column arrays. `times` (per bar, MT4 orientation like the price buffers;
+        datetime64 values or integer epoch seconds as MT5 returns them) adds time1..time3,
+        stored as int64 nanoseconds.
+        """
+        columns = dict(zip(COLUMNS, (dirs, bar1, price1, bar2, price2, bar3, price3)))
+        if times is not None:
+            times = _to_ns(np.asarray(times))
+            for name, bars in zip(TIME_COLUMNS, (bar1, bar2, bar3)):
+                columns[name] = times[np.asarray(bars, dtype=np.int64)]
+        return cls(columns)
+
+    # --- access ---
+
+    def __len__(self) -> int:
+        return self._cols["dir"].shape[0]
+
+    def __iter__(self) -> Iterator[Triangle]:
+        c = self._cols
+        lists = [c[name].tolist() for name in COLUMNS]
+        for d, b1, p1, b2, p2, b3, p3 in zip(*lists):
+            yield Triangle(dir="buy" if d > 0 else "sell", bar1=b1, price1=p1, bar2=b2, price2=p2, bar3=b3, price3=p3)
+
+    def __getitem__(self, key: Union[str, int, slice, np.ndarray]):
+        """Column by name, Triangle by position, or a sub-set by slice / mask / index array."""
+        if isinstance(key, str):
+            return self._cols[key]
+        if isinstance(key, (int, np.integer)):
+            c = self._cols
+            return Triangle(
+                dir="buy" if c["dir"][key] > 0 else "sell",
+                bar1=int(c["bar1"][key]),
+                price1=float(c["price1"][key]),
+                bar2=int(c["bar2"][key]),
+                price2=float(c["price2"][key]),
+                bar3=int(c["bar3"][key]),
+                price3=float(c["price3"][key]),
+            )
+        return TriangleSet({name: col[key] for name, col in self._cols.items()})
+
+    def __repr__(self) -> str:
+        return f"TriangleSet(len={len(self)}, buys={int((self._cols['dir'] > 0).sum())})"
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._cols)
+
+    @property
+    def has_times(self) -> bool:
+        return TIME_COLUMNS[0] in self._cols
+
+    @property
+    def distance(self) -> np.ndarray:
+        """|price2 - price1|, the quantity bounded by max_distance_points."""
+        return np.abs(self._cols["price2"] - self._cols["price1"])
+
+    # --- filtering ---
+
+    def buys(self) -> "TriangleSet":
+        return self[self._cols["dir"] > 0]
+
+    def sells(self) -> "TriangleSet":
+        return self[self._cols["dir"] < 0]
+
+    def where(
+        self,
+        dir: Optional[str] = None,
+        min_distance: Optional[float] = None,
+        max_distance: Optional[float] = None,
+        start=None,
+        end=None,
+    ) -> "TriangleSet":
+        """
+        Vectorized filter. start/end bound time1 inclusively and accept datetimes, strings
+        np.datetime64 understands, or epoch seconds; requires times.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if dir is not None:
+            mask &= self._cols["dir"] == (DIR_BUY if dir == "buy" else DIR_SELL)
+        if min_distance is not None or max_distance is not None:
+            dist = self.distance
+            if min_distance is not None:
+                mask &= dist >= min_distance
+            if max_distance is not None:
+                mask &= dist <= max_distance
+        if start is not None or end is not None:
+            if not self.has_times:
+                raise ValueError("time filtering needs a TriangleSet built with times")
+            t1 = self._cols["time1"]
+            if start is not None:
+                mask &= t1 >= _time_value(start)
+            if end is not None:
+                mask &= t1 <= _time_value(end)
+        return self[mask]
+
+    @staticmethod
+    def concat(sets: Iterable["TriangleSet"]) -> "TriangleSet":
+        sets = list(sets)
+        if not sets:
+            return TriangleSet.from_triangles([])
+        names = sets[0].columns
+        return TriangleSet({name: np.concatenate([s._cols[name] for s in sets]) for name in names})
+
+    # --- export ---
+
+    def to_records(self) -> np.ndarray:
+        """Copy into a NumPy structured array (one record per triangle)."""
+        dtype = [(name, col.dtype) for name, col in self._cols.items()]
+        out = np.empty(len(self), dtype=dtype)
+        for name, col in self._cols.items():
+            out[name] = col
+        return out
+
+    def to_pandas(self):
+        """DataFrame over the column arrays (not copied); time columns become datetime64[ns]."""
+        import pandas as pd
+
+        data = {}
+        for name, col in self._cols.items():
+            data[name] = col.view("datetime64[ns]") if name in TIME_COLUMNS else col
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """pyarrow.Table over the column arrays (numeric columns are wrapped without copying)."""
+        import pyarrow as pa
+
+        return pa.table({name: pa.array(col) for name, col in self._cols.items()})
+
+
+def _to_ns(times: np.ndarray) -> np.ndarray:
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype("datetime64[ns]").view(np.int64)
+    return times.astype(np.int64) * 1_000_000_000
+
+
+def _time_value(value) -> int:
+    if isinstance(value, (int, np.integer)):
+        return int(value) * 1_000_000_000
+    return int(np.datetime64(value, "ns").astype(np.int64))
+
+
+def detect_123_triangle_set(
+    semafor_levels: Union[PivotSet, Dict[int, Tuple[np.ndarray, np.ndarray]]],
+    big_level: int,
+    small_level: int,
+    max_distance_points: int,
+    max_bars_scan: int,
+    times: Optional[np.ndarray] = None,
+) -> TriangleSet:
+    """
+    detect_123_triangles_indexed returning a TriangleSet, without building Triangle objects.
+    """
+    pivots = as_pivots(semafor_levels, (big_level, small_level))
+    cols = _indexed_columns(pivots, big_level, small_level, max_distance_points, max_bars_scan)
+    return TriangleSet.from_columns(*cols, times=times)
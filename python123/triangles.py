@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Tuple, Dict
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import List, Tuple, Dict, Optional, Union
 import numpy as np
 
+from .pivots import PivotSet, as_pivots
+
 
 @dataclass
 class Triangle:
@@ -16,8 +19,107 @@ class Triangle:
     price3: float
 
 
+def _triangles_at(
+    zz: int,
+    low_big: np.ndarray,
+    high_big: np.ndarray,
+    low_small: np.ndarray,
+    high_small: np.ndarray,
+    max_distance_points: int,
+) -> List[Triangle]:
+    """
+    Triangles anchored at bar zz (BUY first, then SELL), scanning toward bar 1.
+    """
+    results: List[Triangle] = []
+    n = low_big.shape[0]
+    time_idx1 = zz
+    p1_low = low_big[zz]
+    p1_high = high_big[zz]
+
+    # BUY pattern: point1 is a big-level low
+    if p1_low > 0:
+        price1 = p1_low
+        found2 = False
+        price2 = 0.0
+        bar2 = -1
+        price3 = 0.0
+        bar3 = -1
+        for lv in range(zz - 1, 0, -1):
+            # stop if another big-level appears
+            if high_big[lv] > 0 or low_big[lv] > 0:
+                break
+            if not found2:
+                up = high_small[lv]
+                if up > 0:
+                    if up >= price1:
+                        price2 = up
+                        bar2 = lv
+                        found2 = True
+            else:
+                if lv + 1 < n:
+                    lo = low_small[lv + 1]
+                    if lo > 0 and lo >= price1:
+                        price3 = lo
+                        bar3 = lv + 1
+            if price1 > 0 and price2 > 0 and price3 > 0:
+                if abs(price2 - price1) < max_distance_points:
+                    results.append(
+                        Triangle(
+                            dir="buy",
+                            bar1=time_idx1,
+                            price1=price1,
+                            bar2=bar2,
+                            price2=price2,
+                            bar3=bar3,
+                            price3=price3,
+                        )
+                    )
+                break
+
+    # SELL pattern: point1 is a big-level high
+    if p1_high > 0:
+        price1 = p1_high
+        found2 = False
+        price2 = 0.0
+        bar2 = -1
+        price3 = 0.0
+        bar3 = -1
+        for lv in range(zz - 1, 0, -1):
+            if high_big[lv] > 0 or low_big[lv] > 0:
+                break
+            if not found2:
+                lo = low_small[lv]
+                if lo > 0:
+                    if lo <= price1:
+                        price2 = lo
+                        bar2 = lv
+                        found2 = True
+            else:
+                if lv + 1 < n:
+                    up = high_small[lv + 1]
+                    if up > 0 and up <= price1:
+                        price3 = up
+                        bar3 = lv + 1
+            if price1 > 0 and price2 > 0 and price3 > 0:
+                if abs(price1 - price2) < max_distance_points:
+                    results.append(
+                        Triangle(
+                            dir="sell",
+                            bar1=time_idx1,
+                            price1=price1,
+                            bar2=bar2,
+                            price2=price2,
+                            bar3=bar3,
+                            price3=price3,
+                        )
+                    )
+                break
+
+    return results
+
+
 def detect_123_triangles(
-    semafor_levels: Dict[int, Tuple[np.ndarray, np.ndarray]],
+    semafor_levels: Union[PivotSet, Dict[int, Tuple[np.ndarray, np.ndarray]]],
     big_level: int,
     small_level: int,
     max_distance_points: int,
@@ -25,7 +127,7 @@ def detect_123_triangles(
 ) -> List[Triangle]:
     """
     Port of Triangels() core to Python, scanning right-to-left (index 0 is current bar).
-    - semafor_levels: {level: (low_buf, high_buf)}
+    - semafor_levels: {level: (low_buf, high_buf)} or a PivotSet
     - big_level: level used for the anchor (point 1)
     - small_level: level used for points 2 and 3
     - max_distance_points: limit for |p2-p1|
@@ -33,6 +135,8 @@ def detect_123_triangles(
     """
     results: List[Triangle] = []
 
+    if isinstance(semafor_levels, PivotSet):
+        semafor_levels = semafor_levels.to_dense({big_level, small_level})
     low_big, high_big = semafor_levels[big_level]
     low_small, high_small = semafor_levels[small_level]
 
@@ -40,89 +144,244 @@ def detect_123_triangles(
     max_bars = min(max_bars_scan, n - 1)
 
     for zz in range(max_bars, 0, -1):
-        time_idx1 = zz
-        p1_low = low_big[zz]
-        p1_high = high_big[zz]
-
-        # BUY pattern: point1 is a big-level low
-        if p1_low > 0:
-            price1 = p1_low
-            found2 = False
-            price2 = 0.0
-            bar2 = -1
-            price3 = 0.0
-            bar3 = -1
-            for lv in range(zz - 1, 0, -1):
-                # stop if another big-level appears
-                if high_big[lv] > 0 or low_big[lv] > 0:
-                    break
-                if not found2:
-                    up = high_small[lv]
-                    if up > 0:
-                        if up >= price1:
-                            price2 = up
-                            bar2 = lv
-                            found2 = True
-                else:
-                    if lv + 1 < n:
-                        lo = low_small[lv + 1]
-                        if lo > 0 and lo >= price1:
-                            price3 = lo
-                            bar3 = lv + 1
-                if price1 > 0 and price2 > 0 and price3 > 0:
-                    if abs(price2 - price1) < max_distance_points:
-                        results.append(
-                            Triangle(
-                                dir="buy",
-                                bar1=time_idx1,
-                                price1=price1,
-                                bar2=bar2,
-                                price2=price2,
-                                bar3=bar3,
-                                price3=price3,
-                            )
-                        )
-                    break
+        if low_big[zz] > 0 or high_big[zz] > 0:
+            results.extend(_triangles_at(zz, low_big, high_big, low_small, high_small, max_distance_points))
 
-        # SELL pattern: point1 is a big-level high
-        if p1_high > 0:
-            price1 = p1_high
-            found2 = False
-            price2 = 0.0
-            bar2 = -1
-            price3 = 0.0
-            bar3 = -1
-            for lv in range(zz - 1, 0, -1):
-                if high_big[lv] > 0 or low_big[lv] > 0:
-                    break
-                if not found2:
-                    lo = low_small[lv]
-                    if lo > 0:
-                        if lo <= price1:
-                            price2 = lo
-                            bar2 = lv
-                            found2 = True
-                else:
-                    if lv + 1 < n:
-                        up = high_small[lv + 1]
-                        if up > 0 and up <= price1:
-                            price3 = up
-                            bar3 = lv + 1
-                if price1 > 0 and price2 > 0 and price3 > 0:
-                    if abs(price1 - price2) < max_distance_points:
-                        results.append(
-                            Triangle(
-                                dir="sell",
-                                bar1=time_idx1,
-                                price1=price1,
-                                bar2=bar2,
-                                price2=price2,
-                                bar3=bar3,
-                                price3=price3,
-                            )
-                        )
+    return results
+
+
+def _last_in_segment(
+    big: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    side: Tuple[np.ndarray, np.ndarray],
+    price1: np.ndarray,
+    active: np.ndarray,
+    at_least: bool,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For each big-level pivot k (segment below it), the highest pivot j of `side` in
+    [lower[k], upper[k]] with price > 0 and price >= price1[k] (or <= if not at_least).
+
+    Returns (bars, prices); bar is -1 where there is none.
+    """
+    pos, val = side
+    keep = val > 0
+    pos = pos[keep]
+    val = val[keep]
+    # segment k holds the bars strictly between big[k - 1] and big[k]
+    seg = np.searchsorted(big, pos, side="left")
+    inside = seg < big.size
+    idx = np.flatnonzero(inside)
+    seg = seg[inside]
+    p = pos[idx]
+    ok = active[seg] & (p >= lower[seg]) & (p <= upper[seg])
+    ok &= (val[idx] >= price1[seg]) if at_least else (val[idx] <= price1[seg])
+    # positions are sorted, so the highest bar is the highest index into them
+    best = np.full(big.size, -1, dtype=np.int64)
+    np.maximum.at(best, seg[ok], idx[ok])
+    found = best >= 0
+    bars = np.full(big.size, -1, dtype=np.int64)
+    prices = np.zeros(big.size, dtype=float)
+    bars[found] = pos[best[found]]
+    prices[found] = val[best[found]]
+    return bars, prices
+
+
+def detect_123_triangles_indexed(
+    semafor_levels: Union[PivotSet, Dict[int, Tuple[np.ndarray, np.ndarray]]],
+    big_level: int,
+    small_level: int,
+    max_distance_points: int,
+    max_bars_scan: int,
+) -> List[Triangle]:
+    """
+    Same result as detect_123_triangles, computed from pivot positions instead of bar loops.
+
+    Big-level pivots split the bars into segments; the inner scan of an anchor never leaves
+    the segment below it. Point 2 is the newest-most (highest index) small pivot in
+    [segment start, anchor - 1] that clears price1; point 3 is the highest small pivot of the
+    other side in [segment start + 1, bar2], which keeps the mq4 `lv + 1` offset (point 3
+    may sit on bar2 itself). Work is proportional to the number of pivots.
+
+    semafor_levels may be the dense dict or a PivotSet.
+    """
+    pivots = as_pivots(semafor_levels, (big_level, small_level))
+    cols = _indexed_columns(pivots, big_level, small_level, max_distance_points, max_bars_scan)
+    dirs = cols[0].tolist()
+    return [
+        Triangle(dir="buy" if d > 0 else "sell", bar1=b1, price1=p1, bar2=b2, price2=p2, bar3=b3, price3=p3)
+        for d, b1, p1, b2, p2, b3, p3 in zip(dirs, *(c.tolist() for c in cols[1:]))
+    ]
+
+
+def _indexed_columns(
+    pivots: PivotSet,
+    big_level: int,
+    small_level: int,
+    max_distance_points: int,
+    max_bars_scan: int,
+) -> Tuple[np.ndarray, ...]:
+    """
+    Columns (dir, bar1, price1, bar2, price2, bar3, price3) of detect_123_triangles_indexed,
+    in detect_123_triangles order; dir is +1 for buy and -1 for sell.
+    """
+    n = pivots.n
+    max_bars = min(max_bars_scan, n - 1)
+
+    big_low = _positive(pivots.lows(big_level))
+    big_high = _positive(pivots.highs(big_level))
+    big = np.union1d(big_low[0], big_high[0]).astype(np.int64)
+    if big.size == 0 or max_bars < 1:
+        empty_i = np.zeros(0, dtype=np.int64)
+        empty_f = np.zeros(0, dtype=float)
+        return np.zeros(0, dtype=np.int8), empty_i, empty_f, empty_i, empty_f, empty_i, empty_f
+
+    # the inner loop stops above the next big-level pivot and never reaches bar 0
+    lower = np.empty(big.size, dtype=np.int64)
+    lower[0] = 1
+    lower[1:] = big[:-1] + 1
+    np.maximum(lower, 1, out=lower)
+    anchors = (big >= 1) & (big <= max_bars)
+
+    found = []
+    small_low = pivots.lows(small_level)
+    small_high = pivots.highs(small_level)
+    for direction, anchor, side2, side3, at_least in (
+        (1, big_low, small_high, small_low, True),
+        (-1, big_high, small_low, small_high, False),
+    ):
+        price1 = np.zeros(big.size, dtype=float)
+        price1[np.searchsorted(big, anchor[0])] = anchor[1]
+        active = anchors & (price1 > 0)
+        bar2, price2 = _last_in_segment(big, lower, big - 1, side2, price1, active, at_least)
+        bar3, price3 = _last_in_segment(big, lower + 1, bar2, side3, price1, bar2 >= 0, at_least)
+        k = np.flatnonzero(bar3 >= 0)
+        k = k[np.abs(price2[k] - price1[k]) < max_distance_points]
+        found.append((np.full(k.size, direction, dtype=np.int8), big[k], price1[k], bar2[k], price2[k], bar3[k], price3[k]))
+
+    cols = [np.concatenate([f[i] for f in found]) for i in range(7)]
+    # oldest anchors first (zz descending), buy before sell on the same bar
+    order = np.lexsort((-cols[0], -cols[1]))
+    return tuple(c[order] for c in cols)
+
+
+def _positive(side: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    pos, val = side
+    keep = val > 0
+    return pos[keep], val[keep]
+
+
+@dataclass
+class TriangleEvents:
+    """
+    Changes reported by IncrementalTriangleDetector.update (bars are MT4 indices at that update).
+
+    - added: triangles that are new or whose points changed
+    - invalidated: previously reported triangles that repainted away (or changed)
+    - expired: triangles whose point 1 left the max_bars_scan window
+    """
+
+    added: List[Triangle] = field(default_factory=list)
+    invalidated: List[Triangle] = field(default_factory=list)
+    expired: List[Triangle] = field(default_factory=list)
+
+
+class IncrementalTriangleDetector:
+    """
+    Keeps detect_123_triangles results up to date while bars are appended and pivots repaint.
+
+    Triangles are stored by bar time (oldest bar = 0), which does not shift as bars arrive.
+    On each update only the anchors from the last big-level pivot before the changed region
+    onwards are rescanned, so the cost follows the open segment and the repaint depth rather
+    than max_bars_scan. triangles() always equals detect_123_triangles on the same buffers.
+    """
+
+    def __init__(self, big_level: int, small_level: int, max_distance_points: int, max_bars_scan: int):
+        self.big_level = big_level
+        self.small_level = small_level
+        self.max_distance_points = max_distance_points
+        self.max_bars_scan = max_bars_scan
+        self._n = 0
+        # (t1, side, dir, price1, t2, price2, t3, price3), sorted like detect_123_triangles output
+        self._tris: List[tuple] = []
+
+    def update(
+        self,
+        semafor_levels: Dict[int, Tuple[np.ndarray, np.ndarray]],
+        changed_from: Optional[int] = None,
+    ) -> TriangleEvents:
+        """
+        Sync with new semafor buffers (same history plus any appended bars).
+
+        changed_from: MT4 index of the oldest bar whose big/small buffers may have changed since
+        the previous update (e.g. SemaforStream.pop_changed()), -1 for none; None rescans the
+        whole window.
+        """
+        low_big, high_big = semafor_levels[self.big_level]
+        low_small, high_small = semafor_levels[self.small_level]
+        n = low_big.shape[0]
+        if n < self._n:
+            raise ValueError("buffers are shorter than at the previous update")
+
+        events = TriangleEvents()
+        # oldest bar time that can still anchor a triangle
+        lower = n - 1 - min(self.max_bars_scan, n - 1)
+        cut = bisect_left(self._tris, (lower,))
+        events.expired = [self._to_triangle(r, n) for r in self._tris[:cut]]
+        del self._tris[:cut]
+
+        if changed_from is not None and changed_from < 0 and n == self._n:
+            return events
+        if changed_from is None or self._n == 0:
+            start = 0
+        else:
+            # bars that were bar 0 before are now scannable as well
+            start = min(n - 1 - max(changed_from, -1), self._n - 1)
+            # the anchor whose open segment reaches into the change is affected too
+            t = start - 1
+            while t >= lower:
+                zz = n - 1 - t
+                if low_big[zz] > 0 or high_big[zz] > 0:
                     break
+                t -= 1
+            start = t
+        start = max(start, lower)
+        self._n = n
 
-    return results
+        fresh = []
+        for zz in range(n - 1 - start, 0, -1):
+            if low_big[zz] > 0 or high_big[zz] > 0:
+                for tri in _triangles_at(zz, low_big, high_big, low_small, high_small, self.max_distance_points):
+                    fresh.append(self._to_record(tri, n))
+
+        i = bisect_left(self._tris, (start,))
+        stale = self._tris[i:]
+        old = set(stale)
+        new = set(fresh)
+        events.invalidated = [self._to_triangle(r, n) for r in stale if r not in new]
+        events.added = [self._to_triangle(r, n) for r in fresh if r not in old]
+        self._tris[i:] = fresh
+        return events
+
+    def triangles(self) -> List[Triangle]:
+        """Current triangles, identical to detect_123_triangles on the last buffers."""
+        return [self._to_triangle(r, self._n) for r in self._tris]
 
+    @staticmethod
+    def _to_record(tri: Triangle, n: int) -> tuple:
+        return (
+            n - 1 - tri.bar1,
+            0 if tri.dir == "buy" else 1,
+            tri.dir,
+            tri.price1,
+            n - 1 - tri.bar2,
+            tri.price2,
+            n - 1 - tri.bar3,
+            tri.price3,
+        )
 
+    @staticmethod
+    def _to_triangle(rec: tuple, n: int) -> Triangle:
+        t1, _, d, p1, t2, p2, t3, p3 = rec
+        return Triangle(dir=d, bar1=n - 1 - t1, price1=p1, bar2=n - 1 - t2, price2=p2, bar3=n - 1 - t3, price3=p3)
@@ -1,8 +1,17 @@
 from __future__ import annotations
 
-from typing import Tuple
+from typing import Optional, Sequence, Tuple
 import numpy as np
 
+from .extrema import RangeExtremaIndex, _pad_value, sliding_min, sliding_max
+
+
+def zigzag_limit(n: int, depth: int) -> int:
+    """
+    Oldest shift scanned by CountZZ for n bars (same as MQL4 `Bars - ExtDepth`, clamped).
+    """
+    return max(0, min(n - depth, n - 1))
+
 
 def compute_zigzag_buffers(
     highs: np.ndarray,
@@ -10,6 +19,7 @@ def compute_zigzag_buffers(
     depth: int,
     deviation_points: int,
     backstep: int,
+    index: Optional[RangeExtremaIndex] = None,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """
     Port of CountZZ (MQL4) -> returns (low_buffer, high_buffer).
@@ -17,63 +27,137 @@ def compute_zigzag_buffers(
     - highs, lows: numpy arrays aligned newest at index 0? We mirror MQL4 where index 0 is current bar.
       This implementation expects the same: index 0 is the latest bar, increasing to the left.
     - depth, deviation_points, backstep: same semantics as MQL4 CountZZ(ExtDepth, ExtDeviation, ExtBackstep).
+
+    The per-bar window extrema are computed in one O(n) vectorized pass (see `extrema`),
+    so the cost no longer grows with depth. Pass a prebuilt `index` over the same highs/lows
+    to reuse window extrema shared with other depths.
     """
     assert highs.shape == lows.shape
+    if depth < 1:
+        raise ValueError("depth must be >= 1")
     n = highs.shape[0]
-    low_buf = np.zeros(n, dtype=float)
-    high_buf = np.zeros(n, dtype=float)
+    if n == 0:
+        return np.zeros(0, dtype=float), np.zeros(0, dtype=float)
 
-    limit = max(0, min(n - depth, n - 1))
+    limit = zigzag_limit(n, depth)
+    # window of shift is [shift, shift + depth); with n <= depth only shift 0 exists and spans all bars
+    window = min(depth, n)
+    if index is not None:
+        if index.n != n:
+            raise ValueError("index was built for a series of a different length")
+        win_low = index.window_min(window)
+        win_high = index.window_max(window)
+    else:
+        win_low = sliding_min(lows[: limit + window], window)
+        win_high = sliding_max(highs[: limit + window], window)
+    return zigzag_from_extrema(highs, lows, win_low, win_high, deviation_points, backstep)
 
-    last_low_val = -1.0
-    last_high_val = -1.0
 
-    # main scan from limit down to 0 (right-to-left like MQL4)
-    for shift in range(limit, -1, -1):
-        # lows
-        span = lows[shift : shift + depth]
-        val = span.min()
-        if val == last_low_val:
-            val = 0.0
-        else:
-            last_low_val = val
-            if (lows[shift] - val) > deviation_points:
-                val = 0.0
-            else:
-                for back in range(1, backstep + 1):
-                    if shift + back < n:
-                        res = low_buf[shift + back]
-                        if res != 0.0 and res > val:
-                            low_buf[shift + back] = 0.0
-        low_buf[shift] = val
-
-        # highs
-        span_h = highs[shift : shift + depth]
-        v = span_h.max()
-        if v == last_high_val:
-            v = 0.0
+def _select_pivots(
+    prices: np.ndarray,
+    extrema: np.ndarray,
+    deviation_points: int,
+    backstep: int,
+    is_low: bool,
+) -> np.ndarray:
+    """
+    Main CountZZ scan for one side, vectorized over all shifts 0..limit.
+
+    A shift is a candidate when its window extremum differs from the previous (older) shift's
+    and the bar is within `deviation_points` of it. A candidate then clears every older,
+    still-set pivot within `backstep` bars that it beats. Clearing only ever writes 0.0,
+    so the order in which the MQL4 loop applies it does not change the outcome.
+    """
+    m = extrema.shape[0]
+    buf = np.zeros(prices.shape[0], dtype=float)
+    if m == 0:
+        return buf
+
+    # MQL4 keeps the last window extremum in lastlow/lasthigh, starting at -1
+    changed = np.empty(m, dtype=bool)
+    changed[:-1] = extrema[:-1] != extrema[1:]
+    changed[-1] = extrema[-1] != -1.0
+    idx = np.flatnonzero(changed)
+    vals = extrema[idx]
+    if is_low:
+        far = (prices[idx] - vals) > deviation_points
+    else:
+        far = (vals - prices[idx]) > deviation_points
+    idx = idx[~far]
+    vals = vals[~far]
+    buf[idx] = vals
+
+    # only candidates are ever compared, so this stays proportional to their count
+    for back in range(1, backstep + 1):
+        inside = idx + back < m
+        older = idx[inside] + back
+        res = buf[older]
+        if is_low:
+            beaten = res > vals[inside]
         else:
-            last_high_val = v
-            if (v - highs[shift]) > deviation_points:
-                v = 0.0
-            else:
-                for back in range(1, backstep + 1):
-                    if shift + back < n:
-                        res = high_buf[shift + back]
-                        if res != 0.0 and res < v:
-                            high_buf[shift + back] = 0.0
-        high_buf[shift] = v
-
-    # final cutting (resolve conflicts)
+            beaten = res < vals[inside]
+        buf[older[(res != 0.0) & beaten]] = 0.0
+    return buf
+
+
+def _cut_pivots(low_buf: np.ndarray, high_buf: np.ndarray, limit: int) -> None:
+    """
+    Final CountZZ cutting pass (resolve alternating high/low conflicts), in place.
+
+    Walking pivots oldest to newest (a bar's high before its low), consecutive highs with no
+    low in between form a run of which only the first maximum survives; likewise consecutive
+    lows keep their first minimum. That is computed with segmented reductions when every
+    pivot price is positive; otherwise the MQL4 loop is replayed as written, since its
+    `last > 0` sentinels then behave differently.
+    """
+    hi_pos = np.flatnonzero(high_buf[: limit + 1] != 0.0)[::-1]
+    lo_pos = np.flatnonzero(low_buf[: limit + 1] != 0.0)[::-1]
+    hi_vals = high_buf[hi_pos]
+    lo_vals = low_buf[lo_pos]
+    if not (np.all(hi_vals > 0.0) and np.all(lo_vals > 0.0)):
+        _cut_pivots_loop(low_buf, high_buf, limit)
+        return
+    if hi_pos.size + lo_pos.size == 0:
+        return
+
+    # event order: older bars first, and on the same bar the high before the low
+    pos = np.concatenate([hi_pos, lo_pos])
+    is_low = np.concatenate([np.zeros(hi_pos.size, dtype=bool), np.ones(lo_pos.size, dtype=bool)])
+    order = np.argsort(-2 * pos.astype(np.int64) + is_low, kind="stable")
+    pos = pos[order]
+    is_low = is_low[order]
+    # lows are negated so that both sides keep the first run maximum
+    vals = np.concatenate([hi_vals, -lo_vals])[order]
+
+    new_run = np.empty(pos.size, dtype=bool)
+    new_run[0] = True
+    new_run[1:] = is_low[1:] != is_low[:-1]
+    starts = np.flatnonzero(new_run)
+    run_id = np.cumsum(new_run) - 1
+    best = np.maximum.reduceat(vals, starts)
+    hit = np.flatnonzero(vals == best[run_id])
+    first = hit[np.concatenate([[True], run_id[hit[1:]] != run_id[hit[:-1]]])]
+
+    keep = np.zeros(pos.size, dtype=bool)
+    keep[first] = True
+    high_buf[pos[~keep & ~is_low]] = 0.0
+    low_buf[pos[~keep & is_low]] = 0.0
+
+
+def _cut_pivots_loop(low_buf: np.ndarray, high_buf: np.ndarray, limit: int) -> None:
+    """
+    Literal MQL4 cutting loop; only bars carrying a pivot are visited.
+    """
+    positions = np.flatnonzero((low_buf[: limit + 1] != 0.0) | (high_buf[: limit + 1] != 0.0))[::-1]
+    # values at `shift` are only ever modified after they have been read
+    lows = low_buf[positions].tolist()
+    highs = high_buf[positions].tolist()
+
     last_high = -1.0
     last_high_pos = -1
     last_low = -1.0
     last_low_pos = -1
-    for shift in range(limit, -1, -1):
-        curlow = low_buf[shift]
-        curhigh = high_buf[shift]
-        if curlow == 0.0 and curhigh == 0.0:
-            continue
+    for shift, curlow, curhigh in zip(positions.tolist(), lows, highs):
         if curhigh != 0.0:
             if last_high > 0:
                 if last_high < curhigh:
@@ -95,14 +179,231 @@ def compute_zigzag_buffers(
                 last_low_pos = shift
             last_high = -1.0
 
-    # tail alignment (match MQL4 behavior)
-    for shift in range(limit, -1, -1):
-        if shift >= limit:
-            low_buf[shift] = 0.0
-        else:
-            if high_buf[shift] != 0.0:
-                high_buf[shift] = high_buf[shift]
 
+def zigzag_from_extrema(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    win_low: np.ndarray,
+    win_high: np.ndarray,
+    deviation_points: int,
+    backstep: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finish CountZZ given precomputed window extrema for shifts 0..limit.
+
+    win_low[shift] / win_high[shift] must equal lows/highs[shift : shift + depth].min()/max().
+    """
+    limit = win_low.shape[0] - 1
+    low_buf = _select_pivots(lows, win_low, deviation_points, backstep, is_low=True)
+    high_buf = _select_pivots(highs, win_high, deviation_points, backstep, is_low=False)
+
+    _cut_pivots(low_buf, high_buf, limit)
+
+    # tail alignment (match MQL4 behavior): the oldest scanned bar never keeps a low
+    low_buf[limit] = 0.0
     return low_buf, high_buf
 
 
+# --- batched kernels: many aligned series at once ---
+
+
+def compute_zigzag_buffers_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    depth: int,
+    deviation_points: int,
+    backstep: int,
+    lengths: Optional[Sequence[int]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    compute_zigzag_buffers for a (series x bars) matrix -> stacked (low_buffers, high_buffers).
+
+    - highs, lows: 2-D, every row MT4-oriented (index 0 = newest bar). Shorter series are
+      padded at the old end, with NaN or anything else: `lengths` gives the valid bars per
+      row (default: up to the first NaN of the row's highs).
+    - Row i of each result equals compute_zigzag_buffers on row i's valid bars, zero-padded.
+
+    Every pass runs over all rows at once, so the per-call overhead is paid once per matrix
+    instead of once per series.
+    """
+    if depth < 1:
+        raise ValueError("depth must be >= 1")
+    lengths = series_lengths(highs, lengths)
+    highs, lows = _pad_extrema_inputs(highs, lows, lengths)
+    return zigzag_batch_from_index(highs, lows, lengths, depth, deviation_points, backstep)
+
+
+def series_lengths(highs: np.ndarray, lengths: Optional[Sequence[int]] = None) -> np.ndarray:
+    """Valid bars per row of a padded matrix: `lengths` checked, or the bars before each row's first NaN."""
+    highs = np.asarray(highs)
+    if highs.ndim != 2:
+        raise ValueError("expected a 2-D (series x bars) array")
+    n = highs.shape[1]
+    if lengths is None:
+        nan = np.isnan(highs)
+        return np.where(nan.any(axis=1), nan.argmax(axis=1), n).astype(np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if lengths.shape != (highs.shape[0],) or np.any(lengths < 0) or np.any(lengths > n):
+        raise ValueError("lengths must give 0..bars valid bars for every row")
+    return lengths
+
+
+def _pad_extrema_inputs(highs: np.ndarray, lows: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Copies with padding set to the neutral element of each side (-inf highs, +inf lows, or
+    the dtype's min/max for integer point prices).
+    A window that runs into the padding then equals the window clamped to the series, as
+    CountZZ uses for histories shorter than the depth.
+    """
+    highs = np.asarray(highs)
+    lows = np.asarray(lows)
+    if highs.shape != lows.shape or highs.ndim != 2:
+        raise ValueError("highs and lows must be 2-D arrays of the same shape")
+    pad = np.arange(highs.shape[1]) >= lengths[:, None]
+    highs = highs.copy()
+    lows = lows.copy()
+    highs[pad] = _pad_value(highs.dtype, np.maximum)
+    lows[pad] = _pad_value(lows.dtype, np.minimum)
+    return highs, lows
+
+
+def zigzag_batch_from_index(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    lengths: np.ndarray,
+    depth: int,
+    deviation_points: int,
+    backstep: int,
+    index: Optional[RangeExtremaIndex] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    compute_zigzag_buffers_batch on matrices already padded with _pad_extrema_inputs; pass a
+    2-D `index` over them to share window extrema between depths.
+    """
+    s, n = highs.shape
+    low_buf = np.zeros((s, n), dtype=float)
+    high_buf = np.zeros((s, n), dtype=float)
+    if n == 0:
+        return low_buf, high_buf
+    # oldest scanned shift per row, -1 for empty rows
+    limits = np.where(lengths > 0, np.maximum(0, np.minimum(lengths - depth, lengths - 1)), -1)
+    window = min(depth, n)
+    if index is None:
+        index = RangeExtremaIndex(highs, lows, [window])
+    win_low = index.window_min(window)
+    win_high = index.window_max(window)
+
+    _select_pivots_batch(low_buf, lows, win_low, limits, deviation_points, backstep, is_low=True)
+    _select_pivots_batch(high_buf, highs, win_high, limits, deviation_points, backstep, is_low=False)
+    _cut_pivots_batch(low_buf, high_buf, limits)
+
+    rows = np.flatnonzero(limits >= 0)
+    low_buf[rows, limits[rows]] = 0.0
+    return low_buf, high_buf
+
+
+def _select_pivots_batch(
+    buf: np.ndarray,
+    prices: np.ndarray,
+    extrema: np.ndarray,
+    limits: np.ndarray,
+    deviation_points: int,
+    backstep: int,
+    is_low: bool,
+) -> None:
+    """
+    _select_pivots for every row, shifts 0..limits[row], into `buf` (zero elsewhere).
+
+    Candidates are found in one pass over the matrix and then handled as flat
+    (row * bars + shift) indices, like the 1-D version. A backstep never reaches into the
+    next row: past its limit a row's buffer is zero, and the columns after the last window
+    leave room for `backstep` unless the window is shorter than that.
+    """
+    s, m = extrema.shape
+    n = buf.shape[1]
+    changed = np.empty((s, m), dtype=bool)
+    changed[:, :-1] = extrema[:, :-1] != extrema[:, 1:]
+    # nothing older than a row's limit is scanned; the limit itself compares against MQL4's initial -1
+    for row in np.flatnonzero(limits < m - 1).tolist():
+        changed[row, max(limits[row], 0) :] = False
+    rows = np.flatnonzero(limits >= 0)
+    changed[rows, limits[rows]] = extrema[rows, limits[rows]] != -1.0
+
+    k = np.flatnonzero(changed)
+    vals = extrema.reshape(-1)[k]
+    idx = k if m == n else k + (k // m) * (n - m)
+    price = prices.reshape(-1)[idx]
+    if is_low:
+        far = (price - vals) > deviation_points
+    else:
+        far = (vals - price) > deviation_points
+    idx = idx[~far]
+    vals = vals[~far]
+    flat = buf.reshape(-1)
+    flat[idx] = vals
+
+    col = idx % n if n - m < backstep else None
+    for back in range(1, backstep + 1):
+        if col is None:
+            older = idx + back
+            newer = vals
+        else:
+            inside = col + back < m
+            older = idx[inside] + back
+            newer = vals[inside]
+        res = flat[older]
+        if is_low:
+            beaten = res > newer
+        else:
+            beaten = res < newer
+        flat[older[(res != 0.0) & beaten]] = 0.0
+
+
+def _cut_pivots_batch(low_buf: np.ndarray, high_buf: np.ndarray, limits: np.ndarray) -> None:
+    """
+    _cut_pivots for every row, in place: one segmented reduction over the pivots of all rows
+    (runs never cross rows). Rows with a non-positive pivot replay the MQL4 loop on their own.
+    Buffers are zero past each row's limit, so every pivot found is a scanned one.
+    """
+    n = low_buf.shape[1]
+    lows = low_buf.reshape(-1)
+    highs = high_buf.reshape(-1)
+    # descending flat index: rows in reverse, and within a row oldest bar first (the MQL4 walk)
+    hi_pos = np.flatnonzero(highs != 0.0)[::-1]
+    lo_pos = np.flatnonzero(lows != 0.0)[::-1]
+    hi_vals = highs[hi_pos]
+    lo_vals = lows[lo_pos]
+    if not (np.all(hi_vals > 0.0) and np.all(lo_vals > 0.0)):
+        odd = np.union1d(hi_pos[hi_vals <= 0.0] // n, lo_pos[lo_vals <= 0.0] // n)
+        for row in odd.tolist():
+            _cut_pivots(low_buf[row], high_buf[row], int(limits[row]))
+        keep_h = ~np.isin(hi_pos // n, odd)
+        keep_l = ~np.isin(lo_pos // n, odd)
+        hi_pos, hi_vals = hi_pos[keep_h], hi_vals[keep_h]
+        lo_pos, lo_vals = lo_pos[keep_l], lo_vals[keep_l]
+    if hi_pos.size + lo_pos.size == 0:
+        return
+
+    pos = np.concatenate([hi_pos, lo_pos])
+    is_low = np.concatenate([np.zeros(hi_pos.size, dtype=bool), np.ones(lo_pos.size, dtype=bool)])
+    # on the same bar the high before the low; merging two sorted runs is linear
+    order = np.argsort(-2 * pos + is_low, kind="stable")
+    pos = pos[order]
+    is_low = is_low[order]
+    row = pos // n
+    # lows are negated so that both sides keep the first run maximum
+    vals = np.concatenate([hi_vals, -lo_vals])[order]
+
+    new_run = np.empty(pos.size, dtype=bool)
+    new_run[0] = True
+    new_run[1:] = (is_low[1:] != is_low[:-1]) | (row[1:] != row[:-1])
+    starts = np.flatnonzero(new_run)
+    run_id = np.cumsum(new_run) - 1
+    best = np.maximum.reduceat(vals, starts)
+    hit = np.flatnonzero(vals == best[run_id])
+    first = hit[np.concatenate([[True], run_id[hit[1:]] != run_id[hit[:-1]]])]
+
+    keep = np.zeros(pos.size, dtype=bool)
+    keep[first] = True
+    highs[pos[~keep & ~is_low]] = 0.0
+    lows[pos[~keep & is_low]] = 0.0
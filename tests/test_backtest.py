@@ -0,0 +1,20 @@
+import pytest
+
+from python123.backtest import BacktestParams
+
+
+@pytest.mark.parametrize("max_hold", [0, -1])
+def test_max_hold_must_cover_the_entry_bar(max_hold):
+    with pytest.raises(ValueError, match="max_hold"):
+        BacktestParams(max_hold=max_hold)
+
+
+@pytest.mark.parametrize("max_hold", [None, 1, 100])
+def test_max_hold_accepts_none_and_positive(max_hold):
+    assert BacktestParams(max_hold=max_hold).max_hold == max_hold
+
+
+def test_entry_delay_cannot_precede_the_signal():
+    with pytest.raises(ValueError, match="entry_delay"):
+        BacktestParams(entry_delay=-15)
+    assert BacktestParams(entry_delay=0).entry_delay == 0
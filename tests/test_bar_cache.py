@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from python123.bar_cache import BarCache, cached_csv_ohlc
+
+
+def _csv_bytes(rows):
+    times = pd.date_range("2024-01-01", periods=rows, freq="15min").strftime("%Y-%m-%d %H:%M:%S")
+    lines = ["time,open,high,low,close\n"]
+    lines += [f"{t},{1 + i * 1e-5:.5f},{1.001 + i * 1e-5:.5f},{0.999 + i * 1e-5:.5f},{1 + i * 1e-5:.5f}\n" for i, t in enumerate(times)]
+    return "".join(lines).encode()
+
+
+def test_half_written_last_line_is_not_cached(tmp_path):
+    data = _csv_bytes(500)
+    path = tmp_path / "EURUSD_M15.csv"
+    cache = BarCache(str(tmp_path / "cache"))
+    cut = data.index(b"\n", len(data) // 2) + 12  # a writer stopped in the middle of a row
+
+    path.write_bytes(data[:cut])
+    partial = cached_csv_ohlc(cache, str(path))
+    assert partial[["open", "high", "low", "close"]].notna().all(axis=None)
+    assert len(partial) == data[:cut].count(b"\n") - 1
+
+    with open(path, "ab") as f:
+        f.write(data[cut:])
+    full = cached_csv_ohlc(cache, str(path))
+    ref = pd.read_csv(path)
+    assert len(full) == len(ref)
+    np.testing.assert_array_equal(full["high"].to_numpy(), ref["high"].to_numpy())
+    np.testing.assert_array_equal(full["time"].to_numpy(), pd.to_datetime(ref["time"]).to_numpy(dtype="datetime64[ns]"))
@@ -0,0 +1,26 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from python123.cli import main
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TradingBot", "sample_data.csv")
+
+
+@pytest.mark.parametrize("name", ["EURUSD_M15.csv", "EURUSD.csv"])
+def test_single_then_batch_run_share_one_series(tmp_path, capsys, name):
+    data = tmp_path / "data"
+    data.mkdir()
+    shutil.copy(SAMPLE, data / name)
+    db = str(tmp_path / "s.db")
+
+    assert main(["--csv", str(data / name), "--store", db]) in (None, 0)
+    capsys.readouterr()
+    assert main(["--csv-dir", str(data), "--store", db, "--workers", "1"]) == 0
+    (line,) = capsys.readouterr().out.splitlines()
+    result = json.loads(line)
+    assert result["triangles"]
+    assert result["stored"]["new"] == 0
+    assert result["stored"]["changed"] == 0
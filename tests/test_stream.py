@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from python123.stream import ZigZagStream
+from python123.zigzag import compute_zigzag_buffers
+
+
+def random_walk(n, seed, price=1.1):
+    r = np.random.default_rng(seed)
+    close = price + np.cumsum(r.normal(0, price * 5e-4, n))
+    spread = np.abs(r.normal(0, price * 3e-4, (2, n)))
+    return close + spread[0], close - spread[1]
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("price", [1.1, 100.0])
+def test_pop_changed_stays_at_the_tail(seed, price):
+    # the tail is undone and rewritten on every call; only cells that really change count
+    highs, lows = random_walk(3000, seed, price)
+    stream = ZigZagStream(8, 1, 1)
+    widest = 0
+    for i, (h, l) in enumerate(zip(highs, lows)):
+        stream.update(h, l - price * 1e-4)
+        stream.append(h, l)
+        changed = stream.pop_changed()
+        if i >= 100:
+            widest = max(widest, changed)
+    assert widest <= 20
+    low_buf, high_buf = compute_zigzag_buffers(highs[::-1].copy(), lows[::-1].copy(), 8, 1, 1)
+    got_low, got_high = stream.buffers()
+    np.testing.assert_array_equal(got_low, low_buf)
+    np.testing.assert_array_equal(got_high, high_buf)
+
+
+@pytest.mark.parametrize("depth, backstep", [(3, 0), (8, 1), (13, 3)])
+def test_pop_changed_covers_every_change(depth, backstep):
+    highs, lows = random_walk(800, depth)
+    r = np.random.default_rng(depth)
+    stream = ZigZagStream(depth, 1, backstep)
+    prev_low = prev_high = np.zeros(0)
+    for h, l in zip(highs, lows):
+        for _ in range(int(r.integers(0, 3))):
+            stream.update(h + r.normal(0, 1e-4), l - abs(r.normal(0, 1e-4)))
+            prev_low, prev_high = _check_covered(stream, prev_low, prev_high)
+        stream.append(h, l)
+        prev_low, prev_high = _check_covered(stream, prev_low, prev_high)
+
+
+def _check_covered(stream, prev_low, prev_high):
+    low, high = (b[::-1].copy() for b in stream.buffers())  # oldest first
+    m = prev_low.shape[0]
+    diff = np.flatnonzero((low[:m] != prev_low) | (high[:m] != prev_high))
+    oldest = diff[0] if diff.size else m if low.shape[0] > m else None
+    changed = stream.pop_changed()
+    if oldest is not None:
+        assert changed >= 0 and low.shape[0] - 1 - changed <= oldest
+    return low, high